@@ -172,4 +172,34 @@ class ReqIntelligenceData(BaseModel):
 class ReqClustersForSalesManData(BooleanQuery, UserId,ReqCityCountry):
     num_sales_man: int
     distance_limit: float = 2.5
-    include_raw_data: bool = False
\ No newline at end of file
+    include_raw_data: bool = False
+    distance_backend: Literal["dense", "chunked"] = "dense"
+    clustering_engine: Literal["greedy", "balanced"] = "greedy"
+    contiguity: Literal["rook", "queen"] = "queen"
+    time_budget_seconds: float = 1.0
+    plot_mode: Literal["background", "inline", "skip"] = "background"
+    plot_dpi: int = 300
+    grid_shape: Literal["square", "hex"] = "square"
+    diagnostics: bool = False
+    previous_request_id: Optional[str] = None
+    # distance_limit is in km for "haversine", in drive minutes for the others
+    travel_cost: Literal["haversine", "road_speed", "matrix"] = "haversine"
+
+
+class SalesManScenario(BaseModel):
+    num_sales_man: int
+    distance_limit: float = 2.5
+    clustering_engine: Literal["greedy", "balanced"] = "greedy"
+    contiguity: Literal["rook", "queen"] = "queen"
+    time_budget_seconds: float = 1.0
+
+
+class ReqClustersForSalesManScenarios(BooleanQuery, UserId, ReqCityCountry):
+    scenarios: list[SalesManScenario] = Field(min_length=1)
+    include_raw_data: bool = False
+    distance_backend: Literal["dense", "chunked"] = "dense"
+    plot_mode: Literal["background", "inline", "skip"] = "background"
+    plot_dpi: int = 300
+    grid_shape: Literal["square", "hex"] = "square"
+    diagnostics: bool = False
+    travel_cost: Literal["haversine", "road_speed", "matrix"] = "haversine"
\ No newline at end of file
@@ -199,4 +199,23 @@ class ResSalesman(BaseModel):
     success: bool
     request_id: str
     plots: dict[str, str]
-    metadata: dict[str, Any]
\ No newline at end of file
+    metadata: dict[str, Any]
+    diagnostics: Optional[dict[str, Any]] = None
+    # URLs of the NDJSON raw layers, when requested with include_raw_data
+    raw_cluster_data: Optional[dict[str, str]] = None
+
+
+class ResSalesmanScenarios(BaseModel):
+    success: bool
+    scenarios: list[ResSalesman]
+    comparison: list[dict[str, Any]]
+
+
+class ResSalesmanJob(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "completed", "failed"]
+    stage: Optional[str] = None
+    stages_completed: list[str] = []
+    progress: float = 0.0
+    error: Optional[str] = None
+    result: Optional[ResSalesman] = None
@@ -1,6 +1,6 @@
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from typing import Any
+from typing import Any, Optional
 from fastapi import Depends, HTTPException, status, Request
 from backend_common.logging_wrapper import apply_decorator_to_module
 from fastapi.security import OAuth2PasswordBearer
@@ -240,6 +240,33 @@ class JWTBearer(HTTPBearer):
         return True
 
 
+class JWTTokenBearer(HTTPBearer):
+    """
+    Secures bodiless endpoints (GET) with JWT. Only the token is verified, the
+    endpoint gets its user id to check against the resource, None in test mode.
+    """
+
+    def __init__(self, auto_error: bool = True):
+        super(JWTTokenBearer, self).__init__(auto_error=auto_error)
+
+    async def __call__(self, request: Request) -> Optional[str]:
+        credentials_obj: HTTPAuthorizationCredentials = await super(
+            JWTTokenBearer, self
+        ).__call__(request)
+        if not credentials_obj:
+            raise HTTPException(
+                status_code=403, detail="Invalid authorization code."
+            )
+        if not credentials_obj.scheme == "Bearer":
+            raise HTTPException(
+                status_code=403, detail="Invalid authentication scheme."
+            )
+        if CONF.test_mode:
+            # Test mode: skip JWT verification for testing purposes
+            return None
+        return my_verify_id_token(credentials_obj.credentials)["uid"]
+
+
 async def create_firebase_user(req: ReqCreateFirebaseUser) -> dict[str, Any]:
     try:
         # Create user in Firebase
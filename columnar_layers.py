@@ -0,0 +1,460 @@
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import shutil
+import threading
+import time
+from typing import Optional
+
+import geopandas as gpd
+import numpy as np
+import orjson
+import shapely
+
+from config_factory import CONF
+
+
+logger = logging.getLogger(__name__)
+
+# GeoJSON sources of the intelligence layers, by layer type
+LAYER_SOURCES = {
+    "population": "Backend/population_json_files/v{zoom_level}/all_features.geojson",
+    "income": "Backend/area_income_geojson/v{zoom_level}/all_features.geojson",
+}
+
+# Names the generation directory a layer directory currently serves
+CURRENT_FILE = "CURRENT"
+
+_MISSING = object()
+_open_layers: dict[str, tuple[str, "ColumnarLayer"]] = {}
+_open_lock = threading.Lock()
+# Conversions started by `open_layer`, one at a time so a layer is converted once
+_convert_lock = threading.Lock()
+
+
+def calculate_polygon_area_km2(coordinates):
+    """
+    Calculate approximate area of polygon in square kilometers.
+    Uses simple lat/lng to approximate area (good enough for density calculations).
+    """
+    if not coordinates or not coordinates[0]:
+        return 1  # Default to avoid division by zero
+
+    # Get the outer ring (first array in coordinates)
+    ring = coordinates[0]
+    if len(ring) < 3:
+        return 1
+
+    # Simple area calculation in square degrees, then convert to km2
+    area_sq_degrees = 0
+    n = len(ring) - 1  # Last point same as first, so exclude it
+
+    for i in range(n):
+        j = (i + 1) % n
+        area_sq_degrees += ring[i][0] * ring[j][1]
+        area_sq_degrees -= ring[j][0] * ring[i][1]
+
+    area_sq_degrees = abs(area_sq_degrees) / 2
+
+    # Rough conversion from square degrees to square kilometers
+    lat_avg = sum(point[1] for point in ring[:n]) / n
+    km_per_degree_lat = 111.0
+    km_per_degree_lng = 111.0 * math.cos(math.radians(lat_avg))
+    area_km2 = area_sq_degrees * km_per_degree_lat * km_per_degree_lng
+
+    return max(area_km2, 0.01)  # Minimum area to avoid division by zero
+
+
+def layer_dir(layer_type: str, zoom_level: int) -> str:
+    return os.path.join(CONF.columnar_layers_dir, layer_type, f"v{zoom_level}")
+
+
+def current_generation(directory: str) -> Optional[str]:
+    """Generation directory the layer directory serves, `None` if never converted"""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _write_blob(directory: str, name: str, items: list[bytes]):
+    """Variable length byte strings as one file plus an offsets array"""
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in items], out=offsets[1:])
+    with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+        for item in items:
+            f.write(item)
+    np.save(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+
+
+def _column_kind(values: list) -> str:
+    present = [v for v in values if v is not _MISSING and v is not None]
+    if all(isinstance(v, bool) for v in present) and len(present) == len(values):
+        return "bool"
+    if any(isinstance(v, bool) for v in present):
+        return "json"
+    if all(isinstance(v, int) for v in present):
+        return "int"
+    if all(isinstance(v, (int, float)) for v in present):
+        return "float"
+    if all(isinstance(v, str) for v in present):
+        return "str"
+    return "json"
+
+
+def convert_geojson_layer(source_path: str, directory: str) -> int:
+    """
+    One-time conversion of a GeoJSON layer into the memory-mappable columnar layout read
+    by `ColumnarLayer`.
+
+    args:
+    ----
+    `source_path` is the GeoJSON FeatureCollection
+    `directory` receives the columns in a new generation directory, which then becomes
+    its current generation
+
+    return:
+    ------
+    the number of converted features
+    """
+    with open(source_path, "rb") as f:
+        features = orjson.loads(f.read()).get("features", [])
+    logger.info(f"Converting {len(features)} features of {source_path}")
+
+    generation = f"{time.time_ns()}-{os.getpid()}"
+    tmp_dir = os.path.join(directory, f"{generation}.tmp")
+    os.makedirs(os.path.join(tmp_dir, "columns"), exist_ok=True)
+
+    geometries = [feature.get("geometry") or {} for feature in features]
+    is_polygon = np.array([g.get("type") == "Polygon" for g in geometries], dtype=bool)
+    shapes = shapely.from_geojson(
+        [orjson.dumps(g) if g else "null" for g in geometries], on_invalid="ignore"
+    )
+    # Polygon bounds from their coordinates, like the original per-feature check
+    bbox = shapely.bounds(shapes)
+    area_km2 = np.array(
+        [
+            calculate_polygon_area_km2(g.get("coordinates", [])) if polygon else 0.0
+            for g, polygon in zip(geometries, is_polygon)
+        ],
+        dtype=np.float64,
+    )
+    np.save(os.path.join(tmp_dir, "bbox.npy"), bbox)
+    np.save(os.path.join(tmp_dir, "is_polygon.npy"), is_polygon)
+    np.save(os.path.join(tmp_dir, "area_km2.npy"), area_km2)
+    _write_blob(
+        tmp_dir, "wkb", [b"" if w is None else w for w in shapely.to_wkb(shapes)]
+    )
+    _write_blob(tmp_dir, "features", [orjson.dumps(feature) for feature in features])
+
+    # One column per property, in order of first appearance
+    keys = {}
+    for feature in features:
+        keys.update(dict.fromkeys(feature.get("properties") or {}))
+    columns = {}
+    for key in keys:
+        values = [(f.get("properties") or {}).get(key, _MISSING) for f in features]
+        kind = _column_kind(values)
+        missing = np.array([v is _MISSING or v is None for v in values], dtype=bool)
+        if kind == "float":
+            array = np.array(
+                [np.nan if m else v for v, m in zip(values, missing)], dtype=np.float64
+            )
+        elif kind == "bool":
+            array = np.array(values, dtype=bool)
+        else:
+            if kind == "int":
+                array = np.array(
+                    [0 if m else v for v, m in zip(values, missing)], dtype=np.int64
+                )
+            else:
+                array = np.array(
+                    [
+                        "" if m else v if kind == "str" else orjson.dumps(v).decode()
+                        for v, m in zip(values, missing)
+                    ],
+                    dtype=str,
+                )
+            np.save(
+                os.path.join(tmp_dir, "columns", f"{len(columns)}.missing.npy"),
+                missing,
+            )
+        np.save(os.path.join(tmp_dir, "columns", f"{len(columns)}.npy"), array)
+        columns[key] = kind
+
+    stat = os.stat(source_path)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(
+            {
+                "source": source_path,
+                "source_mtime": stat.st_mtime,
+                "source_size": stat.st_size,
+                "count": len(features),
+                "columns": list(columns.items()),
+            },
+            f,
+        )
+
+    # Generations are never modified once published, so an open layer never sees
+    # files of another conversion
+    previous = current_generation(directory)
+    os.replace(tmp_dir, os.path.join(directory, generation))
+    pointer = os.path.join(directory, f"{CURRENT_FILE}.{generation}.tmp")
+    with open(pointer, "w") as f:
+        f.write(generation)
+    os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+
+    # The previous generation stays for workers still opening it, older ones go.
+    # CURRENT is read again in case a concurrent conversion published after this one.
+    keep = (CURRENT_FILE, generation, previous, current_generation(directory))
+    for name in os.listdir(directory):
+        if name in keep or name.endswith(".tmp"):
+            continue
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+    return len(features)
+
+
+def source_zoom_levels(layer_type: str) -> list[int]:
+    """Zoom levels with a GeoJSON source of the layer type"""
+    pattern = LAYER_SOURCES[layer_type]
+    prefix, suffix = pattern.split("{zoom_level}")
+    zoom_levels = []
+    for path in glob.glob(pattern.format(zoom_level="*")):
+        zoom = path[len(prefix) : len(path) - len(suffix)]
+        if zoom.isdigit():
+            zoom_levels.append(int(zoom))
+    return sorted(zoom_levels)
+
+
+def _source_changed(meta: dict, source_path: str) -> bool:
+    """Whether the GeoJSON source differs from the one a generation was converted from"""
+    stat = os.stat(source_path)
+    return (meta["source_mtime"], meta["source_size"]) != (stat.st_mtime, stat.st_size)
+
+
+def convert_layer(layer_type: str, zoom_level: int, force: bool = False) -> bool:
+    """
+    Converts the GeoJSON source of a layer type and zoom level unless its current
+    generation was converted from the same source. Run for every layer on deploy,
+    through the command line below, `open_layer` converts a layer the deploy missed.
+
+    return:
+    ------
+    whether a new generation was converted
+    """
+    source_path = LAYER_SOURCES[layer_type].format(zoom_level=zoom_level)
+    directory = layer_dir(layer_type, zoom_level)
+    if not os.path.exists(source_path):
+        return False
+    generation = current_generation(directory)
+    if generation is not None and not force:
+        with open(os.path.join(directory, generation, "meta.json")) as f:
+            meta = json.load(f)
+        if not _source_changed(meta, source_path):
+            return False
+    convert_geojson_layer(source_path, directory)
+    return True
+
+
+class ColumnarLayer:
+    """
+    Read side of a converted layer generation. Every file is memory mapped when the layer
+    is opened, a bbox query reads the bbox column and then only the rows of the features
+    it selects.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.bbox = self._load("bbox.npy")
+        self.is_polygon = self._load("is_polygon.npy")
+        self.area_km2 = self._load("area_km2.npy")
+        self._wkb, self._wkb_offsets = self._load_blob("wkb")
+        self._features, self._feature_offsets = self._load_blob("features")
+        self.columns = dict(self.meta["columns"])
+        self._columns = {
+            name: self._load(f"columns/{i}.npy") for i, name in enumerate(self.columns)
+        }
+        self._missing_columns = {
+            name: self._load(f"columns/{i}.missing.npy")
+            for i, (name, kind) in enumerate(self.columns.items())
+            if kind not in ("float", "bool")
+        }
+        self._index: Optional[tuple[shapely.STRtree, np.ndarray]] = None
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.directory, name), mmap_mode="r")
+
+    def _load_blob(self, name: str) -> tuple[np.ndarray, np.ndarray]:
+        path = os.path.join(self.directory, f"{name}.bin")
+        # numpy cannot memory map an empty file
+        blob = (
+            np.memmap(path, dtype=np.uint8, mode="r")
+            if os.path.getsize(path)
+            else np.zeros(0, dtype=np.uint8)
+        )
+        return blob, self._load(f"{name}_offsets.npy")
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    def spatial_index(self) -> tuple[shapely.STRtree, np.ndarray]:
+        """
+        STRtree of the bounds of the polygon features and the row of each tree item,
+        built on first use and kept for as long as the layer stays open
+        """
+        if self._index is None:
+            bbox = np.asarray(self.bbox)
+            rows = np.flatnonzero(
+                np.asarray(self.is_polygon) & np.isfinite(bbox).all(axis=1)
+            )
+            bounds = bbox[rows]
+            tree = shapely.STRtree(
+                shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+            )
+            self._index = (tree, rows)
+        return self._index
+
+    def query_bbox(
+        self, min_lng: float, min_lat: float, max_lng: float, max_lat: float
+    ) -> np.ndarray:
+        """Rows of the polygon features whose bounds overlap the viewport, in file order"""
+        if not (min_lng <= max_lng and min_lat <= max_lat):
+            return np.zeros(0, dtype=np.int64)
+        tree, rows = self.spatial_index()
+        hits = tree.query(shapely.box(min_lng, min_lat, max_lng, max_lat))
+        return np.sort(rows[hits])
+
+    def column(self, name: str, rows: np.ndarray) -> np.ndarray:
+        """Values of a numeric property at `rows`, NaN where missing"""
+        values = np.asarray(self._columns[name][rows])
+        if self.columns[name] != "int":
+            return values
+        missing = self._missing(name, rows)
+        if not missing.any():
+            return values
+        values = values.astype(np.float64)
+        values[missing] = np.nan
+        return values
+
+    def _missing(self, name: str, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self._missing_columns[name][rows])
+
+    def _values(self, name: str, rows: np.ndarray) -> list:
+        kind = self.columns[name]
+        values = self.column(name, rows)
+        if kind in ("int", "float", "bool"):
+            return values
+        missing = self._missing(name, rows)
+        if kind == "json":
+            return [None if m else orjson.loads(v) for v, m in zip(values, missing)]
+        return [None if m else str(v) for v, m in zip(values, missing)]
+
+    def _slices(self, blob: np.ndarray, offsets: np.ndarray, rows: np.ndarray) -> list:
+        starts, stops = offsets[rows], offsets[rows + 1]
+        return [blob[start:stop].tobytes() for start, stop in zip(starts, stops)]
+
+    def geometries(self, rows: np.ndarray) -> np.ndarray:
+        return shapely.from_wkb(self._slices(self._wkb, self._wkb_offsets, rows))
+
+    def features(self, rows: np.ndarray) -> list[dict]:
+        """The original GeoJSON features at `rows`"""
+        return [
+            orjson.loads(item)
+            for item in self._slices(self._features, self._feature_offsets, rows)
+        ]
+
+    def to_geodataframe(self, rows: np.ndarray) -> gpd.GeoDataFrame:
+        """Same frame as `GeoDataFrame.from_features(self.features(rows))`"""
+        if len(rows) == 0:
+            return gpd.GeoDataFrame()
+        data = {"geometry": self.geometries(rows)}
+        for name in self.columns:
+            data[name] = self._values(name, rows)
+        return gpd.GeoDataFrame(data, geometry="geometry")
+
+
+def _generation_is_stale(layer_type: str, zoom_level: int, generation: str) -> bool:
+    """
+    Whether the GeoJSON source of a layer changed since `generation` was converted, a
+    generation without its source is kept
+    """
+    source_path = LAYER_SOURCES[layer_type].format(zoom_level=zoom_level)
+    if not os.path.exists(source_path):
+        return False
+    directory = layer_dir(layer_type, zoom_level)
+    opened = _open_layers.get(directory)
+    if opened is not None and opened[0] == generation:
+        meta = opened[1].meta
+    else:
+        with open(os.path.join(directory, generation, "meta.json")) as f:
+            meta = json.load(f)
+    return _source_changed(meta, source_path)
+
+
+def open_layer(layer_type: str, zoom_level: int) -> Optional[ColumnarLayer]:
+    """
+    Current generation of the columnar layer of a layer type and zoom level, as converted
+    by `convert_layer`. A layer that was never converted, or whose GeoJSON source
+    changed since, is converted from its source first. An open layer is reused, with its
+    spatial index, until another generation is converted.
+
+    return:
+    ------
+    the layer, or `None` if the layer has neither a conversion nor a source
+    """
+    directory = layer_dir(layer_type, zoom_level)
+    generation = current_generation(directory)
+    if generation is None or _generation_is_stale(layer_type, zoom_level, generation):
+        with _convert_lock:
+            if convert_layer(layer_type, zoom_level):
+                logger.info(
+                    f"Converted the {layer_type} layer at zoom {zoom_level}, its "
+                    f"source is new or changed"
+                )
+        generation = current_generation(directory)
+        if generation is None:
+            return None
+
+    with _open_lock:
+        opened = _open_layers.get(directory)
+        if opened is not None and opened[0] == generation:
+            return opened[1]
+        layer = ColumnarLayer(os.path.join(directory, generation))
+        _open_layers[directory] = (generation, layer)
+        return layer
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(funcName)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(
+        description="Convert the intelligence GeoJSON layers to the columnar layout"
+    )
+    parser.add_argument("--layer", choices=list(LAYER_SOURCES), nargs="*")
+    parser.add_argument(
+        "--zoom", type=int, nargs="+", help="Defaults to every zoom level with a source"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Convert even if the source is unchanged"
+    )
+    args = parser.parse_args()
+
+    for layer_type in args.layer or list(LAYER_SOURCES):
+        for zoom_level in args.zoom or source_zoom_levels(layer_type):
+            if convert_layer(layer_type, zoom_level, args.force):
+                logger.info(f"Converted the {layer_type} layer at zoom {zoom_level}")
+            elif open_layer(layer_type, zoom_level) is None:
+                logger.warning(f"No {layer_type} layer at zoom {zoom_level}")
@@ -84,6 +84,33 @@ class ApiConfig(CommonApiConfig):
         backend_base_uri + "fetch_population_by_viewport"
     )
     temp_sales_man_problem = backend_base_uri + "temp_sales_man_problem"
+    sales_man_scenarios: str = backend_base_uri + "sales_man_scenarios"
+    sales_man_jobs: str = backend_base_uri + "sales_man_jobs"
+    sales_man_job_status: str = backend_base_uri + "sales_man_jobs/{job_id}"
+    sales_man_job_ttl_seconds: int = 3600
+    sales_man_raw_data: str = (
+        backend_base_uri + "sales_man_raw_data/{user_id}/{request_id}/{layer}"
+    )
+    # Persistent basemap tile cache of the territory plots, see tile_cache.py
+    tile_cache_dir: str = "cache/tiles"
+    tile_cache_max_bytes: int = 512 * 1024**2
+    # Cross-request cache of territory intermediates, see intermediate_cache.py
+    territory_cache_dir: str = "cache/territory"
+    territory_cache_ttl_seconds: int = 6 * 3600
+    territory_cache_max_memory_bytes: int = 256 * 1024**2
+    territory_cache_max_disk_bytes: int = 2 * 1024**3
+    # Datasets older than this are not served and deleted by the background sweeper
+    dataset_ttl_days: int = 90
+    dataset_sweep_interval_seconds: int = 3600
+    dataset_sweep_batch_size: int = 500
+    # Memory-mapped columnar copies of the intelligence layers, see columnar_layers.py
+    columnar_layers_dir: str = "cache/layers"
+    # Travel cost providers of the territory accessibility
+    travel_cost_matrix_dir: str = "Backend/travel_cost_matrices"
+    road_speed_kmh: float = 30.0
+    road_circuity: float = 1.3
+    # Worker processes for CPU-bound territory stages, 0 runs them inline
+    cpu_pool_workers: int = 2
 
     @classmethod
     def get_conf(cls):
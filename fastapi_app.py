@@ -18,13 +18,17 @@ from fastapi import (
     File,
     Form,
 )
-from all_types.response_dtypes import ResSalesman
+from all_types.response_dtypes import (
+    ResSalesman,
+    ResSalesmanJob,
+    ResSalesmanScenarios,
+)
 from fetch_dataset_llm import process_llm_query
 import json
 from backend_common.background import set_background_tasks
 from fastapi.middleware.cors import CORSMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 from pydantic import ValidationError
 import asyncio
@@ -62,6 +66,7 @@ from all_types.request_dtypes import (
     ReqSrcDistination,
     ReqIntelligenceData,
     ReqClustersForSalesManData,
+    ReqClustersForSalesManScenarios,
 )
 from backend_common.request_processor import request_handling
 from backend_common.auth import (
@@ -74,6 +79,7 @@ from backend_common.auth import (
     change_email,
     firebase_db,
     JWTBearer,
+    JWTTokenBearer,
     create_user_profile,
 )
 
@@ -166,8 +172,14 @@ from recolor_filter import (
     recolor_based_on,
     filter_based_on,
 )
-from storage import fetch_intelligence_by_viewport
-from sales_man_problem import get_clusters_for_sales_man
+from storage import fetch_intelligence_by_viewport, run_dataset_sweeper
+from sales_man_problem import (
+    get_clusters_for_sales_man,
+    get_clusters_for_sales_man_scenarios,
+    territory_raw_layer_lines,
+)
+from process_pool import shutdown_process_pool
+from territory_jobs import get_sales_man_job, submit_sales_man_job
 
 # TODO: Add stripe secret key
 
@@ -282,11 +294,15 @@ async def startup_event():
     await firebase_db.initialize_all()
     # Clean up old plots on startup
     cleanup_old_plots()
+    # Expired datasets are deleted in the background instead of on the read path
+    app.state.dataset_sweeper = asyncio.create_task(run_dataset_sweeper())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    app.state.dataset_sweeper.cancel()
     await Database.close_pool()
+    await asyncio.get_event_loop().run_in_executor(None, shutdown_process_pool)
     # Run cleanup in a thread to not block
     await asyncio.get_event_loop().run_in_executor(None, firebase_db.cleanup)
     # Wait a moment to ensure threads are cleaned up
@@ -1214,3 +1230,78 @@ async def ep_fetch_clusters_for_sales_man(
         wrap_output=True,
     )
     return response
+
+
+@app.post(
+    CONF.sales_man_scenarios,
+    response_model=ResModel[ResSalesmanScenarios],
+    dependencies=[Depends(JWTBearer())],
+)
+async def ep_fetch_clusters_for_sales_man_scenarios(
+    req: ReqModel[ReqClustersForSalesManScenarios], request: Request
+):
+    response = await request_handling(
+        req.request_body,
+        ReqClustersForSalesManScenarios,
+        ResModel[ResSalesmanScenarios],
+        get_clusters_for_sales_man_scenarios,
+        wrap_output=True,
+    )
+    return response
+
+
+@app.post(
+    CONF.sales_man_jobs,
+    response_model=ResModel[ResSalesmanJob],
+    dependencies=[Depends(JWTBearer())],
+)
+async def ep_submit_sales_man_job(
+    req: ReqModel[ReqClustersForSalesManData], request: Request
+):
+    response = await request_handling(
+        req.request_body,
+        ReqClustersForSalesManData,
+        ResModel[ResSalesmanJob],
+        submit_sales_man_job,
+        wrap_output=True,
+    )
+    return response
+
+
+@app.get(
+    CONF.sales_man_job_status,
+    response_model=ResModel[ResSalesmanJob],
+)
+async def ep_sales_man_job_status(
+    job_id: str, token_user_id: Optional[str] = Depends(JWTTokenBearer())
+):
+    job = await get_sales_man_job(job_id, token_user_id)
+    response = ResModel(
+        data=job,
+        message="Sales territory job status",
+        request_id=str(uuid.uuid4()),
+    )
+    return response
+
+
+@app.get(
+    CONF.sales_man_raw_data,
+    response_class=StreamingResponse,
+)
+async def ep_sales_man_raw_data(
+    user_id: str,
+    request_id: str,
+    layer: str,
+    precision: int = 6,
+    token_user_id: Optional[str] = Depends(JWTTokenBearer()),
+):
+    if token_user_id is not None and token_user_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Raw territory layers are only served to their own user",
+        )
+    # One GeoJSON feature per line, streamed without building the whole document
+    lines = await territory_raw_layer_lines(
+        user_id, request_id, layer, min(max(precision, 0), 8)
+    )
+    return StreamingResponse(lines, media_type="application/x-ndjson")
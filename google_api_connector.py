@@ -29,7 +29,8 @@ from storage import (
     make_dataset_filename_part,
     store_data_resp,
     store_place_details,
-    load_place_details
+    load_place_details,
+    select_sub_properties,
 )
 from tests.utils import _get_test_data_for_get_call,_get_test_data_for_post_call,_get_test_data_for_street_view
 
@@ -815,36 +816,6 @@ async def fetch_ggl_nearby(req: ReqFetchDataset):
 
     return dataset, bknd_dataset_id, next_page_token, plan_name, next_plan_index
 
-def select_sub_properties(dataset):
-    fields = [
-        "displayName", "rating", "formattedAddress", "internationalPhoneNumber",
-        "types", "priceLevel", "primaryType", "userRatingCount", "location",
-        "name", "id"
-    ]
-   
-    filtered_features = []
-   
-    for feature in dataset.get("features", []):
-        # Create new filtered feature with proper GeoJSON structure
-        filtered_feature = {
-            "type": feature.get("type", "Feature"),
-            "geometry": feature.get("geometry"),  # Keep the geometry
-            "properties": {}  # Start with empty properties dict
-        }
-        
-        # Only add the properties we want
-        feature_properties = feature.get("properties", {})
-        for field in fields:
-            if field in feature_properties:
-                filtered_feature["properties"][field] = feature_properties[field]
-        
-        filtered_features.append(filtered_feature)
-   
-    # Update the dataset with filtered features
-    dataset["features"] = filtered_features
-    return dataset
-
-
 def filter_ggl_data_valid_locations(req:ReqFetchDataset, dataset):
     """
     Filters dataset features based on specific criteria:
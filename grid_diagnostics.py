@@ -0,0 +1,181 @@
+import logging
+from typing import Optional
+
+import geopandas as gpd
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Number of rows inspected by the per-row checks
+SAMPLE_SIZE = 5
+
+
+def _stats(values: np.ndarray) -> dict:
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {"min": None, "max": None, "mean": None, "sum": 0.0, "nan_count": 0}
+    return {
+        "min": float(np.nanmin(values)),
+        "max": float(np.nanmax(values)),
+        "mean": float(np.nanmean(values)),
+        "sum": float(np.nansum(values)),
+        "nan_count": int(np.isnan(values).sum()),
+    }
+
+
+def accessibility_checks(accessibility_counts: np.ndarray) -> dict:
+    """Distribution of the number of destinations within reach of each origin"""
+    return {
+        **_stats(accessibility_counts),
+        "service_deserts": int(np.sum(accessibility_counts == 1)),
+        "well_served": int(np.sum(accessibility_counts >= 5)),
+        "unreachable_origins": int(np.sum(accessibility_counts == 0)),
+    }
+
+
+def income_checks(
+    raw_income: np.ndarray,
+    income_values: np.ndarray,
+    effective_population: np.ndarray,
+) -> dict:
+    """Quality of the income weights before and after filling missing values"""
+    raw_nan_count = int(np.isnan(raw_income).sum())
+    return {
+        "valid_count": len(raw_income) - raw_nan_count,
+        "nan_count": raw_nan_count,
+        "filled_with": (
+            None
+            if raw_nan_count == 0
+            else "neutral" if raw_nan_count == len(raw_income) else "median"
+        ),
+        "length_mismatch": len(raw_income) != len(effective_population),
+        "weights": _stats(income_values),
+        "effective_population": _stats(effective_population),
+    }
+
+
+def market_checks(
+    od_indptr: np.ndarray,
+    od_indices: np.ndarray,
+    effective_population: np.ndarray,
+    market: np.ndarray,
+) -> dict:
+    """
+    Market potential of the destinations and the origins contributing to a sample of them.
+
+    args:
+    ----
+    `od_indptr`, `od_indices` are the origin-destination pairs in reach, as returned by the
+    distance backends
+    `effective_population` is the weight of each origin
+    `market` is the market potential of each destination
+
+    return:
+    ------
+    a json serializable dict of the checks
+    """
+    market = np.asarray(market, dtype=float)
+    od_origins = np.repeat(np.arange(len(od_indptr) - 1), np.diff(od_indptr))
+    sample = []
+    for i in range(min(SAMPLE_SIZE, len(market))):
+        contributors = effective_population[od_origins[od_indices == i]]
+        sample.append(
+            {
+                "destination": i,
+                "contributing_origins": len(contributors),
+                "contributors_sum": float(contributors.sum()),
+                "nan_contributors": bool(np.isnan(contributors).any()),
+            }
+        )
+
+    return {
+        **_stats(market),
+        "zero_count": int(np.sum(market == 0)),
+        "od_pairs": len(od_indices),
+        "zero_weight_origins": int(np.sum(effective_population == 0)),
+        "sample_destinations": sample,
+    }
+
+
+def spatial_join_checks(
+    origins: gpd.GeoDataFrame,
+    destinations: gpd.GeoDataFrame,
+    grid: gpd.GeoDataFrame,
+) -> dict:
+    """
+    Overlap of the data with the grid and how a sample of origins falls into grid cells.
+
+    args:
+    ----
+    `origins` are the population polygons
+    `destinations` are the place points
+    `grid` are the grid cells the data is joined to
+
+    return:
+    ------
+    a json serializable dict of the checks
+    """
+    o_minx, o_miny, o_maxx, o_maxy = origins.total_bounds
+    g_minx, g_miny, g_maxx, g_maxy = grid.total_bounds
+    overlap_x = max(0, min(o_maxx, g_maxx) - max(o_minx, g_minx))
+    overlap_y = max(0, min(o_maxy, g_maxy) - max(o_miny, g_miny))
+    if overlap_x <= 0 or overlap_y <= 0:
+        logger.error("No spatial overlap between origins and grid")
+
+    cell_minx, cell_miny, cell_maxx, cell_maxy = grid.geometry.iloc[0].bounds
+    sindex = grid.sindex
+
+    sample = []
+    for geom in origins.geometry.iloc[:SAMPLE_SIZE]:
+        centroid = geom.centroid
+        sample.append(
+            {
+                "bounds": [float(v) for v in geom.bounds],
+                "overlapping_cells": len(sindex.query(geom, predicate="intersects")),
+                "containing_cells": len(sindex.query(geom, predicate="within")),
+                "centroid_containing_cells": len(
+                    sindex.query(centroid, predicate="within")
+                ),
+            }
+        )
+
+    # Share of the sample joined to a cell by each predicate
+    sample_origins = origins.geometry.iloc[:SAMPLE_SIZE].values
+    within_hits = sindex.query(sample_origins, predicate="within")[0]
+    intersects_hits = sindex.query(sample_origins, predicate="intersects")[0]
+
+    return {
+        "origins_bounds": [float(v) for v in origins.total_bounds],
+        "grid_bounds": [float(v) for v in grid.total_bounds],
+        "destinations_bounds": [float(v) for v in destinations.total_bounds],
+        "bounds_overlap": [float(overlap_x), float(overlap_y)],
+        "grid_cell_size": [float(cell_maxx - cell_minx), float(cell_maxy - cell_miny)],
+        "sample_origins": sample,
+        "sample_joined_within": len(np.unique(within_hits)),
+        "sample_joined_intersects": len(np.unique(intersects_hits)),
+        "sample_size": len(sample_origins),
+    }
+
+
+def aggregation_checks(
+    population_grid: gpd.GeoDataFrame,
+    places_grid: gpd.GeoDataFrame,
+    n_grid_cells: int,
+    n_cells_with_data: Optional[int] = None,
+) -> dict:
+    """Results of joining the origins and destinations to the grid cells"""
+    failed_population = population_grid[population_grid["index_right"].isna()]
+    return {
+        "grid_cells": n_grid_cells,
+        "cells_with_data": n_cells_with_data,
+        "population_joined": int(population_grid["index_right"].notna().sum()),
+        "population_total": len(population_grid),
+        "places_joined": int(places_grid["index_right"].notna().sum()),
+        "places_total": len(places_grid),
+        "cells_with_population": int(population_grid["index_right"].nunique()),
+        "cells_with_places": int(places_grid["index_right"].nunique()),
+        "failed_population_sample": [
+            geom.wkt for geom in failed_population.geometry.iloc[:SAMPLE_SIZE]
+        ],
+    }
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class IntermediateCache:
+    """
+    Content-addressed two-tier cache (memory, then disk) for intermediate results that
+    are expensive to recompute. Values are stored pickled so every hit returns a fresh
+    copy that callers may modify. Both tiers expire entries after `ttl_seconds` and evict
+    the least recently used entries beyond their byte bound. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl_seconds: float,
+        max_memory_bytes: int,
+        max_disk_bytes: int,
+    ):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        # key -> (created_at, pickled value), oldest access first
+        self._memory: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Stable key of the parts that determine the cached value"""
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value of `key`, or `None` when missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created_at, payload = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self._touch(key, now, created_at)
+                    return pickle.loads(payload)
+                self._drop_from_memory(key)
+
+            path = self._path(key)
+            try:
+                created_at = os.path.getmtime(path)
+                if now - created_at > self.ttl_seconds:
+                    os.remove(path)
+                    return None
+                with open(path, "rb") as f:
+                    payload = f.read()
+            except FileNotFoundError:
+                return None
+
+            self._touch(key, now, created_at)
+            self._add_to_memory(key, created_at, payload)
+            return pickle.loads(payload)
+
+    def put(self, key: str, value: Any):
+        """Stores `value` under `key` in memory and on disk"""
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            self._drop_from_memory(key)
+            self._add_to_memory(key, now, payload)
+
+            if len(payload) > self.max_disk_bytes:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+
+    def _add_to_memory(self, key: str, created_at: float, payload: bytes):
+        if len(payload) > self.max_memory_bytes:
+            return
+        self._memory[key] = (created_at, payload)
+        self._memory_bytes += len(payload)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _drop_from_memory(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[1])
+
+    def _touch(self, key: str, now: float, created_at: float):
+        """Marks the disk entry as recently used (atime), keeping its creation time (mtime)"""
+        try:
+            os.utime(self._path(key), (now, created_at))
+        except FileNotFoundError:
+            pass
+
+    def _evict_disk(self):
+        """Removes expired files, then the least recently used ones beyond the bound"""
+        now = time.time()
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.directory, name)
+            stat = os.stat(path)
+            if now - stat.st_mtime > self.ttl_seconds:
+                os.remove(path)
+                continue
+            files.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+            logger.info(f"Evicted {os.path.basename(path)} from {self.directory}")
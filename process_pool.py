@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from config_factory import CONF
+
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Returns the shared process pool for CPU-bound work, creating it on first use.
+
+    return:
+    ------
+    the executor, or `None` when `CONF.cpu_pool_workers` is 0 (work runs inline)
+    """
+    global _executor
+    if CONF.cpu_pool_workers <= 0:
+        return None
+    if _executor is None:
+        # spawn keeps workers free of the parent's event loop, db pool and firebase threads
+        _executor = ProcessPoolExecutor(
+            max_workers=CONF.cpu_pool_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(
+            f"Started CPU process pool with {CONF.cpu_pool_workers} workers"
+        )
+    return _executor
+
+
+async def run_cpu_bound(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Runs a CPU-bound function without blocking the event loop.
+
+    args:
+    ----
+    `func` is a module level function, its arguments and return value must be picklable
+    `args`, `kwargs` are passed through to `func`
+
+    return:
+    ------
+    the return value of `func`
+    """
+    executor = get_process_pool()
+    if executor is None:
+        return func(*args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+def shutdown_process_pool():
+    """Stops the worker processes, called from the application shutdown event"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        logger.info("CPU process pool shut down")
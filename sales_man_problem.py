@@ -2,19 +2,34 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import geopandas as gpd
-from shapely.geometry import box, Polygon
+from shapely.geometry import Polygon
 import shapely
 from all_types.request_dtypes import (
     ReqIntelligenceData,
     ReqFetchDataset,
     ReqClustersForSalesManData,
+    ReqClustersForSalesManScenarios,
 )
-from storage import fetch_intelligence_by_viewport
+from storage import load_intelligence_frame
 from data_fetcher import fetch_country_city_data, fetch_dataset
+from territory_balancer import (
+    assign_balanced_territories,
+    match_previous_labels,
+    repair_territories,
+)
+from process_pool import run_cpu_bound
+from tile_cache import BASEMAP_SOURCE, configure_tile_cache, enforce_tile_cache_limit
+from intermediate_cache import IntermediateCache
+import grid_diagnostics
+from config_factory import CONF
+from backend_common.background import get_background_tasks
 import contextily as ctx
-from typing import Tuple
+from fastapi import HTTPException, status
+from typing import Awaitable, Callable, Iterator, Tuple
+from functools import partial
 import asyncio
 import logging
+import orjson
 import os
 import uuid
 from datetime import datetime
@@ -50,7 +65,7 @@ async def get_population_and_income(
 ) -> Tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
     """
     Fetch both population and income data for a specific bounding box and zoom level
-    using the API endpoint, making two separate calls.
+    from the columnar intelligence layers, making two separate reads.
 
     Args:
         bounding_box: List of (longitude, latitude) tuples defining the area
@@ -85,30 +100,11 @@ async def get_population_and_income(
         **base_request, population=True, income=True
     )
 
-    # Fetch both datasets concurrently
-
-    population_task = fetch_intelligence_by_viewport(population_request)
-    income_task = fetch_intelligence_by_viewport(income_request)
-
-    # Wait for both tasks to complete
-    population_data, income_data = await asyncio.gather(
-        population_task, income_task
-    )
-
-    # Process population data
-    population_features = population_data.get("features", [])
-    population_gdf = (
-        gpd.GeoDataFrame.from_features(population_features)
-        if population_features
-        else gpd.GeoDataFrame()
-    )
-
-    # Process income data
-    income_features = income_data.get("features", [])
-    income_gdf = (
-        gpd.GeoDataFrame.from_features(income_features)
-        if income_features
-        else gpd.GeoDataFrame()
+    # Load both layers concurrently as GeoDataFrames straight from their
+    # memory mapped columnar copies, only the rows within the bounding box are read
+    population_gdf, income_gdf = await asyncio.gather(
+        asyncio.to_thread(load_intelligence_frame, population_request),
+        asyncio.to_thread(load_intelligence_frame, income_request),
     )
 
     return population_gdf, income_gdf
@@ -143,8 +139,61 @@ def filter_data_by_bounding_box(
     return places
 
 
+def square_grid_cells(
+    minx: float, miny: float, maxx: float, maxy: float, grid_size: float
+) -> np.ndarray:
+    """
+    Fishnet of `grid_size` squares covering the bounds, built from coordinate arrays in one
+    shapely call. Cells are ordered column by column (x outer, y inner)
+    """
+    xs, ys = np.meshgrid(
+        np.arange(minx, maxx, grid_size),
+        np.arange(miny, maxy, grid_size),
+        indexing="ij",
+    )
+    xs, ys = xs.ravel(), ys.ravel()
+    return shapely.box(xs, ys, xs + grid_size, ys + grid_size)
+
+
+def hexagon_grid_cells(
+    minx: float, miny: float, maxx: float, maxy: float, grid_size: float
+) -> np.ndarray:
+    """
+    Pointy-top hexagonal tessellation covering the bounds. Each hexagon has the ground
+    area of a `grid_size` square and every cell has six neighbours at the same ground
+    distance: longitudes are stretched by 1/cos(latitude) so cells are regular on the
+    ground rather than in degrees
+    """
+    lng_scale = 1 / np.cos(np.radians((miny + maxy) / 2))
+    side = grid_size * np.sqrt(2 / (3 * np.sqrt(3)))
+    col_spacing = np.sqrt(3) * side
+    row_spacing = 1.5 * side
+
+    n_rows = int(np.ceil((maxy - miny) / row_spacing)) + 1
+    n_cols = int(np.ceil((maxx - minx) / (col_spacing * lng_scale))) + 1
+    rows, cols = np.meshgrid(np.arange(n_rows), np.arange(n_cols), indexing="ij")
+    rows, cols = rows.ravel(), cols.ravel()
+
+    # Odd rows shift half a cell to the right
+    center_x = minx + (cols + 0.5 * (rows % 2)) * col_spacing * lng_scale
+    center_y = miny + rows * row_spacing
+
+    angles = np.radians(30 + 60 * np.arange(7))  # closed ring
+    ring_x = center_x[:, None] + side * lng_scale * np.cos(angles)[None, :]
+    ring_y = center_y[:, None] + side * np.sin(angles)[None, :]
+    return shapely.polygons(np.stack([ring_x, ring_y], axis=-1))
+
+
+GRID_CELL_BUILDERS = {
+    "square": square_grid_cells,
+    "hex": hexagon_grid_cells,
+}
+
+
 def create_grid(
-    population: gpd.GeoDataFrame | None = None, grid_size: int | None = None
+    population: gpd.GeoDataFrame | None = None,
+    grid_size: int | None = None,
+    grid_shape: str = "square",
 ) -> gpd.GeoDataFrame:
     """
     args:
@@ -152,6 +201,7 @@ def create_grid(
     `pouplation` is the filtered data set from `get_population_by_zoom_in_bounding_box`
     `grid_size` is the size of the grid. if set None the grid size will be calculated based on the
     available data. donot set its value unless necessary
+    `grid_shape` is "square" (fishnet) or "hex" (hexagons of the same area as the squares)
 
     return:
     ------
@@ -199,35 +249,16 @@ def create_grid(
             f"Using manual grid size: {grid_size:.6f} degrees ({grid_size * 111.32:.2f} km)"
         )
 
-    # Calculate expected number of grid cells
-    expected_x_cells = int(np.ceil((maxx - minx) / grid_size))
-    expected_y_cells = int(np.ceil((maxy - miny) / grid_size))
-    expected_total_cells = expected_x_cells * expected_y_cells
-
-    logger.info(
-        f"Expected grid dimensions: {expected_x_cells} × {expected_y_cells} = {expected_total_cells} total cells"
-    )
+    if grid_shape not in GRID_CELL_BUILDERS:
+        raise ValueError(f"Unknown grid shape: {grid_shape}")
 
     # Create regular tessellation using systematic sampling theory
-    # Generates a fishnet grid of square polygons covering the entire study area
-    # Each box(x, y, x+size, y+size) creates a square polygon geometry
-    # Uses nested list comprehension for efficient vectorized grid generation
+    # Generates a fishnet of squares (or a hexagonal tiling) covering the entire study area
+    # Geometries are created from coordinate arrays in a single vectorized shapely call
     # Example: For 55km x 45km area with 1.57km grid size = ~35 x 29 = ~1015 grid cells
-    grid_cells = [
-        box(
-            x, y, x + grid_size, y + grid_size
-        )  # Create square polygon for each grid position
-        for x in np.arange(
-            minx, maxx, grid_size
-        )  # Iterate through x-coordinates
-        for y in np.arange(
-            miny, maxy, grid_size
-        )  # Iterate through y-coordinates
-    ]
+    grid_cells = GRID_CELL_BUILDERS[grid_shape](minx, miny, maxx, maxy, grid_size)
 
-    logger.info(
-        f"Generated {len(grid_cells)} grid cells (expected {expected_total_cells})"
-    )
+    logger.info(f"Generated {len(grid_cells)} {grid_shape} grid cells")
 
     # Convert list of geometries to GeoDataFrame with proper coordinate reference system
     # Inherits CRS from population data to maintain spatial accuracy
@@ -239,45 +270,28 @@ def create_grid(
     return grid
 
 
-def haversine(
+def haversine_km(
     lat1_array: np.ndarray,
     lon1_array: np.ndarray,
     lat2_array: np.ndarray,
     lon2_array: np.ndarray,
 ) -> np.ndarray:
     """
+    Haversine kernel of the distance backends and travel cost providers.
+
     args:
-    `lat1_array, lon1_array, lat2_array, lon2_array` are the arrays of origins and destinations.
-    lat1, lon1 are for the origins in degrres (population center)
-    lat2, lon2 are for the destination in degrees (places)
+    `lat1_array, lon1_array, lat2_array, lon2_array` are the arrays of origins and destinations in degrees
 
     return:
     ------
-    A numpy array for distance matrix calculated using haversine formula which takes inaccount the
-    curvature of the earth. The returned distances are in km
+    A numpy array (M, N) of great-circle distances in km
     """
-
-    logger.info(
-        f"Computing Haversine distances: {len(lat1_array)} origins × {len(lat2_array)} destinations"
-    )
-    logger.info(
-        f"Total distance calculations: {len(lat1_array) * len(lat2_array):,}"
-    )
-
     # Convert decimal degrees to radians for trigonometric calculations
     # All trigonometric functions in numpy work with radians, not degrees
     # Example: 40.7589° → 0.7118 radians, -73.9851° → -1.2915 radians
     lat1_rad, lon1_rad = np.radians(lat1_array), np.radians(lon1_array)
     lat2_rad, lon2_rad = np.radians(lat2_array), np.radians(lon2_array)
 
-    logger.debug("Converted coordinates to radians")
-    logger.debug(
-        f"Origin latitude range: {np.min(lat1_rad):.4f} to {np.max(lat1_rad):.4f} radians"
-    )
-    logger.debug(
-        f"Origin longitude range: {np.min(lon1_rad):.4f} to {np.max(lon1_rad):.4f} radians"
-    )
-
     # Reshape origin arrays to enable broadcasting for distance matrix computation
     # Creates column vectors (M, 1) for origins to broadcast against row vectors (N,) for destinations
     # This mathematical technique enables vectorized computation of all pairwise distances
@@ -289,18 +303,12 @@ def haversine(
         :, np.newaxis
     ]  # (M, 1) - each origin longitude as column
 
-    logger.debug(
-        f"Reshaped arrays for broadcasting: {lat1_rad.shape} × {lat2_rad.shape}"
-    )
-
     # Calculate coordinate differences using broadcasting
     # Results in (M, N) matrices where each element [i,j] represents difference between origin i and destination j
     # Example: Manhattan to Brooklyn bridge = 40.7831-40.7589 = 0.0242° ≈ 0.0004 radians latitude difference
     dlat = lat2_rad - lat1_rad  # (M, N) - latitude differences
     dlon = lon2_rad - lon1_rad  # (M, N) - longitude differences
 
-    logger.debug(f"Calculated coordinate differences with shape: {dlat.shape}")
-
     # Apply Haversine formula for great-circle distances on a sphere
     # Formula: a = sin²(Δφ/2) + cos φ₁ ⋅ cos φ₂ ⋅ sin²(Δλ/2)
     # This accounts for Earth's curvature and provides accurate distances
@@ -325,17 +333,416 @@ def haversine(
     R = 6371.0
     distances = R * c  # (M, N) - final distance matrix in kilometers
 
-    logger.info(
-        f"Haversine calculation completed. Distance matrix shape: {distances.shape}"
+    return distances
+
+
+def compute_accessibility(
+    matrix: np.ndarray, distance_limit: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized accessibility pass over an origin-destination distance matrix.
+
+    args:
+    ----
+    `matrix` is the M×N distance matrix (km) from `haversine_km`
+    `distance_limit` is a max distance a person is willing to travel to reach destination
+
+    return:
+    ------
+    The origin-destination cost matrix in CSR form as `(indptr, indices)`. The accessible
+    destinations of origin `i` are `indices[indptr[i]:indptr[i + 1]]`, ordered by ascending
+    distance (ties keep the lower destination index). Origins with nothing inside the
+    limit get their single closest destination so that no origin has zero access.
+    The number of accessible markets per origin is `np.diff(indptr)`.
+    """
+    n_origins = matrix.shape[0]
+
+    # Threshold the whole matrix in one pass instead of repeated argmin per origin
+    within = matrix < distance_limit
+
+    # Fallback: origins without any destination in reach keep their closest one
+    no_access = ~within.any(axis=1)
+    if no_access.any():
+        within[no_access, np.argmin(matrix[no_access], axis=1)] = True
+
+    rows, cols = np.nonzero(within)
+
+    # Order each origin's destinations by distance. lexsort is stable and
+    # np.nonzero is row-major, so equal distances keep ascending column order
+    order = np.lexsort((matrix[rows, cols], rows))
+    indices = cols[order]
+
+    indptr = np.zeros(n_origins + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_origins), out=indptr[1:])
+
+    return indptr, indices
+
+
+def compute_market_potential(
+    od_indptr: np.ndarray,
+    od_indices: np.ndarray,
+    effective_population: np.ndarray,
+    n_destinations: int,
+) -> np.ndarray:
+    """
+    Market potential of every destination as one sparse matrix-vector product.
+
+    args:
+    ----
+    `od_indptr, od_indices` are the CSR origin-destination incidence from `compute_accessibility`
+    `effective_population` is the effective population of each origin
+    `n_destinations` is the number of destinations (columns of the incidence)
+
+    return:
+    ------
+    A numpy array with the sum of the effective population of every origin that can reach
+    each destination, i.e. `A.T @ effective_population` for the 0/1 incidence matrix `A`
+    """
+    # Expand the CSR row pointer into the origin index of every stored pair
+    od_origins = np.repeat(
+        np.arange(len(od_indptr) - 1), np.diff(od_indptr)
     )
-    logger.info(
-        f"Distance statistics: min={np.min(distances):.2f}km, max={np.max(distances):.2f}km, mean={np.mean(distances):.2f}km"
+    return np.bincount(
+        od_indices,
+        weights=effective_population[od_origins],
+        minlength=n_destinations,
     )
-    logger.info(
-        "This represents realistic Earth-surface distances accounting for planetary curvature"
+
+
+class LazyDistanceRows:
+    """
+    Row-on-demand view of a square point-to-point distance matrix.
+
+    `rows[i]` evaluates the distances from point `i` to every point when it is requested,
+    so a C×C matrix never has to be materialised when only a few seed rows are read.
+    """
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray):
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.shape = (len(self.latitudes), len(self.latitudes))
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return haversine_km(
+            self.latitudes[i : i + 1],
+            self.longitudes[i : i + 1],
+            self.latitudes,
+            self.longitudes,
+        )[0]
+
+
+class DenseDistanceBackend:
+    """
+    Original behaviour: materialise the full M×N cost matrix (haversine km unless another
+    travel cost provider's `cost_block` is given). Fastest for small cities, peak memory
+    grows with M×N.
+    """
+
+    name = "dense"
+
+    def accessibility(
+        self,
+        origin_lat: np.ndarray,
+        origin_lng: np.ndarray,
+        dest_lat: np.ndarray,
+        dest_lng: np.ndarray,
+        distance_limit: float,
+        cost_block: Callable[..., np.ndarray] = haversine_km,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        matrix = cost_block(origin_lat, origin_lng, dest_lat, dest_lng)
+        logger.info(f"Dense accessibility over a {matrix.shape} cost matrix")
+        return compute_accessibility(matrix, distance_limit)
+
+    def distance_rows(self, latitudes: np.ndarray, longitudes: np.ndarray):
+        return haversine_km(latitudes, longitudes, latitudes, longitudes)
+
+
+class ChunkedDistanceBackend:
+    """
+    Memory-bounded backend: evaluates the cost matrix in blocks of origin rows and
+    only keeps the pairs within the distance limit (plus the nearest destination for
+    origins that have none). Peak memory is one block plus the returned pairs.
+    """
+
+    name = "chunked"
+
+    def __init__(self, max_block_bytes: int = 64 * 1024**2):
+        self.max_block_bytes = max_block_bytes
+
+    def rows_per_block(self, n_destinations: int) -> int:
+        # ~6 float64 temporaries of block size are alive inside haversine_km
+        return max(1, self.max_block_bytes // (6 * 8 * max(n_destinations, 1)))
+
+    def accessibility(
+        self,
+        origin_lat: np.ndarray,
+        origin_lng: np.ndarray,
+        dest_lat: np.ndarray,
+        dest_lng: np.ndarray,
+        distance_limit: float,
+        cost_block: Callable[..., np.ndarray] = haversine_km,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        n_origins = len(origin_lat)
+        block_rows = self.rows_per_block(len(dest_lat))
+        logger.info(
+            f"Chunked accessibility: {n_origins} origins × {len(dest_lat)} destinations in blocks of {block_rows} rows"
+        )
+
+        indptr_parts = [np.zeros(1, dtype=np.int64)]
+        indices_parts = []
+        offset = 0
+        for start in range(0, n_origins, block_rows):
+            stop = min(start + block_rows, n_origins)
+            block = cost_block(
+                origin_lat[start:stop], origin_lng[start:stop], dest_lat, dest_lng
+            )
+            block_indptr, block_indices = compute_accessibility(
+                block, distance_limit
+            )
+            indptr_parts.append(block_indptr[1:] + offset)
+            indices_parts.append(block_indices)
+            offset += len(block_indices)
+
+        indices = (
+            np.concatenate(indices_parts)
+            if indices_parts
+            else np.zeros(0, dtype=np.int64)
+        )
+        return np.concatenate(indptr_parts), indices
+
+    def distance_rows(self, latitudes: np.ndarray, longitudes: np.ndarray):
+        return LazyDistanceRows(latitudes, longitudes)
+
+
+DISTANCE_BACKENDS = {
+    DenseDistanceBackend.name: DenseDistanceBackend,
+    ChunkedDistanceBackend.name: ChunkedDistanceBackend,
+}
+
+
+def get_distance_backend(name: str = "dense"):
+    """
+    Returns an instance of the distance backend registered under `name`
+    """
+    if name not in DISTANCE_BACKENDS:
+        raise ValueError(
+            f"Unknown distance backend: {name}. Available: {list(DISTANCE_BACKENDS)}"
+        )
+    return DISTANCE_BACKENDS[name]()
+
+
+class HaversineCostProvider:
+    """Straight-line great-circle distance in km, the original accessibility cost"""
+
+    name = "haversine"
+    unit = "km"
+
+    def cost_block(
+        self,
+        origin_lat: np.ndarray,
+        origin_lng: np.ndarray,
+        dest_lat: np.ndarray,
+        dest_lng: np.ndarray,
+    ) -> np.ndarray:
+        return haversine_km(origin_lat, origin_lng, dest_lat, dest_lng)
+
+    def bind_destinations(
+        self, dest_lat: np.ndarray, dest_lng: np.ndarray
+    ) -> Callable[..., np.ndarray]:
+        return self.cost_block
+
+    def cache_key(self) -> tuple:
+        return (self.name,)
+
+
+class RoadSpeedCostProvider:
+    """
+    Drive time approximation in minutes: the straight-line distance stretched by the
+    circuity of the road network and driven at an average city speed
+    """
+
+    name = "road_speed"
+    unit = "minutes"
+
+    def __init__(
+        self,
+        speed_kmh: Optional[float] = None,
+        circuity: Optional[float] = None,
+    ):
+        self.speed_kmh = speed_kmh or CONF.road_speed_kmh
+        self.circuity = circuity or CONF.road_circuity
+
+    def cost_block(
+        self,
+        origin_lat: np.ndarray,
+        origin_lng: np.ndarray,
+        dest_lat: np.ndarray,
+        dest_lng: np.ndarray,
+    ) -> np.ndarray:
+        block = haversine_km(origin_lat, origin_lng, dest_lat, dest_lng)
+        block *= self.circuity * 60.0 / self.speed_kmh
+        return block
+
+    def bind_destinations(
+        self, dest_lat: np.ndarray, dest_lng: np.ndarray
+    ) -> Callable[..., np.ndarray]:
+        return self.cost_block
+
+    def cache_key(self) -> tuple:
+        return (self.name, self.speed_kmh, self.circuity)
+
+
+def travel_cost_matrix_dir(country_name: str, city_name: str) -> str:
+    return os.path.join(CONF.travel_cost_matrix_dir, country_name, city_name)
+
+
+def save_travel_cost_matrix(
+    country_name: str,
+    city_name: str,
+    zone_lng: np.ndarray,
+    zone_lat: np.ndarray,
+    minutes: np.ndarray,
+):
+    """
+    Stores a precomputed zone to zone drive time matrix of a city (e.g. from a routing
+    engine's table service) for `MatrixCostProvider`.
+
+    args:
+    ----
+    `zone_lng`, `zone_lat` are the coordinates of the Z zone centres
+    `minutes` is the Z×Z drive time matrix, `np.inf` for unreachable pairs
+    """
+    directory = travel_cost_matrix_dir(country_name, city_name)
+    os.makedirs(directory, exist_ok=True)
+    np.save(
+        os.path.join(directory, "zones.npy"),
+        np.column_stack([zone_lng, zone_lat]).astype(np.float64),
+    )
+    np.save(
+        os.path.join(directory, "minutes.npy"), np.asarray(minutes, dtype=np.float32)
     )
 
-    return distances
+
+class MatrixCostProvider:
+    """
+    Drive time in minutes from a precomputed zone matrix of the city on disk (see
+    `save_travel_cost_matrix`). Origins and destinations are snapped to their nearest
+    zone; the legs between a point and its zone centre use the road speed approximation.
+    The matrix is memory mapped, a block only reads the rows of the zones it needs.
+    """
+
+    name = "matrix"
+    unit = "minutes"
+
+    def __init__(self, country_name: str, city_name: str):
+        self.directory = travel_cost_matrix_dir(country_name, city_name)
+        if not os.path.exists(os.path.join(self.directory, "minutes.npy")):
+            raise ValueError(
+                f"No travel cost matrix for {city_name}, {country_name} in {self.directory}"
+            )
+        self.access = RoadSpeedCostProvider()
+        self._zones = None
+        self._minutes = None
+        self._tree = None
+
+    def __getstate__(self):
+        # Memory maps and the zone index are reopened lazily in pool workers
+        return {**self.__dict__, "_zones": None, "_minutes": None, "_tree": None}
+
+    def _load(self):
+        if self._minutes is None:
+            self._zones = np.load(os.path.join(self.directory, "zones.npy"))
+            self._minutes = np.load(
+                os.path.join(self.directory, "minutes.npy"), mmap_mode="r"
+            )
+            self._tree = shapely.STRtree(shapely.points(self._zones))
+
+    def snap(self, lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Nearest zone of each point and the drive minutes to its centre"""
+        self._load()
+        _, zones = self._tree.query_nearest(
+            shapely.points(np.column_stack([lng, lat])), all_matches=False
+        )
+        # Column shaped zone coordinates pair each point with its own zone only
+        access = haversine_km(
+            np.asarray(lat, dtype=float),
+            np.asarray(lng, dtype=float),
+            self._zones[zones, 1][:, np.newaxis],
+            self._zones[zones, 0][:, np.newaxis],
+        )[:, 0]
+        access *= self.access.circuity * 60.0 / self.access.speed_kmh
+        return zones, access
+
+    def cost_block(
+        self,
+        origin_lat: np.ndarray,
+        origin_lng: np.ndarray,
+        dest_lat: np.ndarray,
+        dest_lng: np.ndarray,
+    ) -> np.ndarray:
+        return self.bind_destinations(dest_lat, dest_lng)(
+            origin_lat, origin_lng, dest_lat, dest_lng
+        )
+
+    def bind_destinations(
+        self, dest_lat: np.ndarray, dest_lng: np.ndarray
+    ) -> Callable[..., np.ndarray]:
+        """`cost_block` of these destinations, snapped once instead of for every block"""
+        dest_zones, dest_access = self.snap(dest_lat, dest_lng)
+        return partial(self._snapped_cost_block, dest_zones, dest_access)
+
+    def _snapped_cost_block(
+        self,
+        dest_zones: np.ndarray,
+        dest_access: np.ndarray,
+        origin_lat: np.ndarray,
+        origin_lng: np.ndarray,
+        dest_lat: np.ndarray,
+        dest_lng: np.ndarray,
+    ) -> np.ndarray:
+        origin_zones, origin_access = self.snap(origin_lat, origin_lng)
+        # Read each needed zone row once, then gather the destination columns
+        rows, row_of_origin = np.unique(origin_zones, return_inverse=True)
+        zone_block = np.asarray(self._minutes[rows][:, dest_zones], dtype=np.float64)
+        block = zone_block[row_of_origin]
+        block += origin_access[:, None]
+        block += dest_access[None, :]
+        return block
+
+    def cache_key(self) -> tuple:
+        return (
+            self.name,
+            self.directory,
+            os.path.getmtime(os.path.join(self.directory, "minutes.npy")),
+        )
+
+
+TRAVEL_COST_PROVIDERS = {
+    HaversineCostProvider.name: HaversineCostProvider,
+    RoadSpeedCostProvider.name: RoadSpeedCostProvider,
+    MatrixCostProvider.name: MatrixCostProvider,
+}
+
+
+def get_travel_cost_provider(
+    name: str = "haversine",
+    country_name: Optional[str] = None,
+    city_name: Optional[str] = None,
+):
+    """
+    Returns an instance of the travel cost provider registered under `name`. The
+    "matrix" provider needs the city of its precomputed matrix
+    """
+    if name not in TRAVEL_COST_PROVIDERS:
+        raise ValueError(
+            f"Unknown travel cost provider: {name}. Available: {list(TRAVEL_COST_PROVIDERS)}"
+        )
+    if name == MatrixCostProvider.name:
+        return MatrixCostProvider(country_name, city_name)
+    return TRAVEL_COST_PROVIDERS[name]()
 
 
 def get_grids_of_data(
@@ -343,6 +750,10 @@ def get_grids_of_data(
     places: gpd.GeoDataFrame,
     weights: gpd.GeoDataFrame,
     distanace_limit: float,
+    distance_backend: str = "dense",
+    grid_shape: str = "square",
+    diagnostics: Optional[dict] = None,
+    travel_cost=None,
 ) -> gpd.GeoDataFrame:
     """
     Creates a grid representation of the area and aggregates population and places data within each grid cell,
@@ -354,6 +765,12 @@ def get_grids_of_data(
     `places` are the places geodataframe
     `weights` are the income dataframes in this context for each population center keep `None` if unavailable
     `distance_limit` is a max distance a person is willing to travel to reach destination
+    `distance_backend` is the name of the backend in `DISTANCE_BACKENDS` used for the distance matrix
+    `grid_shape` is the tessellation of `create_grid`, "square" or "hex"
+    `diagnostics` collects the checks of `grid_diagnostics` by section when given, they
+    cost extra passes over the data and are skipped otherwise
+    `travel_cost` is the provider from `get_travel_cost_provider` of the origin-destination
+    costs, haversine km by default. `distance_limit` is in the provider's unit
 
     return:
     ------
@@ -364,8 +781,9 @@ def get_grids_of_data(
     logger.info(
         f"Starting grid data aggregation with {len(population_gdf)} population centers, {len(places)} places"
     )
+    travel_cost = travel_cost or HaversineCostProvider()
     logger.info(
-        f"Distance limit for accessibility: {distanace_limit:.1f}km (typical walking/driving threshold)"
+        f"Travel cost limit for accessibility: {distanace_limit:.1f} {travel_cost.unit} ({travel_cost.name})"
     )
     logger.info(f"Income weights provided: {weights is not None}")
 
@@ -390,9 +808,6 @@ def get_grids_of_data(
 
     total_population = origins["population"].sum()
     logger.info(f"Total population in study area: {total_population:,} people")
-    logger.info(
-        f"Population density: {total_population/len(origins):.0f} people per population center"
-    )
 
     # Select only essential columns to optimize memory usage and processing speed
     # Follows data science best practices of working with minimal necessary data
@@ -410,88 +825,39 @@ def get_grids_of_data(
         f"Prepared {len(origins)} origins and {len(destinations)} destinations for analysis"
     )
 
-    # Compute full distance matrix between all origins and destinations
+    # Compute origin-destination distances and the accessibility in one backend call
     # Uses Haversine formula to account for Earth's curvature
-    # Results in M×N matrix where M=origins, N=destinations
-    # This implements spatial interaction theory for accessibility analysis
-    # Example: 500 population centers × 150 supermarkets = 500×150 matrix with distances 0.2-25.8 km
-    matrix = haversine(
+    # The dense backend builds the full M×N matrix, the chunked one evaluates it in blocks
+    # Each origin keeps the destinations within the distance limit (nearest first),
+    # or its closest destination when nothing is in reach
+    # This implements the concept of service catchment areas in spatial analysis
+    # Example: 500 population centers × 150 supermarkets with distances 0.2-25.8 km
+    logger.info(
+        f"Calculating accessibility for each population center ({distance_backend} backend)..."
+    )
+    od_indptr, od_indices = get_distance_backend(
+        distance_backend
+    ).accessibility(
         origins.latitude.values,
         origins.longitude.values,
         destinations.latitude.values,
         destinations.longitude.values,
+        distanace_limit,
+        cost_block=travel_cost.bind_destinations(
+            destinations.latitude.values, destinations.longitude.values
+        ),
     )
-
-    # Initialize accessibility mapping using origin-destination cost matrix
-    # Dictionary stores lists of accessible destination indices for each origin
-    # This implements the concept of service catchment areas in spatial analysis
-    od_cost_matrix = {k: [] for k in range(matrix.shape[0])}
-
-    logger.info("Calculating accessibility for each population center...")
-
-    # Calculate accessibility for each population center (origin)
-    # Implements distance-based accessibility measurement theory
-    accessibility_counts = []
-
-    for i in range(matrix.shape[0]):
-        # Get distances from current origin to all destinations
-        # Example: [1.2, 3.4, 0.8, 5.2, 2.1, 8.9, 1.5, 4.3] km to 8 supermarkets
-        od = matrix[i].tolist()  # Convert to list for manipulation
-
-        # Iteratively find accessible destinations within distance threshold
-        # Continues until all destinations are evaluated or distance limit exceeded
-        while len(od_cost_matrix[i]) < matrix.shape[1]:
-
-            # Check if closest remaining destination is within travel threshold
-            # Implements spatial accessibility theory with distance decay
-            # Example: If distance_limit=5km, destinations at [1.2, 3.4, 0.8, 2.1, 1.5, 4.3] qualify
-            if np.min(od) < distanace_limit:
-                amn = np.argmin(od)  # Find index of closest destination
-
-                # Validate that the index is finite (not NaN or infinite)
-                if np.isfinite(amn):
-                    od_cost_matrix[i].append(
-                        amn
-                    )  # Add to accessible destinations
-
-                # Mark destination as processed by setting distance to infinity
-                # Prevents re-selection in subsequent iterations
-                od[amn] = np.inf
-            else:
-                # Fallback: if no destinations within limit, assign closest one
-                # Ensures every origin has at least one accessible destination
-                # Prevents zero-division errors in subsequent calculations
-                if len(od_cost_matrix[i]) == 0:
-                    amn = np.argmin(od)
-                    if np.isfinite(amn):
-                        od_cost_matrix[i].append(amn)
-                break  # Exit loop when distance threshold exceeded
-
-        accessibility_counts.append(len(od_cost_matrix[i]))
+    accessibility_counts = np.diff(od_indptr)
 
     # Calculate accessibility indicator for each population center
     # Counts number of services/facilities reachable within distance limit
     # Higher values indicate better accessibility/service availability
     # Example: Downtown areas might have 8-12 accessible supermarkets, suburban areas 2-4
     origins["number_of_accessibile_markets"] = accessibility_counts
-
-    avg_accessibility = np.mean(accessibility_counts)
-    max_accessibility = np.max(accessibility_counts)
-    min_accessibility = np.min(accessibility_counts)
-
-    logger.info("Accessibility analysis completed:")
-    logger.info(
-        f"  Average accessible places per population center: {avg_accessibility:.1f}"
-    )
-    logger.info(
-        f"  Range: {min_accessibility} to {max_accessibility} accessible places"
-    )
-    logger.info(
-        f"  {sum(1 for x in accessibility_counts if x == 1)} centers have only 1 accessible place (service deserts)"
-    )
-    logger.info(
-        f"  {sum(1 for x in accessibility_counts if x >= 5)} centers have 5+ accessible places (well-served areas)"
-    )
+    if diagnostics is not None:
+        diagnostics["accessibility"] = grid_diagnostics.accessibility_checks(
+            accessibility_counts
+        )
 
     # Compute effective population using accessibility-weighted demographics
     # Implements spatial equity theory: divides population by service availability
@@ -505,50 +871,23 @@ def get_grids_of_data(
         )
         logger.info("Using simple accessibility weighting (no income data)")
     else:
-        # ===== REPLACE YOUR ENTIRE else: BLOCK WITH THIS =====
-        # Handle NaN values in income data - Enhanced debugging
-        logger.info("=== INCOME PROCESSING DEBUG ===")
-        original_income_values = weights["income"].values
-        logger.info(
-            f"STEP 1 - Original income sample: {original_income_values[:5]}"
-        )
-        logger.info(
-            f"STEP 1 - Original income NaN count: {np.isnan(original_income_values).sum()}"
-        )
-
-        income_values = weights["income"].values.copy()  # Make a copy
-        logger.info(f"STEP 2 - Copied income sample: {income_values[:5]}")
-
-        # Log income data quality
+        # Missing income values are replaced with the median income,
+        # or a neutral weight of 1.0 when no income is known at all
+        raw_income = weights["income"].values
+        income_values = raw_income.copy()
         nan_count = np.isnan(income_values).sum()
-        valid_count = len(income_values) - nan_count
-        logger.info(
-            f"STEP 3 - Income data quality: {valid_count}/{len(income_values)} valid values, {nan_count} NaN values"
-        )
-
         if nan_count > 0:
             median_income = np.nanmedian(income_values)
-            logger.info(
-                f"STEP 4 - Calculated median income: ${median_income:,.0f}"
-            )
-
             if np.isnan(median_income):
                 logger.warning(
-                    "STEP 5 - All income values are NaN, using neutral weight of 1.0"
+                    "All income values are NaN, using neutral weight of 1.0"
                 )
                 income_values = np.ones_like(income_values)
             else:
                 logger.info(
-                    f"STEP 5 - Replacing {nan_count} NaN income values with median: ${median_income:,.0f}"
+                    f"Replacing {nan_count} NaN income values with median: ${median_income:,.0f}"
                 )
-                # CRITICAL: Use the CORRECTED income_values, not the original
                 income_values = np.nan_to_num(income_values, nan=median_income)
-                logger.info(
-                    f"STEP 6 - After np.nan_to_num, income sample: {income_values[:5]}"
-                )
-                logger.info(
-                    f"STEP 6 - After np.nan_to_num, NaN count: {np.isnan(income_values).sum()}"
-                )
 
         # Check alignment
         if len(income_values) != len(origins):
@@ -557,278 +896,54 @@ def get_grids_of_data(
             )
             income_values = income_values[: len(origins)]
 
-        # CRITICAL FIX: Use the corrected income_values throughout
-        population_values = origins["population"].values
-        accessibility_values = origins["number_of_accessibile_markets"].values
-
-        logger.info(f"STEP 7 - Final income values sample: {income_values[:5]}")
-        logger.info(
-            f"STEP 7 - Population values sample: {population_values[:5]}"
-        )
-        logger.info(
-            f"STEP 7 - Accessibility values sample: {accessibility_values[:5]}"
-        )
-
-        # Calculate step by step using CORRECTED income_values
-        step1 = population_values * income_values  # Use corrected values
-        step2 = step1 / accessibility_values
-
-        logger.info(
-            f"STEP 8 - Step 1 (pop * corrected_income) sample: {step1[:5]}"
-        )
-        logger.info(
-            f"STEP 8 - Step 2 (result / accessibility) sample: {step2[:5]}"
-        )
-        logger.info(
-            f"STEP 8 - Final effective population NaN count: {np.isnan(step2).sum()}"
-        )
-
-        if np.isnan(step2).sum() > 0:
-            logger.error("STILL HAVE NaN VALUES AFTER CORRECTION!")
-            logger.error(
-                f"  NaN positions in income: {np.where(np.isnan(income_values))[0][:5]}"
-            )
-            logger.error(
-                f"  NaN positions in step1: {np.where(np.isnan(step1))[0][:5]}"
-            )
-            logger.error(
-                f"  NaN positions in step2: {np.where(np.isnan(step2))[0][:5]}"
-            )
-
-        origins["effective_population"] = step2
+        # Income-weighted population divided by the accessible places
+        origins["effective_population"] = (
+            origins["population"].values * income_values
+        ) / origins["number_of_accessibile_markets"].values
         logger.info("Using income-weighted accessibility calculation")
-        logger.info(f"Average income weight: ${np.mean(income_values):,.0f}")
-        logger.info("=== END INCOME PROCESSING DEBUG ===")
-        # ===== END ENHANCED INCOME DEBUGGING =====
-
-    total_effective_pop = origins["effective_population"].sum()
-    logger.info(f"Total effective population: {total_effective_pop:,.0f}")
-    logger.info(
-        "Effective population represents purchasing power adjusted for service access"
-    )
+        if diagnostics is not None:
+            diagnostics["income"] = grid_diagnostics.income_checks(
+                raw_income,
+                income_values,
+                origins["effective_population"].to_numpy(dtype=float),
+            )
 
     # Calculate market potential for each destination (place/facility)
     # Implements gravity model theory: sum of accessible effective populations
     # Each destination's market size = sum of all populations that can reach it
-    market = {
-        k: [] for k in range(matrix.shape[1])
-    }  # Initialize market potential storage
-
-    logger.info("Calculating market potential for each destination...")
-    logger.info("Market calculation diagnostic:")
-    logger.info(
-        f"  Effective population range: {origins['effective_population'].min():.2f} to {origins['effective_population'].max():.2f}"
-    )
-    logger.info(
-        f"  Effective population NaN count: {origins['effective_population'].isna().sum()}"
-    )
-
-    for i in range(matrix.shape[1]):  # Iterate through each destination
-        for (
-            k,
-            v,
-        ) in (
-            od_cost_matrix.items()
-        ):  # Check each origin's accessible destinations
-            if i in v:  # If current destination is accessible from origin k
-                # Add origin's effective population to destination's market potential
-                # This implements cumulative accessibility/market catchment theory
-                market[i].append(origins["effective_population"].iloc[k])
-
-    # Aggregate market potential for each destination
-    # Sum all effective populations that can access each destination
     # Results in total market size/customer base for each facility
     # Example: Downtown supermarket might have 25,000 total potential customers, suburban one has 8,500
-    destinations["market"] = [sum(v) for v in market.values()]
-    logger.info("Market calculation results:")
-    logger.info(f"  Market values sample: {destinations['market'][:5]}")
-    logger.info(f"  Market NaN count: {sum(np.isnan(destinations['market']))}")
-    logger.info(
-        f"  Market zero count: {sum(np.array(destinations['market']) == 0)}"
-    )
-    logger.info(
-        f"  Non-zero market count: {sum(np.array(destinations['market']) > 0)}"
-    )
-
-    # ===== INSERT ENHANCED MARKET CALCULATION DEBUGGING HERE =====
-    logger.info("=== MARKET CALCULATION DEBUG ===")
-    logger.info(
-        f"Total origins with valid effective_population: {sum(~np.isnan(origins['effective_population']))}"
-    )
-    logger.info(
-        f"Total origins with zero effective_population: {sum(origins['effective_population'] == 0)}"
-    )
-
-    # Check each destination's market calculation
-    for i in range(min(5, len(destinations))):
-        dest_market_contributors = market[i]
-        logger.info(f"Destination {i} market calculation:")
-        logger.info(
-            f"  Number of contributing origins: {len(dest_market_contributors)}"
+    logger.info("Calculating market potential for each destination...")
+    effective_population = origins["effective_population"].to_numpy(
+        dtype=float
+    )
+    destinations["market"] = compute_market_potential(
+        od_indptr, od_indices, effective_population, len(destinations)
+    )
+    if diagnostics is not None:
+        diagnostics["market"] = grid_diagnostics.market_checks(
+            od_indptr,
+            od_indices,
+            effective_population,
+            destinations["market"].to_numpy(),
         )
-        if len(dest_market_contributors) > 0:
-            logger.info(
-                f"  Contributors sample: {dest_market_contributors[:3]}"
-            )
-            logger.info(f"  Contributors sum: {sum(dest_market_contributors)}")
-            logger.info(
-                f"  Any NaN contributors: {any(np.isnan(dest_market_contributors))}"
-            )
-        else:
-            logger.info(f"  No origins can access this destination")
-
-    # Check accessibility matrix
-    accessible_destinations_per_origin = [
-        len(v) for v in od_cost_matrix.values()
-    ]
-    logger.info(
-        f"Origins with 0 accessible destinations: {sum(x == 0 for x in accessible_destinations_per_origin)}"
-    )
-    logger.info(
-        f"Total accessible origin-destination pairs: {sum(accessible_destinations_per_origin)}"
-    )
-    logger.info("=== END MARKET CALCULATION DEBUG ===")
-    # ===== END ENHANCED MARKET CALCULATION DEBUGGING =====
-
-    market_stats = destinations["market"]
-    logger.info("Market potential calculated:")
-    logger.info(
-        f"  Average market size per destination: {np.mean(market_stats):,.0f} potential customers"
-    )
-    logger.info(
-        f"  Range: {np.min(market_stats):,.0f} to {np.max(market_stats):,.0f} potential customers"
-    )
-    logger.info(
-        f"  Total market across all destinations: {np.sum(market_stats):,.0f}"
-    )
 
     # Create spatial tessellation grid for aggregation analysis
     # Uses adaptive grid sizing based on population density
-    grid = create_grid(origins, grid_size=None)
+    grid = create_grid(origins, grid_size=None, grid_shape=grid_shape)
 
     # Perform spatial joins to assign data points to grid cells
     # Implements spatial aggregation theory for converting point data to areal units
     # "within" predicate ensures points are assigned to containing grid cells
     logger.info("Performing spatial joins to assign data to grid cells...")
-    logger.info("Spatial join diagnostic:")
-    logger.info(f"  Origins bounds: {origins.total_bounds}")
-    logger.info(f"  Grid bounds: {grid.total_bounds}")
-    logger.info(f"  Destinations bounds: {destinations.total_bounds}")
-
-    # Check if bounds overlap
-    o_minx, o_miny, o_maxx, o_maxy = origins.total_bounds
-    g_minx, g_miny, g_maxx, g_maxy = grid.total_bounds
-
-    overlap_x = max(0, min(o_maxx, g_maxx) - max(o_minx, g_minx))
-    overlap_y = max(0, min(o_maxy, g_maxy) - max(o_miny, g_miny))
-
-    logger.info(f"  Bounds overlap: {overlap_x:.6f} x {overlap_y:.6f} degrees")
-
-    if overlap_x <= 0 or overlap_y <= 0:
-        logger.error("  NO SPATIAL OVERLAP between origins and grid!")
-
-    # Sample a few points to check spatial join manually
-    logger.info("Sample spatial join check:")
-    for i in range(min(3, len(origins))):
-        point = origins.iloc[i].geometry
-        logger.info(f"  Origin {i}: {point}")
-
-        # Check which grid cell this point should be in
-        grid_matches = grid[grid.contains(point)]
-        logger.info(f"    Matches {len(grid_matches)} grid cells")
-
-    # ===== INSERT ENHANCED SPATIAL JOIN DEBUGGING HERE =====
-    logger.info("=== SPATIAL JOIN DEBUG ===")
-    logger.info(f"Origins bounds: {origins.total_bounds}")
-    logger.info(f"Grid bounds: {grid.total_bounds}")
-
-    # Check grid cell sizes
-    first_grid_cell = grid.iloc[0].geometry
-    grid_width = first_grid_cell.bounds[2] - first_grid_cell.bounds[0]
-    grid_height = first_grid_cell.bounds[3] - first_grid_cell.bounds[1]
-    logger.info(f"Grid cell size: {grid_width:.6f} x {grid_height:.6f} degrees")
-
-    # Check population polygon sizes
-    for i in range(min(5, len(origins))):
-        pop_geom = origins.iloc[i].geometry
-        pop_bounds = pop_geom.bounds
-        pop_width = pop_bounds[2] - pop_bounds[0]
-        pop_height = pop_bounds[3] - pop_bounds[1]
-        logger.info(
-            f"Population polygon {i} size: {pop_width:.6f} x {pop_height:.6f} degrees"
+    if diagnostics is not None:
+        diagnostics["spatial_join"] = grid_diagnostics.spatial_join_checks(
+            origins, destinations, grid
         )
-        logger.info(
-            f"  Bounds: [{pop_bounds[0]:.6f}, {pop_bounds[1]:.6f}, {pop_bounds[2]:.6f}, {pop_bounds[3]:.6f}]"
-        )
-
-        # Check which grid cells this polygon overlaps with
-        overlapping_grids = grid[grid.geometry.intersects(pop_geom)]
-        containing_grids = grid[grid.geometry.contains(pop_geom)]
-        logger.info(f"  Overlaps with {len(overlapping_grids)} grid cells")
-        logger.info(f"  Contained within {len(containing_grids)} grid cells")
-
-        # Check centroid containment
-        centroid = pop_geom.centroid
-        centroid_containing_grids = grid[grid.geometry.contains(centroid)]
-        logger.info(
-            f"  Centroid contained in {len(centroid_containing_grids)} grid cells"
-        )
-        logger.info(f"  Centroid: {centroid}")
-
-    # Test different spatial predicates
-    logger.info("Testing different spatial predicates:")
-    test_origins = origins.head(10)  # Test first 10
-
-    within_join = gpd.sjoin(test_origins, grid, how="left", predicate="within")
-    intersects_join = gpd.sjoin(
-        test_origins, grid, how="left", predicate="intersects"
-    )
-
-    within_success = len(within_join[within_join["index_right"].notna()])
-    intersects_success = len(
-        intersects_join[intersects_join["index_right"].notna()]
-    )
-
-    logger.info(f"  'within' predicate: {within_success}/10 successful joins")
-    logger.info(
-        f"  'intersects' predicate: {intersects_success}/10 successful joins"
-    )
-    logger.info("=== END SPATIAL JOIN DEBUG ===")
-    # ===== END ENHANCED SPATIAL JOIN DEBUGGING =====
 
     poulation_grid = gpd.sjoin(origins, grid, how="left", predicate="within")
     places_grid = gpd.sjoin(destinations, grid, how="left", predicate="within")
 
-    logger.info("Spatial joins completed:")
-    logger.info(
-        f"  Population centers assigned to grid: {len(poulation_grid[poulation_grid['index_right'].notna()])}/{len(origins)}"
-    )
-    logger.info(
-        f"  Places assigned to grid: {len(places_grid[places_grid['index_right'].notna()])}/{len(destinations)}"
-    )
-    # Detailed post-join analysis
-    logger.info("Post spatial join analysis:")
-    logger.info(f"  Population grid shape: {poulation_grid.shape}")
-    logger.info(f"  Places grid shape: {places_grid.shape}")
-
-    # Check which population centers failed to join
-    failed_pop = poulation_grid[poulation_grid["index_right"].isna()]
-    logger.info(f"  Failed population joins: {len(failed_pop)}")
-    if len(failed_pop) > 0:
-        logger.info(
-            f"    Sample failed points: {failed_pop.geometry.iloc[:3].tolist()}"
-        )
-
-    # Check the actual aggregation data
-    pop_aggregation = poulation_grid.groupby("index_right")[
-        "effective_population"
-    ].sum()
-    places_aggregation = places_grid.groupby("index_right")["market"].sum()
-
-    logger.info(f"  Population aggregation: {len(pop_aggregation)} grid cells")
-    logger.info(f"  Places aggregation: {len(places_aggregation)} grid cells")
-    logger.info(f"  Places aggregation sample: {places_aggregation.head()}")
-
     # Aggregate spatial data at grid cell level using groupby operations
     # Implements spatial data aggregation and statistical summarization
     # Combines multiple datasets into unified grid-based representation
@@ -873,21 +988,27 @@ def get_grids_of_data(
         data.loc[mask].fillna(0.0).reset_index(drop=True)
     )  # Filter and clean data
 
+    if diagnostics is not None:
+        diagnostics["aggregation"] = grid_diagnostics.aggregation_checks(
+            poulation_grid, places_grid, len(grid), len(data)
+        )
+
     logger.info("Grid aggregation completed:")
     logger.info(f"  Total grid cells created: {len(grid)}")
     logger.info(
         f"  Grid cells with data: {len(data)} ({100*len(data)/len(grid):.1f}%)"
     )
-    logger.info(
-        f"  Grid cells with potential customers: {sum(data['number_of_potential_customers'] > 0)}"
-    )
 
     return data
 
 
 def select_nbrs_with_sum(
-    i: int, cost: np.ndarray, max_share: float, shares: dict, used: list[int]
-) -> list[int]:
+    i: int,
+    cost: np.ndarray,
+    max_share: float,
+    shares: np.ndarray,
+    used: np.ndarray,
+) -> np.ndarray:
     """
     A helper function for clustering funtionality. It makes sure that the cluster are formed by neighboring
     gridcells and calculates the sum of indicator value for each itteration.
@@ -898,16 +1019,16 @@ def select_nbrs_with_sum(
     `cost` is od distnace matrix
     `max_share` is the max share of the indicator each cluster can have
     `shares` is the assigned value to each destination
-    `used` is the a list of gridcells that are taken
+    `used` is a boolean mask of the gridcells that are taken
 
     return:
     ------
-    a list of neighboring gridcells for origin i that will become of cluster
+    an array of neighboring gridcells for origin i that will become of cluster
     """
 
     logger.debug(f"Building cluster starting from grid cell {i}")
     logger.debug(
-        f"Target max share: {max_share:,.0f}, Available unused cells: {len(cost) - len(used)}"
+        f"Target max share: {max_share:,.0f}, Available unused cells: {len(cost) - used.sum()}"
     )
 
     # Sort grid cells by distance from origin i (nearest neighbor ordering)
@@ -916,44 +1037,22 @@ def select_nbrs_with_sum(
     # Example: From grid cell 45, sorted neighbors might be [46, 44, 55, 35, 47, 43, 56, 34...]
     x = np.argsort(cost)  # Returns indices sorted by ascending distance
 
-    logger.debug(f"Sorted {len(x)} neighbors by distance from seed cell {i}")
-
-    # Initialize accumulator variables for greedy cluster building
-    value = 0  # Running sum of indicator values (market potential)
-    nbrs = []  # List of neighbor indices to include in cluster
+    # Skip grid cells already assigned to other clusters
+    # Ensures each spatial unit belongs to exactly one cluster (partition constraint)
+    x = x[~used[x]]
 
     # Greedy nearest-neighbor selection with capacity constraint
-    # Implements load-balancing principle: distribute total workload equally
-    for idx, cell_idx in enumerate(
-        x
-    ):  # Iterate through grid cells in order of proximity
-
-        # Skip grid cells already assigned to other clusters
-        # Ensures each spatial unit belongs to exactly one cluster (partition constraint)
-        if cell_idx in used:
-            logger.debug(f"  Cell {cell_idx} already used, skipping")
-            continue
-
-        # Add current grid cell's indicator value to cluster total
-        # Accumulates market potential/workload for current cluster
-        # Example: Adding grid cells with 2500, 1800, 3200 customers → value = 7500
-        cell_value = shares[cell_idx]
-        value += cell_value
-        nbrs.append(cell_idx)  # Include grid cell in current cluster
-
-        logger.debug(
-            f"  Added cell {cell_idx} with {cell_value:,.0f} customers. Cluster total: {value:,.0f}"
-        )
-
-        # Check if cluster has reached target capacity (load balancing)
-        # Stops growing cluster when maximum share threshold is exceeded
-        # Implements equitable distribution of total market potential across clusters
-        # Example: If max_share=25000 and value=26300, stop adding cells to this cluster
-        if value >= max_share:
-            logger.debug(
-                f"  Cluster reached target capacity ({value:,.0f} >= {max_share:,.0f})"
-            )
-            break
+    # Running sum of indicator values (market potential) in order of proximity
+    # Example: Adding grid cells with 2500, 1800, 3200 customers → value = 7500
+    running_value = np.cumsum(shares[x])
+
+    # Stop growing the cluster at the first cell where the target capacity is reached
+    # Implements equitable distribution of total market potential across clusters
+    # Example: If max_share=25000 and value=26300, stop adding cells to this cluster
+    reached = np.flatnonzero(running_value >= max_share)
+    n_selected = reached[0] + 1 if len(reached) else len(x)
+    nbrs = x[:n_selected]
+    value = running_value[n_selected - 1] if n_selected else 0
 
     logger.info(
         f"Cluster built from seed {i}: {len(nbrs)} cells, {value:,.0f} total customers"
@@ -966,6 +1065,91 @@ def select_nbrs_with_sum(
     return nbrs
 
 
+def assign_greedy_territories(
+    matrix,
+    shares: np.ndarray,
+    num_sales_man: int,
+) -> np.ndarray:
+    """
+    Greedy spatial clustering with load balancing. Seeds are taken in grid order and every
+    cluster grows through its nearest unused cells until it holds an equitable share.
+
+    args:
+    ----
+    `matrix` is the grid-centroid distance matrix (or a row-on-demand view of it)
+    `shares` is the indicator value (potential customers) of each grid cell
+    `num_sales_man` is the number of clusters to create
+
+    return:
+    ------
+    an integer label array with the cluster index of each grid cell, -1 for unassigned cells
+    """
+    n_cells = len(shares)
+    equitable_share = shares.sum() / num_sales_man
+
+    # Preallocated cluster labels and "used" mask replace the per-cell list lookups
+    labels = np.full(n_cells, -1, dtype=np.int64)
+    used = np.zeros(n_cells, dtype=bool)
+
+    logger.info("Starting greedy spatial clustering algorithm...")
+
+    # Greedy spatial clustering algorithm with load balancing
+    # Implements modified k-means with spatial contiguity constraints
+    j = 0  # Current cluster index
+
+    for i in range(n_cells):
+
+        # Skip grid cells already assigned to clusters
+        # Maintains partition constraint: each cell belongs to exactly one cluster
+        if used[i]:
+            continue
+
+        logger.info(f"Creating cluster {j} starting from grid cell {i}")
+
+        # Find spatially contiguous neighbors within capacity limit
+        # Implements greedy nearest-neighbor expansion with load balancing
+        # Example: Starting from grid 25, might select [25, 26, 35, 24, 36, 15] totaling 23,100 customers
+        nbrs = select_nbrs_with_sum(
+            i,  # Current seed grid cell
+            matrix[i],  # Distances from seed to all other cells
+            equitable_share,  # Maximum market capacity per cluster
+            shares,  # Market values
+            used,  # Already assigned cells to avoid
+        )
+
+        # Assign selected neighbors to current cluster
+        labels[nbrs] = j
+        used[nbrs] = True
+
+        logger.info(
+            f"Cluster {j} completed: {len(nbrs)} cells, {shares[nbrs].sum():,.0f} customers"
+        )
+
+        j += 1  # Move to next cluster
+
+        # Stop when all requested clusters are created
+        # Implements termination condition for clustering algorithm
+        if j >= num_sales_man:
+            logger.info(f"Reached target number of clusters ({num_sales_man})")
+            break
+
+    return labels
+
+
+def plot_file_name(filename: str, timestamp: str) -> str:
+    """Name of a saved plot under the static plots directory"""
+    return f"{timestamp}_{filename}.png"
+
+
+def to_web_mercator(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Reprojects to EPSG:3857 for plotting on basemap tiles, data without CRS is EPSG:4326"""
+    if gdf.crs is None:
+        gdf = gdf.set_crs(epsg=4326)
+    if gdf.crs.to_epsg() == 3857:
+        return gdf
+    return gdf.to_crs(epsg=3857)
+
+
 def plot_results(
     grided_data: gpd.GeoDataFrame,
     columns: list[str],
@@ -981,11 +1165,15 @@ def plot_results(
     save_to_file: bool = False,
     filename: Optional[str] = None,
     static_dir: str = "static/plots",
+    dpi: int = 300,
+    timestamp: Optional[str] = None,
 ) -> Optional[str]:
     """
-    Enhanced to optionally save plot as file and return URL path
+    Enhanced to optionally save plot as file and return URL path.
+    Data already in EPSG:3857 (see `to_web_mercator`) is plotted without reprojecting
     """
-    grid = grided_data.copy(deep=True)
+    grid = to_web_mercator(grided_data)
+    configure_tile_cache()
     single_fig_width, single_fig_height = subplot_size
 
     fig = plt.figure(
@@ -997,8 +1185,7 @@ def plot_results(
 
     for i, column in enumerate(columns, 1):
         ax = plt.subplot(n_rows, n_cols, i)
-        grid.set_crs(epsg=4326, inplace=True)
-        grid.to_crs(epsg=3857).plot(
+        grid.plot(
             column=f"{column}",
             legend=show_legends,
             cmap=colors[i - 1],
@@ -1007,7 +1194,7 @@ def plot_results(
             alpha=alpha,
             ax=ax,
         )
-        ctx.add_basemap(ax, source=ctx.providers.CartoDB.Positron)
+        ctx.add_basemap(ax, source=BASEMAP_SOURCE)
         ax.axis("off")
         if show_title:
             if title is not None:
@@ -1025,12 +1212,13 @@ def plot_results(
         if filename is None:
             filename = f"plot_{uuid.uuid4().hex[:8]}"
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        full_filename = f"{timestamp}_{filename}.png"
+        if timestamp is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        full_filename = plot_file_name(filename, timestamp)
         filepath = os.path.join(static_dir, full_filename)
 
         # Save the plot
-        plt.savefig(filepath, dpi=300, bbox_inches="tight", facecolor="white")
+        plt.savefig(filepath, dpi=dpi, bbox_inches="tight", facecolor="white")
         plt.close(fig)  # Important: close to free memory
 
         # Return URL path that FastAPI can serve
@@ -1041,171 +1229,263 @@ def plot_results(
         return None
 
 
-def generate_all_plots(
+# Plots of a territory run: (response key, source frame, column, colormap, title,
+# show legend, file name suffix)
+TERRITORY_PLOTS = [
+    (
+        "cluster_markets",
+        "places",
+        "group",
+        "tab20c",
+        "Cluster of markets",
+        False,
+        "cluster_markets",
+    ),
+    (
+        "number-of-persons",
+        "grid",
+        "number_of_persons",
+        "Greens",
+        "Number of persons",
+        True,
+        "number_of_persons",
+    ),
+    (
+        "effective-population",
+        "grid",
+        "effective_population",
+        "Reds",
+        "Effective population",
+        True,
+        "effective_population",
+    ),
+    (
+        "number-of-supermarkets",
+        "grid",
+        "number_of_supermarkets",
+        "Blues",
+        "Number of supermarkets",
+        True,
+        "number_of_supermarkets",
+    ),
+    (
+        "number-of-potential-customers",
+        "grid",
+        "number_of_potential_customers",
+        "Purples",
+        "Number of potential customers",
+        True,
+        "number_of_potential_customers",
+    ),
+]
+
+
+def territory_plot_urls(request_id: str, timestamp: str) -> dict:
+    """URLs the plots of `generate_all_plots` are saved under, known before rendering"""
+    return {
+        key: f"/static/plots/{plot_file_name(f'{request_id}_{suffix}', timestamp)}"
+        for key, _, _, _, _, _, suffix in TERRITORY_PLOTS
+    }
+
+
+async def generate_all_plots(
     masked_grided_data: gpd.GeoDataFrame,
     places: gpd.GeoDataFrame,
     request_id: str = None,
+    timestamp: Optional[str] = None,
+    dpi: int = 300,
 ) -> dict:
     """
-    Generate all plots and save them as static files
+    Generate all plots and save them as static files. The data is reprojected to
+    EPSG:3857 once and every plot renders in its own worker of the process pool
+
+    args:
+    ----
+    `masked_grided_data` are the grid cells with their `group` column
+    `places` are the places with their `group` column
+    `request_id` and `timestamp` name the files, see `territory_plot_urls`
+    `dpi` is the resolution of the saved images
+
+    return:
+    ------
+    the URL of each plot, keyed as in `TERRITORY_PLOTS`
     """
     if request_id is None:
         request_id = uuid.uuid4().hex[:8]
+    if timestamp is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-    plots = {}
+    # Reproject once, every plot of the same frame shares the result
+    projected_grid, projected_places = await asyncio.gather(
+        run_cpu_bound(to_web_mercator, masked_grided_data),
+        run_cpu_bound(to_web_mercator, places),
+    )
+    frames = {"grid": projected_grid, "places": projected_places}
+
+    urls = await asyncio.gather(
+        *(
+            run_cpu_bound(
+                plot_results,
+                frames[source],
+                [column],
+                1,
+                1,
+                [color],
+                alpha=1,
+                show_legends=show_legends,
+                edge_color=None,
+                show_title=True,
+                title=[title],
+                save_to_file=True,
+                filename=f"{request_id}_{suffix}",
+                dpi=dpi,
+                timestamp=timestamp,
+            )
+            for _, source, column, color, title, show_legends, suffix in TERRITORY_PLOTS
+        )
+    )
 
-    # Cluster of markets plot
-    plots["cluster_markets"] = plot_results(
-        places,
-        ["group"],
-        1,
-        1,
-        ["tab20c"],
-        alpha=1,
-        show_legends=False,
-        edge_color=None,
-        show_title=True,
-        title=["Cluster of markets"],
-        save_to_file=True,
-        filename=f"{request_id}_cluster_markets",
-    )
-
-    # Individual metric plots
-    metrics = [
-        ("number_of_persons", "Greens", "Number of persons"),
-        ("effective_population", "Reds", "Effective population"),
-        ("number_of_supermarkets", "Blues", "Number of supermarkets"),
-        (
-            "number_of_potential_customers",
-            "Purples",
-            "Number of potential customers",
-        ),
-    ]
+    await run_cpu_bound(enforce_tile_cache_limit)
 
-    for column, color, title in metrics:
-        plot_key = column.replace("_", "-")
-        plots[plot_key] = plot_results(
-            masked_grided_data,
-            [column],
-            1,
-            1,
-            [color],
-            alpha=1,
-            show_legends=True,
-            edge_color=None,
-            show_title=True,
-            title=[title],
-            save_to_file=True,
-            filename=f"{request_id}_{column}",
-        )
+    return {plot[0]: url for plot, url in zip(TERRITORY_PLOTS, urls)}
 
-    return plots
 
+# Raw layers of a territory run, streamed by `territory_raw_layer_lines`
+TERRITORY_RAW_LAYERS = ("grid", "places")
 
-async def get_clusters_for_sales_man(
-    req: ReqClustersForSalesManData,
-) -> gpd.GeoDataFrame:
+
+def territory_raw_data_urls(user_id: str, request_id: str) -> dict:
+    """URLs the raw layers of a territory run are streamed from, keyed by layer"""
+    return {
+        layer: CONF.sales_man_raw_data.format(
+            user_id=user_id, request_id=request_id, layer=layer
+        )
+        for layer in TERRITORY_RAW_LAYERS
+    }
+
+
+def ndjson_features(
+    gdf: gpd.GeoDataFrame, precision: int = 6, chunk_size: int = 1000
+) -> Iterator[bytes]:
     """
-    Main funtion to produce the clusters for the salesman problem
+    The features of `gdf.to_json()` as newline delimited JSON, in chunks of lines.
+
     args:
     ----
-    `num_sales_man` is the number of cluster we want in the final output geodataframe
-    `population` is the raw census dataframe
-    `places` is the raw places dataframe containing responese column
-    `weights` is the raw income data
-    `bounding_box` is a list if longitude, latitude pair
-    `distance_limit` is the max distace a cosumer is willing to travel to reach destination
-    `zoom_level` is the zoom_level for the census data
+    `gdf` is the layer, its index becomes the feature ids
+    `precision` is the number of decimals the coordinates are rounded to, 6 is ~10 cm
+    `chunk_size` is the number of features per yielded chunk
 
     return:
     ------
-    A geodataframe constaining gridcells (polygons) under geometry column
-    each grid cell is classfied by cluster index under group column
+    an iterator of byte chunks, each a run of complete lines
     """
+    geometry_name = gdf.geometry.name
+    properties = pd.DataFrame(gdf.drop(columns=geometry_name))
+    geometries = gdf.geometry.to_numpy()
+    ids = gdf.index.astype(str)
+    for start in range(0, len(gdf), chunk_size):
+        stop = start + chunk_size
+        geojson = shapely.to_geojson(
+            shapely.transform(
+                geometries[start:stop], lambda coords: np.round(coords, precision)
+            )
+        )
+        records = properties.iloc[start:stop].to_dict("records")
+        yield b"".join(
+            orjson.dumps(
+                {
+                    "id": feature_id,
+                    "type": "Feature",
+                    "properties": record,
+                    "geometry": None if geometry is None else orjson.Fragment(geometry),
+                },
+                option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_SERIALIZE_NUMPY,
+            )
+            for feature_id, record, geometry in zip(ids[start:stop], records, geojson)
+        )
 
-    default_zoom = 14
-    logger.info(
-        f"Starting sales territory clustering for {req.city_name}, {req.country_name}"
-    )
-    logger.info(f"Target number of sales territories: {req.num_sales_man}")
-    logger.info(
-        f"Distance limit: {req.distance_limit}km, Zoom level: {default_zoom}"
-    )
 
-    # Retrieve geographic boundary data for specified city
-    all_cities = await fetch_country_city_data()
+async def territory_raw_layer_lines(
+    user_id: str, request_id: str, layer: str, precision: int = 6
+) -> Iterator[bytes]:
+    """
+    NDJSON lines of a raw layer of the territory run `request_id` of `user_id`, see
+    `ndjson_features`. Raises a 404 HTTPException when the layer is unknown or the run
+    expired or is another user's.
+    """
+    frames = None
+    if layer in TERRITORY_RAW_LAYERS:
+        frames = await asyncio.to_thread(
+            TERRITORY_CACHE.get,
+            TERRITORY_CACHE.key("territory_raw", user_id, request_id),
+        )
+    if frames is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Raw {layer} layer not found for territory request {request_id}",
+        )
+    return ndjson_features(frames[layer], precision)
 
-    # Search for target city within country's city database
-    found_city = None
-    for city in all_cities.get(req.country_name, []):
-        if city["name"] == req.city_name:
-            found_city = city
-            break
 
-    if found_city is None:
-        logger.error(f"City {req.city_name} not found in {req.country_name}")
-        raise ValueError(f"City not found: {req.city_name}")
+# Cross-request cache of the population data and market grids of territory runs
+TERRITORY_CACHE = IntermediateCache(
+    CONF.territory_cache_dir,
+    ttl_seconds=CONF.territory_cache_ttl_seconds,
+    max_memory_bytes=CONF.territory_cache_max_memory_bytes,
+    max_disk_bytes=CONF.territory_cache_max_disk_bytes,
+)
 
-    # Extract bounding box coordinates that define study area extent
-    bounding_box = found_city.get("bounding_box", [])
-    logger.info(f"City bounding box: {len(bounding_box)} coordinate pairs")
 
-    # Load demographic and economic data for the study area
-    # Zoom level controls resolution/granularity of population data
-    logger.info("Loading population and income data...")
-    population_gdf, income_gdf = await get_population_and_income(
-        bounding_box, zoom_level=default_zoom
-    )
+# Stages of get_clusters_for_sales_man, in order, as passed to its progress callback
+TERRITORY_STAGES = ("data_load", "gridding", "clustering", "analytics", "plotting")
 
-    logger.info(
-        f"Loaded {len(population_gdf)} population records, {len(income_gdf) if income_gdf is not None else 0} income records"
-    )
-    if income_gdf is not None and len(income_gdf) > 0:
-        logger.info("Income data diagnostic:")
-        for col in income_gdf.columns:
-            if col != "geometry":
-                values = income_gdf[col].values
-                logger.info(
-                    f"  Column '{col}': {len(values)} values, {np.isnan(values).sum()} NaN"
-                )
-                if not np.all(np.isnan(values)):
-                    logger.info(
-                        f"    Range: {np.nanmin(values):.2f} to {np.nanmax(values):.2f}"
-                    )
-    else:
-        logger.warning("Income data is empty or None")
-    # Retrieve businesses/facilities data for the entire city
-    logger.info("Loading business/facility data...")
-    page_token = ""
-    data_load_req = ReqFetchDataset(
-        boolean_query=req.boolean_query,  # Search criteria by types
-        action="full data",
-        page_token=page_token,
-        city_name=req.city_name,
-        country_name=req.country_name,
-        user_id=req.user_id,
-        full_load=True,
-    )
-    places = await fetch_dataset(data_load_req)
-    places = places.get("full_load_geojson", {})
+# Zoom level of the census data of territory runs
+CENSUS_ZOOM_LEVEL = 14
 
-    # Filter facilities to study area boundaries
-    places = filter_data_by_bounding_box(places, bounding_box)
-    logger.info(f"Filtered to {len(places)} places within study area")
 
-    # Remove duplicate facility locations (data quality control)
-    original_count = len(places)
-    places = places.loc[places.geometry.drop_duplicates().index]
-    logger.info(
-        f"Removed {original_count - len(places)} duplicate locations, {len(places)} unique places remain"
-    )
+def build_market_grid(
+    population_gdf: gpd.GeoDataFrame,
+    places: gpd.GeoDataFrame,
+    income_gdf: gpd.GeoDataFrame,
+    distance_limit: float,
+    distance_backend: str = "dense",
+    grid_shape: str = "square",
+    diagnostics: bool = False,
+    travel_cost=None,
+) -> Tuple[gpd.GeoDataFrame, Optional[dict]]:
+    """
+    CPU-bound stage of `get_clusters_for_sales_man`: gridding and accessibility.
+
+    args:
+    ----
+    `population_gdf` is the census dataframe of the study area
+    `places` are the deduplicated places within the study area
+    `income_gdf` is the income data, `None` if unavailable
+    `distance_limit` is the max distace a cosumer is willing to travel to reach destination
+    `distance_backend` selects the distance matrix backend ("dense" or "chunked")
+    `grid_shape` selects square or hexagonal ("hex") grid cells
+    `diagnostics` collects the checks of `grid_diagnostics` while gridding
+    `travel_cost` is the travel cost provider of the accessibility, haversine by default
 
+    return:
+    ------
+    the grid cells with market potential, and the diagnostics or `None` if not collected
+    """
     # Generate grid-based spatial aggregation with accessibility analysis
     # Implements spatial tessellation with market potential calculation
     # Combines population, facilities, income, and accessibility into unified spatial framework
     logger.info("Generating grid-based spatial aggregation...")
+    grid_checks = {} if diagnostics else None
     grided_data = get_grids_of_data(
-        population_gdf, places, income_gdf, req.distance_limit
+        population_gdf,
+        places,
+        income_gdf,
+        distance_limit,
+        distance_backend=distance_backend,
+        grid_shape=grid_shape,
+        diagnostics=grid_checks,
+        travel_cost=travel_cost,
     )
 
     # Filter to grid cells with actual market potential
@@ -1229,30 +1509,28 @@ async def get_clusters_for_sales_man(
         f"  Removed {len(grided_data) - len(masked_grided_data)} empty cells"
     )
 
-    # Calculate geometric centroids for distance calculations
-    # Converts polygon grid cells to representative point locations
-    # Implements spatial geometry simplification for efficient distance computation
-    centroids = masked_grided_data.geometry.map(shapely.centroid)
+    return masked_grided_data, grid_checks
 
-    # Convert centroids to coordinate DataFrame for distance matrix calculation
-    nbrs = centroids.to_frame()
-    nbrs["longitude"] = nbrs.geometry.x  # Extract longitude coordinates
-    nbrs["latitude"] = nbrs.geometry.y  # Extract latitude coordinates
 
-    logger.info(f"Calculated centroids for {len(nbrs)} grid cells")
+def cluster_market_grid(
+    masked_grided_data: gpd.GeoDataFrame,
+    req: ReqClustersForSalesManData,
+    previous_labels: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    CPU-bound stage of `get_clusters_for_sales_man`: territory clustering.
 
-    # Compute distance matrix between all grid cell centroids
-    # Implements spatial proximity analysis for cluster contiguity constraints
-    # Results in symmetric matrix of inter-centroid distances
-    # Example: 450×450 matrix with distances ranging 0.8-28.5 km between grid centroids
-    logger.info("Computing distance matrix between grid centroids...")
-    matrix = haversine(
-        nbrs.latitude.values,
-        nbrs.longitude.values,
-        nbrs.latitude.values,
-        nbrs.longitude.values,
-    )
+    args:
+    ----
+    `masked_grided_data` are the grid cells with market potential
+    `req` is the territory request (number of salesmen, engine and backend options)
+    `previous_labels` is the territory of each cell in the run of `req.previous_request_id`,
+    when given the previous assignment is repaired instead of clustering from scratch
 
+    return:
+    ------
+    an integer label array with the territory index of each grid cell (-1 = unassigned)
+    """
     # Calculate target market share per salesperson
     # Implements equitable distribution principle: divide total market equally
     # Ensures balanced workload assignment across sales territories
@@ -1267,92 +1545,196 @@ async def get_clusters_for_sales_man(
         f"  This represents balanced workload distribution across {req.num_sales_man} salespeople"
     )
 
-    # Initialize clustering data structures
-    used = []  # Track assigned grid cells to prevent overlap
-    groups = {
-        i: [] for i in range(req.num_sales_man)
-    }  # Store cluster assignments
+    # Cluster the grid cells into an integer label array (-1 = unassigned)
+    shares = masked_grided_data["number_of_potential_customers"].to_numpy(
+        dtype=float
+    )
+    if previous_labels is not None:
+        # Incremental mode: keep the previous territories and repair them locally
+        logger.info(
+            f"Repairing the territories of request {req.previous_request_id}"
+        )
+        labels = repair_territories(
+            masked_grided_data,
+            shares,
+            previous_labels,
+            req.num_sales_man,
+            contiguity=req.contiguity,
+            time_budget=req.time_budget_seconds,
+        )
+    elif req.clustering_engine == "balanced":
+        # Contiguity-aware region growing with boundary swaps on the grid graph
+        logger.info(
+            f"Using balanced territory engine ({req.contiguity} contiguity, {req.time_budget_seconds}s budget)"
+        )
+        labels = assign_balanced_territories(
+            masked_grided_data,
+            shares,
+            req.num_sales_man,
+            contiguity=req.contiguity,
+            time_budget=req.time_budget_seconds,
+        )
+    else:
+        # Calculate geometric centroids for distance calculations
+        # Converts polygon grid cells to representative point locations
+        # Implements spatial geometry simplification for efficient distance computation
+        centroids = masked_grided_data.geometry.map(shapely.centroid)
+
+        # Convert centroids to coordinate DataFrame for distance matrix calculation
+        nbrs = centroids.to_frame()
+        nbrs["longitude"] = nbrs.geometry.x  # Extract longitude coordinates
+        nbrs["latitude"] = nbrs.geometry.y  # Extract latitude coordinates
+
+        logger.info(f"Calculated centroids for {len(nbrs)} grid cells")
+
+        # Compute distance matrix between all grid cell centroids
+        # Implements spatial proximity analysis for cluster contiguity constraints
+        # Results in symmetric matrix of inter-centroid distances
+        # The chunked backend only evaluates the rows of the cluster seeds on demand
+        # Example: 450×450 matrix with distances ranging 0.8-28.5 km between grid centroids
+        logger.info("Computing distance matrix between grid centroids...")
+        matrix = get_distance_backend(req.distance_backend).distance_rows(
+            nbrs.latitude.values,
+            nbrs.longitude.values,
+        )
 
-    logger.info("Starting greedy spatial clustering algorithm...")
+        labels = assign_greedy_territories(matrix, shares, req.num_sales_man)
 
-    # Greedy spatial clustering algorithm with load balancing
-    # Implements modified k-means with spatial contiguity constraints
-    j = 0  # Current cluster index
-    clusters_created = 0
+    return labels
 
-    for i in range(masked_grided_data.shape[0]):
 
-        # Skip grid cells already assigned to clusters
-        # Maintains partition constraint: each cell belongs to exactly one cluster
-        if i in used:
-            continue
-        else:
-            logger.info(f"Creating cluster {j} starting from grid cell {i}")
-
-            # Find spatially contiguous neighbors within capacity limit
-            # Implements greedy nearest-neighbor expansion with load balancing
-            # Example: Starting from grid 25, might select [25, 26, 35, 24, 36, 15] totaling 23,100 customers
-            nbrs = select_nbrs_with_sum(
-                i,  # Current seed grid cell
-                matrix[i],  # Distances from seed to all other cells
-                equitable_share,  # Maximum market capacity per cluster
-                masked_grided_data[
-                    "number_of_potential_customers"
-                ].values,  # Market values
-                used,  # Already assigned cells to avoid
-            )
+def territory_assignment(
+    masked_grided_data: gpd.GeoDataFrame,
+    labels: np.ndarray,
+    req: ReqClustersForSalesManData,
+) -> dict:
+    """Compact record of a territory run that a later run can repair, see `previous_request_id`"""
+    centroids = shapely.centroid(masked_grided_data.geometry.values)
+    return {
+        "country_name": req.country_name,
+        "city_name": req.city_name,
+        "boolean_query": req.boolean_query,
+        "centroids": np.column_stack(
+            [shapely.get_x(centroids), shapely.get_y(centroids)]
+        ),
+        "labels": np.asarray(labels, dtype=np.int64),
+    }
 
-            # Assign selected neighbors to current cluster
-            groups[j].extend(nbrs)  # Add cells to cluster j
-            used.extend(nbrs)  # Mark cells as assigned
 
-            cluster_customers = sum(
-                masked_grided_data["number_of_potential_customers"].iloc[idx]
-                for idx in nbrs
-            )
-            logger.info(
-                f"Cluster {j} completed: {len(nbrs)} cells, {cluster_customers:,.0f} customers"
-            )
+async def load_previous_labels(
+    masked_grided_data: gpd.GeoDataFrame, req: ReqClustersForSalesManData
+) -> np.ndarray:
+    """
+    Territory of each current grid cell in the run of `req.previous_request_id`.
+    Raises ValueError when that run is unknown, expired, another user's or of another
+    city.
+    """
+    previous = await asyncio.to_thread(
+        TERRITORY_CACHE.get,
+        TERRITORY_CACHE.key(
+            "territory_assignment", req.user_id, req.previous_request_id
+        ),
+    )
+    if previous is None:
+        raise ValueError(
+            f"Previous territory assignment not found: {req.previous_request_id}"
+        )
+    if (previous["country_name"], previous["city_name"]) != (
+        req.country_name,
+        req.city_name,
+    ):
+        raise ValueError(
+            f"Previous territory assignment {req.previous_request_id} is of "
+            f"{previous['city_name']}, {previous['country_name']}"
+        )
+    return match_previous_labels(
+        masked_grided_data, previous["centroids"], previous["labels"]
+    )
 
-            j += 1  # Move to next cluster
-            clusters_created += 1
 
-        # Stop when all requested clusters are created
-        # Implements termination condition for clustering algorithm
-        if j >= req.num_sales_man:
-            logger.info(
-                f"Reached target number of clusters ({req.num_sales_man})"
-            )
-            break
+def assign_places_to_territories(
+    places: gpd.GeoDataFrame, labelled_grid: gpd.GeoDataFrame
+) -> np.ndarray:
+    """
+    Assigns every place to the territory of the grid cell containing it, with a single
+    spatial index query against the labelled cells.
+
+    args:
+    ----
+    `places` are the places (points) of the study area
+    `labelled_grid` are the grid cells with their territory in the `group` column
+    (NaN for unassigned cells)
+
+    return:
+    ------
+    the territory of each place, -1 for places outside every assigned cell. Places on a
+    border between cells get the territory of the first cell
+    """
+    groups = np.full(len(places), -1, dtype=np.int64)
+    assigned = labelled_grid[labelled_grid["group"].notna()]
+    if len(places) == 0 or len(assigned) == 0:
+        return groups
+
+    place_pos, cell_pos = assigned.sindex.query(
+        places.geometry.values, predicate="intersects"
+    )
+    # Border points hit several cells, keep the first cell of each place
+    order = np.lexsort((cell_pos, place_pos))
+    place_pos, cell_pos = place_pos[order], cell_pos[order]
+    place_pos, first = np.unique(place_pos, return_index=True)
+
+    groups[place_pos] = assigned["group"].to_numpy()[cell_pos[first]].astype(np.int64)
+    return groups
+
+
+def build_territory_report(
+    masked_grided_data: gpd.GeoDataFrame,
+    places: gpd.GeoDataFrame,
+    labels: np.ndarray,
+    req: ReqClustersForSalesManData,
+) -> Tuple[dict, gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """
+    CPU-bound stage of `get_clusters_for_sales_man`: territory analytics.
+
+    args:
+    ----
+    `masked_grided_data` are the grid cells with market potential
+    `places` are the deduplicated places within the study area
+    `labels` is the territory label array from `cluster_market_grid`
+    `req` is the territory request
+
+    return:
+    ------
+    the response data without plots, and the grid cells and places with their `group` column
+    """
+    shares = masked_grided_data["number_of_potential_customers"].to_numpy(
+        dtype=float
+    )
+    total_customers = shares.sum()
+    equitable_share = total_customers / req.num_sales_man
+
+    cells_per_group = np.bincount(
+        labels[labels >= 0], minlength=req.num_sales_man
+    )
+    clusters_created = int(np.count_nonzero(cells_per_group))
+    assigned_cells = int(cells_per_group.sum())
 
     logger.info("Clustering completed:")
     logger.info(f"  Clusters created: {clusters_created}")
     logger.info(
-        f"  Grid cells assigned: {len(used)}/{len(masked_grided_data)} ({100*len(used)/len(masked_grided_data):.1f}%)"
-    )
-    logger.info(f"  Unassigned cells: {len(masked_grided_data) - len(used)}")
-
-    # Helper function to map grid cell indices to cluster labels
-    # Implements reverse lookup for cluster assignment labeling
-    def return_group_number(index: int) -> int:
-        """
-        Returns back the class/group index for each grid cell based in the `groups` dict
-        `groups` is the dict created in the `get_clusters_for_sales_man`
-        `index`is the index of the gridcell in the `masked_grided_data`
-        """
-        for k, v in groups.items():
-            if index in v:
-                return k
-        return None  # Return None for unassigned cells
+        f"  Grid cells assigned: {assigned_cells}/{len(masked_grided_data)} ({100*assigned_cells/len(masked_grided_data):.1f}%)"
+    )
+    logger.info(
+        f"  Unassigned cells: {len(masked_grided_data) - assigned_cells}"
+    )
 
     # Apply cluster labels to grid data
     # Implements final data preparation with cluster identification
     # Creates new column indicating which sales territory each grid cell belongs to
+    # Unassigned cells get NaN, matching the previous reverse lookup
     # Example: Final output has 'group' column with values 0-7 for 8 sales territories
-    masked_grided_data = masked_grided_data.assign(group=lambda x: x.index)
-    masked_grided_data["group"] = masked_grided_data["group"].map(
-        return_group_number
-    )
+    group = pd.Series(labels, index=masked_grided_data.index)
+    masked_grided_data["group"] = group.where(group >= 0)
 
     # Log final cluster statistics
     cluster_stats = (
@@ -1362,15 +1744,17 @@ async def get_clusters_for_sales_man(
     )
 
     logger.info("Final cluster statistics:")
+    customers_per_group = np.bincount(
+        labels[labels >= 0],
+        weights=shares[labels >= 0],
+        minlength=req.num_sales_man,
+    )
     for group_id in range(req.num_sales_man):
-        if group_id in groups:
-            cells = len(groups[group_id])
-            customers = masked_grided_data[
-                masked_grided_data["group"] == group_id
-            ]["number_of_potential_customers"].sum()
-            logger.info(
-                f"  Cluster {group_id}: {cells} cells, {customers:,.0f} customers ({100*customers/total_customers:.1f}% of total)"
-            )
+        cells = cells_per_group[group_id]
+        customers = customers_per_group[group_id]
+        logger.info(
+            f"  Cluster {group_id}: {cells} cells, {customers:,.0f} customers ({100*customers/total_customers:.1f}% of total)"
+        )
 
     unassigned = len(masked_grided_data[masked_grided_data["group"].isna()])
     if unassigned > 0:
@@ -1381,87 +1765,88 @@ async def get_clusters_for_sales_man(
     # masked_grided_data.to_file("sales_territories.geojson", driver="GeoJSON")
     # places.to_file("places.geojson", driver="GeoJSON")
 
-    places["group"] = -1
-    for i in masked_grided_data.group.unique():
-        cluster = (
-            masked_grided_data.loc[masked_grided_data.group == i]
-            .union_all()
-            .convex_hull
+    # Single analytics pass: aggregate every territory metric in one groupby and
+    # dissolve the cells (and their centroids) once per territory, instead of
+    # filtering and unioning the cells of each territory several times
+    territory_ids = pd.RangeIndex(req.num_sales_man, name="group")
+    territory_stats_table = (
+        masked_grided_data.groupby("group")
+        .agg(
+            total_population=("number_of_persons", "sum"),
+            effective_population=("effective_population", "sum"),
+            avg_accessibility=("effective_population", "mean"),
+            facility_count=("number_of_supermarkets", "sum"),
+            potential_customers=("number_of_potential_customers", "sum"),
         )
-        places.loc[places.geometry.within(cluster), "group"] = i
-
-    # Generate unique request ID for this session
-    request_id = uuid.uuid4().hex[:8]
-    logger.info(f"Generating plots for request {request_id}")
-
-    # Generate plots and get their URLs
-    plot_urls = generate_all_plots(masked_grided_data, places, request_id)
-
-    logger.info(
-        "Sales territory clustering and plot generation completed successfully"
+        .reindex(territory_ids)
     )
+    territory_shapes = (
+        masked_grided_data[["group", "geometry"]]
+        .dissolve(by="group")
+        .geometry.reindex(territory_ids)
+    )
+    territory_centroids = (
+        gpd.GeoDataFrame(
+            {"group": masked_grided_data["group"]},
+            geometry=masked_grided_data.geometry.centroid,
+        )
+        .dissolve(by="group")
+        .geometry.reindex(territory_ids)
+    )
+    empty_geometry = shapely.GeometryCollection()
+
+    places["group"] = assign_places_to_territories(places, masked_grided_data)
 
     # Generate territory-level analytics (currently only logged)
     territory_analytics = []
     territory_boundaries = []
 
     for group_id in range(req.num_sales_man):
-        if group_id in groups:
-            # Extract territory data that's currently only logged
-            territory_data = masked_grided_data[
-                masked_grided_data["group"] == group_id
-            ]
-
-            # Calculate comprehensive territory metrics
-            territory_stats = {
-                "territory_id": group_id,
-                "grid_cells": len(groups[group_id]),
-                "total_population": int(
-                    territory_data["number_of_persons"].sum()
-                ),
-                "effective_population": round(
-                    territory_data["effective_population"].sum(), 2
-                ),
-                "facility_count": int(
-                    territory_data["number_of_supermarkets"].sum()
-                ),
-                "potential_customers": int(
-                    territory_data["number_of_potential_customers"].sum()
-                ),
-                "market_share_percentage": round(
-                    (
-                        territory_data["number_of_potential_customers"].sum()
-                        / total_customers
-                    )
-                    * 100,
-                    1,
-                ),
-                "avg_accessibility": round(
-                    territory_data["effective_population"].mean(), 2
-                ),
-                "population_density": round(
-                    territory_data["number_of_persons"].sum()
-                    / len(groups[group_id]),
-                    0,
-                ),
-                "facility_density": round(
-                    territory_data["number_of_supermarkets"].sum()
-                    / len(groups[group_id]),
-                    2,
-                ),
-            }
-            territory_analytics.append(territory_stats)
-
-            # Create territory boundary geometry
-            territory_boundary = {
-                "territory_id": group_id,
-                "boundary_geometry": territory_data.union_all().convex_hull.__geo_interface__,
-                "centroid": territory_data.geometry.centroid.union_all().__geo_interface__,
-                "area_km2": round(
-                    territory_data.union_all().area * 111.32**2, 2
-                ),  # Convert to km²
-            }
-            territory_boundaries.append(territory_boundary)
+        stats = territory_stats_table.loc[group_id]
+        cells = int(cells_per_group[group_id])
+        # Territories without cells have no rows, their sums are 0 and their means NaN
+        persons = np.nan_to_num(stats["total_population"])
+        facilities = np.nan_to_num(stats["facility_count"])
+        customers = np.nan_to_num(stats["potential_customers"])
+
+        # Calculate comprehensive territory metrics
+        territory_stats = {
+            "territory_id": group_id,
+            "grid_cells": cells,
+            "total_population": int(persons),
+            "effective_population": round(
+                np.nan_to_num(stats["effective_population"]), 2
+            ),
+            "facility_count": int(facilities),
+            "potential_customers": int(customers),
+            "market_share_percentage": round(
+                (customers / total_customers) * 100,
+                1,
+            ),
+            "avg_accessibility": round(stats["avg_accessibility"], 2),
+            "population_density": round(
+                persons / cells if cells else np.nan, 0
+            ),
+            "facility_density": round(
+                facilities / cells if cells else np.nan, 2
+            ),
+        }
+        territory_analytics.append(territory_stats)
+
+        # Create territory boundary geometry
+        shape = territory_shapes[group_id]
+        if shape is None:
+            shape = empty_geometry
+        centroid = territory_centroids[group_id]
+        if centroid is None:
+            centroid = empty_geometry
+        territory_boundary = {
+            "territory_id": group_id,
+            "boundary_geometry": shape.convex_hull.__geo_interface__,
+            "centroid": centroid.__geo_interface__,
+            "area_km2": round(shape.area * 111.32**2, 2),  # Convert to km²
+        }
+        territory_boundaries.append(territory_boundary)
 
     # Generate business intelligence insights
     total_population = sum(t["total_population"] for t in territory_analytics)
@@ -1571,9 +1956,6 @@ async def get_clusters_for_sales_man(
 
     # Core response data
     response_data = {
-        "success": True,
-        "request_id": request_id,
-        "plots": plot_urls,
         "metadata": {
             "total_customers": int(total_customers),
             "clusters_created": clusters_created,
@@ -1581,7 +1963,9 @@ async def get_clusters_for_sales_man(
             "city_name": req.city_name,
             "country_name": req.country_name,
             "analysis_date": datetime.now().isoformat(),
-            "distance_limit_km": req.distance_limit,
+            "distance_limit": req.distance_limit,
+            "distance_limit_unit": TRAVEL_COST_PROVIDERS[req.travel_cost].unit,
+            "travel_cost": req.travel_cost,
             "business_type": req.boolean_query,
         },
         "territory_analytics": territory_analytics,
@@ -1607,20 +1991,441 @@ async def get_clusters_for_sales_man(
         ),
     }
 
-    # Raw data (conditional)
+    # Add remaining fields
+    # The raw layers are streamed separately, `raw_cluster_data` only references them
+    response_data["geographic_summary"] = geographic_summary
+    response_data["raw_cluster_data"] = None
+
+    return response_data, masked_grided_data, places
+
+
+async def load_territory_sources(
+    req: ReqClustersForSalesManData,
+    bounding_box: list[tuple[float, float]],
+    zoom_level: int,
+) -> Tuple[gpd.GeoDataFrame, gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """
+    Data load stage of `get_clusters_for_sales_man`.
+
+    args:
+    ----
+    `req` is the territory request (city, country, query and user)
+    `bounding_box` is the list of longitude, latitude pairs of the city
+    `zoom_level` is the zoom_level for the census data
+
+    return:
+    ------
+    the census population, the income data and the deduplicated places of the study area
+    """
+    # Load demographic and economic data for the study area
+    # Zoom level controls resolution/granularity of population data
+    # Cached data is shared by every query and user of the city at this zoom, it is
+    # read from the intelligence layers without a purchase
+    population_key = TERRITORY_CACHE.key(
+        "population_income", bounding_box, zoom_level
+    )
+    cached_population = await asyncio.to_thread(
+        TERRITORY_CACHE.get, population_key
+    )
+    if cached_population is not None:
+        logger.info("Reusing cached population and income data")
+        population_gdf, income_gdf = cached_population
+    else:
+        logger.info("Loading population and income data...")
+        population_gdf, income_gdf = await get_population_and_income(
+            bounding_box, zoom_level=zoom_level
+        )
+        await asyncio.to_thread(
+            TERRITORY_CACHE.put, population_key, (population_gdf, income_gdf)
+        )
+
+    logger.info(
+        f"Loaded {len(population_gdf)} population records, {len(income_gdf) if income_gdf is not None else 0} income records"
+    )
+    if income_gdf is not None and len(income_gdf) > 0:
+        logger.info("Income data diagnostic:")
+        for col in income_gdf.columns:
+            if col != "geometry":
+                values = income_gdf[col].values
+                logger.info(
+                    f"  Column '{col}': {len(values)} values, {np.isnan(values).sum()} NaN"
+                )
+                if not np.all(np.isnan(values)):
+                    logger.info(
+                        f"    Range: {np.nanmin(values):.2f} to {np.nanmax(values):.2f}"
+                    )
+    else:
+        logger.warning("Income data is empty or None")
+    # Retrieve businesses/facilities data for the entire city
+    logger.info("Loading business/facility data...")
+    page_token = ""
+    data_load_req = ReqFetchDataset(
+        boolean_query=req.boolean_query,  # Search criteria by types
+        action="full data",
+        page_token=page_token,
+        city_name=req.city_name,
+        country_name=req.country_name,
+        user_id=req.user_id,
+        full_load=True,
+    )
+    places = await fetch_dataset(data_load_req)
+    places = places.get("full_load_geojson", {})
+
+    # Filter facilities to study area boundaries
+    places = filter_data_by_bounding_box(places, bounding_box)
+    logger.info(f"Filtered to {len(places)} places within study area")
+
+    # Remove duplicate facility locations (data quality control)
+    original_count = len(places)
+    places = places.loc[places.geometry.drop_duplicates().index]
+    logger.info(
+        f"Removed {original_count - len(places)} duplicate locations, {len(places)} unique places remain"
+    )
+
+    return population_gdf, income_gdf, places
+
+
+async def find_city_bounding_box(
+    country_name: str, city_name: str
+) -> list[tuple[float, float]]:
+    """Bounding box of a city in `fetch_country_city_data`, raises ValueError if not found"""
+    all_cities = await fetch_country_city_data()
+
+    # Search for target city within country's city database
+    found_city = None
+    for city in all_cities.get(country_name, []):
+        if city["name"] == city_name:
+            found_city = city
+            break
+
+    if found_city is None:
+        logger.error(f"City {city_name} not found in {country_name}")
+        raise ValueError(f"City not found: {city_name}")
+
+    # Extract bounding box coordinates that define study area extent
+    bounding_box = found_city.get("bounding_box", [])
+    logger.info(f"City bounding box: {len(bounding_box)} coordinate pairs")
+    return bounding_box
+
+
+async def prepare_market_grid(
+    req: ReqClustersForSalesManData,
+    load_sources: Callable[[], Awaitable[tuple]],
+    report_stage: Callable[[str], None],
+) -> Tuple[gpd.GeoDataFrame, gpd.GeoDataFrame, Optional[dict]]:
+    """
+    Stages of `get_clusters_for_sales_man` shared by every salesman count: data load
+    and gridding, reused from `TERRITORY_CACHE` when possible.
+
+    args:
+    ----
+    `req` is the territory request
+    `load_sources` returns the population, income and places of the city, it is only
+    awaited when the market grid is not cached
+    `report_stage` is called with the name of each stage as it starts
+
+    return:
+    ------
+    the grid cells with market potential, the places and the grid diagnostics (or `None`)
+    """
+    travel_cost = get_travel_cost_provider(
+        req.travel_cost, req.country_name, req.city_name
+    )
+
+    # Intermediates up to the market grid only depend on the city, zoom, query and
+    # travel cost, a rerun with another salesman count only redoes the clustering.
+    # The grid holds the places bought by `fetch_dataset`, so it is only reused by the
+    # user who went through its purchase check.
+    grid_key = TERRITORY_CACHE.key(
+        "market_grid",
+        req.user_id,
+        req.country_name,
+        req.city_name,
+        CENSUS_ZOOM_LEVEL,
+        req.boolean_query,
+        req.distance_limit,
+        req.grid_shape,
+        travel_cost.cache_key(),
+    )
+    # A cached grid built without diagnostics is rebuilt when they are requested
+    cached_grid = await asyncio.to_thread(TERRITORY_CACHE.get, grid_key)
+    if cached_grid is not None and (
+        not req.diagnostics or cached_grid[2] is not None
+    ):
+        logger.info("Reusing cached market grid and places")
+        report_stage("gridding")
+        return cached_grid
+
+    population_gdf, income_gdf, places = await load_sources()
+
+    # CPU-bound stages run in the process pool so the event loop stays responsive
+    # Accessibility is computed while gridding, inside get_grids_of_data
+    report_stage("gridding")
+    masked_grided_data, grid_checks = await run_cpu_bound(
+        build_market_grid,
+        population_gdf,
+        places,
+        income_gdf,
+        req.distance_limit,
+        req.distance_backend,
+        req.grid_shape,
+        req.diagnostics,
+        travel_cost,
+    )
+    await asyncio.to_thread(
+        TERRITORY_CACHE.put,
+        grid_key,
+        (masked_grided_data, places, grid_checks),
+    )
+    return masked_grided_data, places, grid_checks
+
+
+async def solve_territory_scenario(
+    masked_grided_data: gpd.GeoDataFrame,
+    places: gpd.GeoDataFrame,
+    grid_checks: Optional[dict],
+    req: ReqClustersForSalesManData,
+    report_stage: Callable[[str], None],
+) -> dict:
+    """
+    Stages of `get_clusters_for_sales_man` specific to the salesman count: clustering,
+    analytics and plotting. Adds the territory `group` column to the given dataframes.
+
+    return:
+    ------
+    the `ResSalesman` payload
+    """
+    report_stage("clustering")
+    previous_labels = None
+    if req.previous_request_id is not None:
+        previous_labels = await load_previous_labels(masked_grided_data, req)
+    labels = await run_cpu_bound(
+        cluster_market_grid, masked_grided_data, req, previous_labels
+    )
+
+    # Generate unique request ID for this session, the cached runs are keyed by it
+    request_id = uuid.uuid4().hex
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    # Kept so that a later request of the same user can repair this assignment by its
+    # request ID
+    await asyncio.to_thread(
+        TERRITORY_CACHE.put,
+        TERRITORY_CACHE.key("territory_assignment", req.user_id, request_id),
+        territory_assignment(masked_grided_data, labels, req),
+    )
+
+    report_stage("analytics")
+
+    response_data, masked_grided_data, places = await run_cpu_bound(
+        build_territory_report, masked_grided_data, places, labels, req
+    )
     if req.include_raw_data:
-        raw_cluster_data = {
-            "grid_data_geojson": masked_grided_data.to_json(),
-            "places_data_geojson": places.to_json(),
-        }
+        await asyncio.to_thread(
+            TERRITORY_CACHE.put,
+            TERRITORY_CACHE.key("territory_raw", req.user_id, request_id),
+            {"grid": masked_grided_data, "places": places},
+        )
+        response_data["raw_cluster_data"] = territory_raw_data_urls(
+            req.user_id, request_id
+        )
+    if previous_labels is not None:
+        response_data["metadata"]["previous_request_id"] = req.previous_request_id
+        response_data["metadata"]["cells_reassigned"] = int(
+            np.sum(labels != previous_labels)
+        )
+
+    # Plots are rendered lazily: in the background after the response (default),
+    # before responding ("inline") or not at all ("skip")
+    report_stage("plotting")
+    if req.plot_mode == "skip":
+        plot_urls = {}
+    elif req.plot_mode == "inline":
+        logger.info(f"Generating plots for request {request_id}")
+        plot_urls = await generate_all_plots(
+            masked_grided_data, places, request_id, timestamp, req.plot_dpi
+        )
     else:
-        raw_cluster_data = None
+        logger.info(f"Scheduling plots for request {request_id}")
+        plot_urls = territory_plot_urls(request_id, timestamp)
+        get_background_tasks().add_task(
+            generate_all_plots,
+            masked_grided_data,
+            places,
+            request_id,
+            timestamp,
+            req.plot_dpi,
+        )
 
-    # Add remaining fields
-    response_data["geographic_summary"] = geographic_summary
-    response_data["raw_cluster_data"] = raw_cluster_data
+    result = {
+        "success": True,
+        "request_id": request_id,
+        "plots": plot_urls,
+        **response_data,
+    }
+    if req.diagnostics:
+        result["diagnostics"] = {"grid": grid_checks}
+    return result
+
+
+async def get_clusters_for_sales_man(
+    req: ReqClustersForSalesManData,
+    progress: Optional[Callable[[str], None]] = None,
+) -> gpd.GeoDataFrame:
+    """
+    Main funtion to produce the clusters for the salesman problem
+    args:
+    ----
+    `num_sales_man` is the number of cluster we want in the final output geodataframe
+    `population` is the raw census dataframe
+    `places` is the raw places dataframe containing responese column
+    `weights` is the raw income data
+    `bounding_box` is a list if longitude, latitude pair
+    `distance_limit` is the max distace a cosumer is willing to travel to reach destination
+    `zoom_level` is the zoom_level for the census data
+    `distance_backend` selects the distance matrix backend ("dense" or "chunked")
+    `clustering_engine` selects the greedy engine or the contiguity-aware "balanced" solver
+    `grid_shape` selects square or hexagonal ("hex") grid cells
+    `plot_mode` renders the plots in the "background" after responding, "inline" or "skip"s them
+    `plot_dpi` is the resolution of the plot images
+    `diagnostics` adds the checks of `grid_diagnostics` to the response
+    `travel_cost` selects the accessibility cost: "haversine" km, or drive minutes from the
+    "road_speed" approximation or the city's precomputed "matrix"
+    `previous_request_id` repairs the territories of an earlier request instead of
+    clustering from scratch, see `repair_territories`
+    `progress` is called with the name of each stage as it starts, see `TERRITORY_STAGES`
+
+    return:
+    ------
+    A geodataframe constaining gridcells (polygons) under geometry column
+    each grid cell is classfied by cluster index under group column
+    """
+
+    logger.info(
+        f"Starting sales territory clustering for {req.city_name}, {req.country_name}"
+    )
+    logger.info(f"Target number of sales territories: {req.num_sales_man}")
+    logger.info(
+        f"Distance limit: {req.distance_limit} {TRAVEL_COST_PROVIDERS[req.travel_cost].unit}, Zoom level: {CENSUS_ZOOM_LEVEL}"
+    )
+
+    report_stage = progress or (lambda stage: None)
+
+    # Retrieve geographic boundary data for specified city
+    report_stage("data_load")
+    bounding_box = await find_city_bounding_box(req.country_name, req.city_name)
+
+    masked_grided_data, places, grid_checks = await prepare_market_grid(
+        req,
+        partial(load_territory_sources, req, bounding_box, CENSUS_ZOOM_LEVEL),
+        report_stage,
+    )
+    result = await solve_territory_scenario(
+        masked_grided_data, places, grid_checks, req, report_stage
+    )
+
+    logger.info(
+        "Sales territory clustering and plot generation completed successfully"
+    )
+    return result
+
+
+def scenario_comparison_row(
+    scenario_index: int, req: ReqClustersForSalesManData, result: dict
+) -> dict:
+    """One row of the batch comparison table, the headline metrics of a scenario"""
+    equity = result["performance_metrics"]["equity_analysis"]
+    return {
+        "scenario": scenario_index,
+        "num_sales_man": req.num_sales_man,
+        "distance_limit": req.distance_limit,
+        "clustering_engine": req.clustering_engine,
+        "clusters_created": result["metadata"]["clusters_created"],
+        "total_customers": result["metadata"]["total_customers"],
+        "target_customers_per_territory": result["metadata"][
+            "target_customers_per_territory"
+        ],
+        "customer_coefficient_variation": float(
+            equity["customer_balance"]["coefficient_variation"]
+        ),
+        "avg_customers_per_facility": float(
+            equity["workload_balance"]["avg_customers_per_facility"]
+        ),
+        "total_area_km2": result["geographic_summary"]["total_area_km2"],
+    }
+
+
+async def get_clusters_for_sales_man_scenarios(
+    req: ReqClustersForSalesManScenarios,
+) -> dict:
+    """
+    Solves several territory scenarios of the same city and query in one request.
+
+    args:
+    ----
+    `req` has the shared city, query and grid options, and the `scenarios` that each
+    override the salesman count, distance limit and clustering options
 
-    return response_data
+    return:
+    ------
+    the `ResSalesman` payload of each scenario, in order, and a comparison table
+    """
+    logger.info(
+        f"Starting {len(req.scenarios)} sales territory scenarios for {req.city_name}, {req.country_name}"
+    )
+    shared = req.model_dump(exclude={"scenarios"})
+    scenario_reqs = [
+        ReqClustersForSalesManData(**{**shared, **scenario.model_dump()})
+        for scenario in req.scenarios
+    ]
+
+    bounding_box = await find_city_bounding_box(req.country_name, req.city_name)
+
+    # The city data is loaded at most once, for the first grid that is not cached
+    sources = []
+
+    async def load_sources():
+        if not sources:
+            sources.append(
+                await load_territory_sources(
+                    scenario_reqs[0], bounding_box, CENSUS_ZOOM_LEVEL
+                )
+            )
+        population_gdf, income_gdf, places = sources[0]
+        return population_gdf, income_gdf, places.copy()
+
+    # One market grid per distance limit, shared by the scenarios using it
+    grids = {}
+    for scenario_req in scenario_reqs:
+        if scenario_req.distance_limit not in grids:
+            grids[scenario_req.distance_limit] = await prepare_market_grid(
+                scenario_req, load_sources, lambda stage: None
+            )
+
+    # Clustering and analytics fan out over the process pool, each scenario works
+    # on its own copy of the grid as they add their territory column to it
+    results = await asyncio.gather(
+        *(
+            solve_territory_scenario(
+                grids[scenario_req.distance_limit][0].copy(),
+                grids[scenario_req.distance_limit][1].copy(),
+                grids[scenario_req.distance_limit][2],
+                scenario_req,
+                lambda stage: None,
+            )
+            for scenario_req in scenario_reqs
+        )
+    )
+
+    logger.info(f"Completed {len(results)} sales territory scenarios")
+    return {
+        "success": True,
+        "scenarios": results,
+        "comparison": [
+            scenario_comparison_row(i, scenario_req, result)
+            for i, (scenario_req, result) in enumerate(zip(scenario_reqs, results))
+        ],
+    }
 
 
 def generate_optimization_recommendations(territory_analytics, req):
@@ -1653,7 +2458,7 @@ def generate_optimization_recommendations(territory_analytics, req):
         )
 
     recommendations.append(
-        f"Optimal distance limit ({req.distance_limit}km) ensures good accessibility coverage"
+        f"Optimal distance limit ({req.distance_limit} {TRAVEL_COST_PROVIDERS[req.travel_cost].unit}) ensures good accessibility coverage"
     )
     recommendations.append(
         "Regular reassessment recommended as market conditions evolve"
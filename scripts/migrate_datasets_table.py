@@ -0,0 +1,56 @@
+"""
+Migrates the `schema_marketplace.datasets` table of existing deployments.
+Dataset reads and writes need the migrated table, so it runs on every deploy before
+the new app version starts serving, the Docker image runs it on start:
+
+    python scripts/migrate_datasets_table.py
+
+Every statement is idempotent, so running it again is harmless.
+"""
+import asyncio
+import os
+import sys
+# Add parent directory to path to import the app modules
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.abspath(os.path.join(current_script_dir, ".."))
+sys.path.append(parent_dir)
+import asyncpg
+from backend_common.database import Database
+from sql_object import SqlObject
+
+MIGRATIONS = [
+    # Read by load_dataset, so this has to run before the app is rolled out
+    SqlObject.add_datasets_projected_data_column,
+    # Used by the expired dataset sweeper, built without locking out writes.
+    # An interrupted build leaves an invalid index behind, drop it and rerun.
+    SqlObject.create_datasets_created_at_index,
+]
+
+
+async def migrate_datasets_table():
+    """
+    Runs the migrations one statement at a time, a fresh database without the
+    table is skipped since store_data_resp creates it up to date.
+    """
+    for statement in MIGRATIONS:
+        try:
+            await Database.execute(statement)
+        except (
+            asyncpg.exceptions.InvalidSchemaNameError,
+            asyncpg.exceptions.UndefinedTableError,
+        ):
+            print("schema_marketplace.datasets does not exist yet, nothing to migrate")
+            return
+    print("Migrated schema_marketplace.datasets")
+
+
+async def main():
+    await Database.create_pool()
+    try:
+        await migrate_datasets_table()
+    finally:
+        await Database.close_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -65,19 +65,36 @@ class SqlObject:
         filename TEXT PRIMARY KEY,
         request_data JSONB,
         response_data JSONB,
+        projected_data JSONB,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
+
+    CREATE INDEX IF NOT EXISTS datasets_created_at_idx
+    ON "schema_marketplace"."datasets" (created_at);
+    """
+
+    # Run by scripts/migrate_datasets_table.py, like the index below
+    add_datasets_projected_data_column: str = """
+    ALTER TABLE "schema_marketplace"."datasets"
+    ADD COLUMN IF NOT EXISTS projected_data JSONB;
+    """
+
+    # Run by scripts/migrate_datasets_table.py, CONCURRENTLY cannot run in a transaction
+    create_datasets_created_at_index: str = """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS datasets_created_at_idx
+    ON "schema_marketplace"."datasets" (created_at);
     """
 
     store_dataset: str = """
     INSERT INTO "schema_marketplace"."datasets" 
-    (filename, request_data, response_data, created_at)
-    VALUES ($1, $2, $3, $4)
+    (filename, request_data, response_data, created_at, projected_data)
+    VALUES ($1, $2, $3, $4, $5)
     ON CONFLICT (filename) 
     DO UPDATE SET 
         request_data = $2,
         response_data = $3,
-        created_at = $4;
+        created_at = $4,
+        projected_data = $5;
     """
 
     load_dataset: str = """
@@ -91,7 +108,68 @@ class SqlObject:
     WHERE filename = $1;
     """
 
+    load_fresh_dataset: str = """
+    SELECT COALESCE(projected_data, response_data) AS response_data,
+        projected_data IS NOT NULL AS projected, created_at
+    FROM "schema_marketplace"."datasets"
+    WHERE filename = $1 AND created_at >= $2;
+    """
+
+    load_fresh_datasets: str = """
+    SELECT filename, COALESCE(projected_data, response_data) AS response_data,
+        projected_data IS NOT NULL AS projected, created_at
+    FROM "schema_marketplace"."datasets"
+    WHERE filename = ANY($1::text[]) AND created_at >= $2;
+    """
+
     delete_dataset: str = """
     DELETE FROM "schema_marketplace"."datasets"
     WHERE filename = $1;
+    """
+
+    delete_expired_datasets: str = """
+    DELETE FROM "schema_marketplace"."datasets"
+    WHERE filename IN (
+        SELECT filename
+        FROM "schema_marketplace"."datasets"
+        WHERE created_at < $1
+        LIMIT $2
+        FOR UPDATE SKIP LOCKED
+    );
+    """
+
+    create_sales_man_jobs_table: str = """
+    CREATE SCHEMA IF NOT EXISTS "schema_marketplace";
+
+    CREATE TABLE IF NOT EXISTS "schema_marketplace"."sales_man_jobs" (
+        job_id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        job JSONB NOT NULL,
+        finished_at TIMESTAMPTZ
+    );
+    """
+
+    # A state is only written over an older one, stage updates may land out of order
+    save_sales_man_job: str = """
+    INSERT INTO "schema_marketplace"."sales_man_jobs"
+    (job_id, version, job, finished_at, user_id)
+    VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (job_id)
+    DO UPDATE SET
+        version = $2,
+        job = $3,
+        finished_at = $4
+    WHERE "sales_man_jobs".version < $2;
+    """
+
+    load_sales_man_job: str = """
+    SELECT job, user_id
+    FROM "schema_marketplace"."sales_man_jobs"
+    WHERE job_id = $1;
+    """
+
+    delete_finished_sales_man_jobs: str = """
+    DELETE FROM "schema_marketplace"."sales_man_jobs"
+    WHERE finished_at < $1;
     """
\ No newline at end of file
@@ -11,6 +11,7 @@ from backend_common.auth import load_user_profile
 from backend_common.database import Database
 import pandas as pd
 from sql_object import SqlObject
+from config_factory import CONF
 from all_types.request_dtypes import ReqFetchDataset, ReqIntelligenceData
 from all_types.response_dtypes import PopulationViewportData
 from backend_common.logging_wrapper import apply_decorator_to_module
@@ -18,6 +19,14 @@ from backend_common.auth import firebase_db
 import asyncpg
 from backend_common.background import get_background_tasks
 import orjson
+import asyncio
+import numpy as np
+from columnar_layers import (
+    LAYER_SOURCES,
+    ColumnarLayer,
+    calculate_polygon_area_km2,
+    open_layer,
+)
 from popularity_algo import get_plan
 import geopandas as gpd
 from shapely.geometry import box, Point
@@ -480,9 +489,47 @@ async def store_place_details(filename_id: str, place_details: dict):
             json.dumps(""),
             json.dumps(place_details),
             datetime.utcnow(),
+            None,
         )
 
 
+# Feature properties the frontend uses, the projected form of a dataset only keeps these
+PROJECTED_PROPERTIES = [
+    "displayName", "rating", "formattedAddress", "internationalPhoneNumber",
+    "types", "priceLevel", "primaryType", "userRatingCount", "location",
+    "name", "id"
+]
+
+
+def select_sub_properties(dataset: Dict) -> Dict:
+    """
+    Projects the features of a dataset down to `PROJECTED_PROPERTIES`. Datasets are
+    stored with their projection, see `store_data_resp`, and fetch_ggl_nearby
+    serves it for `include_only_sub_properties` requests
+    """
+    filtered_features = []
+
+    for feature in dataset.get("features", []):
+        # Create new filtered feature with proper GeoJSON structure
+        filtered_feature = {
+            "type": feature.get("type", "Feature"),
+            "geometry": feature.get("geometry"),  # Keep the geometry
+            "properties": {}  # Start with empty properties dict
+        }
+
+        # Only add the properties we want
+        feature_properties = feature.get("properties", {})
+        for field in PROJECTED_PROPERTIES:
+            if field in feature_properties:
+                filtered_feature["properties"][field] = feature_properties[field]
+
+        filtered_features.append(filtered_feature)
+
+    # Update the dataset with filtered features
+    dataset["features"] = filtered_features
+    return dataset
+
+
 async def store_data_resp(
     req: ReqFetchDataset, dataset: Dict, file_name: str
 ) -> str:
@@ -507,18 +554,24 @@ async def store_data_resp(
             # Convert request object to dictionary using Pydantic's model_dump
             req_dict = req.model_dump()
 
+            # The projected form is what load_dataset reads, the full one is kept
+            projected = select_sub_properties(dict(dataset))
             await Database.execute(
                 SqlObject.store_dataset,
                 file_name,
                 json.dumps(req_dict),
                 json.dumps(dataset),
                 datetime.utcnow(),
+                json.dumps(projected),
             )
 
             return file_name
 
-    except asyncpg.exceptions.UndefinedTableError:
-        # If table doesn't exist, create it and retry
+    except (
+        asyncpg.exceptions.UndefinedTableError,
+        asyncpg.exceptions.InvalidSchemaNameError,
+    ):
+        # If table or its schema doesn't exist, create them and retry
         await Database.execute(SqlObject.create_datasets_table)
         return await store_data_resp(req, dataset, file_name)
 
@@ -532,41 +585,115 @@ async def load_place_details(place_id: str) -> Optional[dict]:
     return json_content
 
 
-async def load_dataset(dataset_id: str, fetch_full_plan_datasets=False) -> Dict:
+def dataset_expiry_cutoff() -> datetime:
+    """Datasets created before this are expired, naive UTC like the created_at column"""
+    return datetime.utcnow() - timedelta(days=CONF.dataset_ttl_days)
+
+
+async def sweep_expired_datasets(batch_size: Optional[int] = None) -> int:
     """
-    Loads a dataset from file based on its ID.
+    Deletes the expired datasets in batches, each batch in its own short statement
+    so that readers and writers of other rows are not held up.
+
+    return:
+    ------
+    the number of deleted datasets
     """
+    batch_size = batch_size or CONF.dataset_sweep_batch_size
+    cutoff = dataset_expiry_cutoff()
+    deleted = 0
+    while True:
+        status_tag = await Database.execute(
+            SqlObject.delete_expired_datasets, cutoff, batch_size
+        )
+        batch_deleted = int(status_tag.split()[-1])
+        deleted += batch_deleted
+        if batch_deleted < batch_size:
+            break
+    logger.info(f"Swept {deleted} datasets created before {cutoff.isoformat()}")
+    return deleted
 
-    #TODO temporary soultion this shouldn't be needed if we were removing the properties from the dataset before saving
-    def select_sub_properties(dataset):
-        fields = [
-            "displayName", "rating", "formattedAddress", "internationalPhoneNumber",
-            "types", "priceLevel", "primaryType", "userRatingCount", "location",
-            "name", "id"
-        ]
-    
-        filtered_features = []
-    
-        for feature in dataset.get("features", []):
-            # Create new filtered feature with proper GeoJSON structure
-            filtered_feature = {
-                "type": feature.get("type", "Feature"),
-                "geometry": feature.get("geometry"),  # Keep the geometry
-                "properties": {}  # Start with empty properties dict
+
+async def run_dataset_sweeper():
+    """Sweeps expired datasets every `CONF.dataset_sweep_interval_seconds`, until cancelled"""
+    while True:
+        try:
+            await sweep_expired_datasets()
+        except Exception as e:
+            logger.error(f"Dataset sweep failed: {str(e)}")
+        await asyncio.sleep(CONF.dataset_sweep_interval_seconds)
+
+
+# Query columns that are not feature properties
+POINT_FEATURE_EXCLUDED_COLUMNS = ("latitude", "longitude", "city", "country")
+
+
+def point_features(
+    records: list, drop_na: bool = False, infer_dtypes: bool = True
+) -> Tuple[list[dict], list[str]]:
+    """
+    GeoJSON point features of query rows with `longitude` and `latitude` columns,
+    built a column at a time rather than a row at a time. The other columns, except
+    `POINT_FEATURE_EXCLUDED_COLUMNS`, are the properties of each feature.
+
+    args:
+    ----
+    `records` are the rows of `Database.fetch`
+    `drop_na` leaves missing values out of the properties
+    `infer_dtypes` converts the columns to pandas dtypes, like `pd.DataFrame` of the
+    rows, otherwise the values are kept as returned by the database
+
+    return:
+    ------
+    the features and the columns of the rows
+    """
+    if not records:
+        return [], []
+    columns = list(records[0].keys())
+    frame = pd.DataFrame(
+        [tuple(record.values()) for record in records],
+        columns=columns,
+        dtype=None if infer_dtypes else object,
+    )
+
+    coordinates = zip(
+        frame["longitude"].astype(float).tolist(),
+        frame["latitude"].astype(float).tolist(),
+    )
+    property_columns = [
+        column for column in columns if column not in POINT_FEATURE_EXCLUDED_COLUMNS
+    ]
+    values = zip(*(frame[column].tolist() for column in property_columns))
+    if not property_columns:
+        properties = ({} for _ in range(len(frame)))
+    elif drop_na:
+        missing = frame[property_columns].isna().to_numpy().tolist()
+        properties = (
+            {
+                column: value
+                for column, value, is_missing in zip(property_columns, row, row_missing)
+                if not is_missing
             }
-            
-            # Only add the properties we want
-            feature_properties = feature.get("properties", {})
-            for field in fields:
-                if field in feature_properties:
-                    filtered_feature["properties"][field] = feature_properties[field]
-            
-            filtered_features.append(filtered_feature)
-    
-        # Update the dataset with filtered features
-        dataset["features"] = filtered_features
-        return dataset
+            for row, row_missing in zip(values, missing)
+        )
+    else:
+        properties = (dict(zip(property_columns, row)) for row in values)
+
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [lng, lat]},
+            "properties": feature_properties,
+        }
+        for (lng, lat), feature_properties in zip(coordinates, properties)
+    ]
+    return features, columns
+
 
+async def load_dataset(dataset_id: str, fetch_full_plan_datasets=False) -> Dict:
+    """
+    Loads a dataset from file based on its ID.
+    """
 
     # if the dataset_id contains the word plan '21.57445341427591_39.1728_30000.0_mosque__plan_mosque_Saudi Arabia_Jeddah@#$9'
     # isolate the plan's name from the dataset_id = mosque__plan_mosque_Saudi Arabia_Jeddah
@@ -575,7 +702,8 @@ async def load_dataset(dataset_id: str, fetch_full_plan_datasets=False) -> Dict:
     # using the page number and the plan , load and concatenate all datasets from the plan that have page number equal to that number or less
     # each dataset is a list of dictionaries , so just extend the list  and save the big final list into dataset variable
     # else load dataset with dataset id
-    three_months_ago = datetime.now(timezone.utc) - timedelta(days=90)
+    # Expired datasets are left to sweep_expired_datasets, reads only skip them
+    expiry_cutoff = dataset_expiry_cutoff()
 
     if "plan" in dataset_id and fetch_full_plan_datasets:
         # Extract plan name and page number
@@ -613,28 +741,25 @@ async def load_dataset(dataset_id: str, fetch_full_plan_datasets=False) -> Dict:
         all_features = []
         feat_collec = {"type": "FeatureCollection", "features": []}
         properties_set = set()  # Initialize a set to store unique properties
-        for i in range(page_number):
-            dataset_id = new_plan[i]  # Get the formatted item for this page
-            json_content = await Database.fetchrow(
-                SqlObject.load_dataset_with_timestamp, dataset_id
-            )
-            if json_content:
-                created_at = json_content.get("created_at")
-                if created_at.tzinfo is None:
-                    created_at = created_at.replace(tzinfo=timezone.utc)
-                if created_at and created_at < three_months_ago:
-                    await Database.execute(SqlObject.delete_dataset, dataset_id)
-                    json_content = None
+        # All pages in one round trip, merged below in page order
+        page_ids = new_plan[:page_number]
+        rows = await Database.fetch(
+            SqlObject.load_fresh_datasets, page_ids, expiry_cutoff
+        )
+        pages = {row["filename"]: row for row in rows}
+        for dataset_id in page_ids:
+            json_content = pages.get(dataset_id)
             if json_content:
                 dataset = orjson.loads(json_content.get("response_data", "{}"))
+                if not json_content.get("projected"):
+                    # Stored before datasets were stored with their projection
+                    dataset = select_sub_properties(dataset)
                 all_features.extend(dataset.get("features", []))
                 properties_set.update(dataset.get("properties", []))
         if all_features:
             # Create the final combined GeoJSON
             feat_collec["features"] = all_features
             feat_collec["properties"] = list(properties_set)
-        #TODO temporary soultion this shouldn't be needed if we were removing the properties from the dataset before saving
-        feat_collec = select_sub_properties(feat_collec)
     
     elif "real_estate" in dataset_id:
         # Parse the real estate dataset ID to extract bounding box and type
@@ -667,54 +792,27 @@ async def load_dataset(dataset_id: str, fetch_full_plan_datasets=False) -> Dict:
             max_lat
         )
         
-        # Convert to DataFrame and then to GeoJSON format
-        city_df = pd.DataFrame([dict(record) for record in city_data])
-        
         # Convert to GeoJSON format
-        features = []
-        for _, row in city_df.iterrows():
-            # Parse coordinates
-            coordinates = [float(row["longitude"]), float(row["latitude"])]
-            
-            # Create properties dict excluding certain columns
-            columns_to_drop = ["latitude", "longitude", "city"]
-            if "country" in row:
-                columns_to_drop.append("country")
-            properties = row.drop(columns_to_drop).to_dict()
-            
-            feature = {
-                "type": "Feature",
-                "geometry": {"type": "Point", "coordinates": coordinates},
-                "properties": properties,
-            }
-            features.append(feature)
+        features, columns = point_features(city_data)
         
         # Create GeoJSON structure
         feat_collec = {
             "type": "FeatureCollection", 
             "features": features,
-            "properties": list(city_df.columns) if not city_df.empty else []
+            "properties": columns
         }
 
             
     else:
         feat_collec = None
         json_content = await Database.fetchrow(
-            SqlObject.load_dataset_with_timestamp, dataset_id
+            SqlObject.load_fresh_dataset, dataset_id, expiry_cutoff
         )
-        if json_content:
-            created_at = json_content.get("created_at")
-            if created_at.tzinfo is None:
-                created_at = created_at.replace(tzinfo=timezone.utc)
-            if created_at and created_at < three_months_ago:
-                await Database.execute(SqlObject.delete_dataset, dataset_id)
-                json_content = None
-
         if json_content:
             feat_collec = orjson.loads(json_content.get("response_data", "{}"))
 
-        #TODO temporary soultion this shouldn't be needed if we were removing the properties from the dataset before saving
-        if feat_collec:
+        # Stored before datasets were stored with their projection
+        if feat_collec and not json_content.get("projected"):
             feat_collec = select_sub_properties(feat_collec)
 
     return feat_collec
@@ -745,32 +843,8 @@ async def get_census_dataset_from_storage(
     city_data = await Database.fetch(
         query, *request_location._bounding_box, request_location.zoom_level
     )
-    city_df = pd.DataFrame([dict(record) for record in city_data], dtype=object)
-    # city_df = pd.DataFrame(city_data, dtype=object)
-
-    # Convert to GeoJSON format
-    features = []
-    for _, row in city_df.iterrows():
-        # Parse coordinates from Degree column
-        coordinates = [float(row["longitude"]), float(row["latitude"])]
-
-        # Create properties dict excluding certain columns
-        columns_to_drop = ["latitude", "longitude", "city"]
-        if "country" in row:
-            columns_to_drop.append("country")
-
-        row = row.dropna()
-        properties = row.drop(columns_to_drop).to_dict()
-
-        if len(row) == 0:
-            continue
-
-        feature = {
-            "type": "Feature",
-            "geometry": {"type": "Point", "coordinates": coordinates},
-            "properties": properties,
-        }
-        features.append(feature)
+    # Convert to GeoJSON format, census values are kept as returned
+    features, _ = point_features(city_data, drop_na=True, infer_dtypes=False)
 
     # Create GeoJSON structure similar to Google Maps API response
     geojson_data = {"type": "FeatureCollection", "features": features}
@@ -810,26 +884,9 @@ async def get_commercial_properties_dataset_from_storage(
         DEFAULT_LIMIT,
         offset,
     )
-    city_df = pd.DataFrame([dict(record) for record in city_data])
 
     # Convert to GeoJSON format
-    features = []
-    for _, row in city_df.iterrows():
-        # Parse coordinates from Degree column
-        coordinates = [float(row["longitude"]), float(row["latitude"])]
-
-        # Create properties dict excluding certain columns
-        columns_to_drop = ["latitude", "longitude", "city"]
-        if "country" in row:
-            columns_to_drop.append("country")
-        properties = row.drop(columns_to_drop).to_dict()
-
-        feature = {
-            "type": "Feature",
-            "geometry": {"type": "Point", "coordinates": coordinates},
-            "properties": properties,
-        }
-        features.append(feature)
+    features, _ = point_features(city_data)
 
     # Create GeoJSON structure similar to Google Maps API response
     geojson_data = {"type": "FeatureCollection", "features": features}
@@ -873,23 +930,8 @@ async def get_real_estate_dataset_from_storage(
         city_data = await Database.fetch(
             query, data_type, *req._bounding_box
         )
-    city_df = pd.DataFrame([dict(record) for record in city_data])
     # Convert to GeoJSON format
-    features = []
-    for _, row in city_df.iterrows():
-        # Parse coordinates from Degree column
-        coordinates = [float(row["longitude"]), float(row["latitude"])]
-        # Create properties dict excluding certain columns
-        columns_to_drop = ["latitude", "longitude", "city"]
-        if "country" in row:
-            columns_to_drop.append("country")
-        properties = row.drop(columns_to_drop).to_dict()
-        feature = {
-            "type": "Feature",
-            "geometry": {"type": "Point", "coordinates": coordinates},
-            "properties": properties,
-        }
-        features.append(feature)
+    features, _ = point_features(city_data)
    
     geojson_data = {"type": "FeatureCollection", "features": features}
     
@@ -947,128 +989,73 @@ def combine_income_and_population_data(population_data, income_data):
     return combined_data
 
 
-import math
+def _open_intelligence_layer(req: ReqIntelligenceData) -> Tuple[str, ColumnarLayer]:
+    """Columnar population or income layer of the request's zoom level"""
+    layer_type = "income" if req.income else "population"
+    layer = None
+    if req.population or req.income:
+        layer = open_layer(layer_type, req.zoom_level)
+    if layer is None:
+        file_path = LAYER_SOURCES[layer_type].format(zoom_level=req.zoom_level)
+        raise Exception(
+            f"could not find geojson data for zoom level {req.zoom_level}, in folder {file_path}"
+        )
+    return layer_type, layer
 
 
-def calculate_polygon_area_km2(coordinates):
+def income_density(layer: ColumnarLayer, rows: np.ndarray) -> list[float]:
     """
-    Calculate approximate area of polygon in square kilometers.
-    Uses simple lat/lng to approximate area (good enough for density calculations).
+    Income per km2 of the income features at `rows`, normalized to 0-100 over those rows
     """
-    if not coordinates or not coordinates[0]:
-        return 1  # Default to avoid division by zero
-
-    # Get the outer ring (first array in coordinates)
-    ring = coordinates[0]
-    if len(ring) < 3:
-        return 1
-
-    # Simple area calculation in square degrees, then convert to km2
-    area_sq_degrees = 0
-    n = len(ring) - 1  # Last point same as first, so exclude it
+    if "income" in layer.columns:
+        income = np.nan_to_num(layer.column("income", rows).astype(np.float64))
+    else:
+        income = np.zeros(len(rows))
+    area_km2 = layer.area_km2[rows]
+    raw_density = np.divide(
+        income, area_km2, out=np.zeros(len(rows)), where=area_km2 > 0
+    )
+    min_density = raw_density.min()
+    max_density = raw_density.max()
+    density_range = max_density - min_density if max_density > min_density else 1
+    normalized = ((raw_density - min_density) / density_range) * 100
+    return [round(float(value), 6) for value in normalized]
 
-    for i in range(n):
-        j = (i + 1) % n
-        area_sq_degrees += ring[i][0] * ring[j][1]
-        area_sq_degrees -= ring[j][0] * ring[i][1]
 
-    area_sq_degrees = abs(area_sq_degrees) / 2
+def _viewport_features(req: ReqIntelligenceData) -> Tuple[str, list[dict]]:
+    layer_type, layer = _open_intelligence_layer(req)
+    # Only the rows overlapping the viewport are read from the memory mapped layer
+    rows = layer.query_bbox(req.min_lng, req.min_lat, req.max_lng, req.max_lat)
+    features = layer.features(rows)
+    if layer_type == "income" and len(rows):
+        for feature, density in zip(features, income_density(layer, rows)):
+            feature["properties"]["density"] = density
+    return layer_type, features
 
-    # Rough conversion from square degrees to square kilometers
-    lat_avg = sum(point[1] for point in ring[:n]) / n
-    km_per_degree_lat = 111.0
-    km_per_degree_lng = 111.0 * math.cos(math.radians(lat_avg))
-    area_km2 = area_sq_degrees * km_per_degree_lat * km_per_degree_lng
 
-    return max(area_km2, 0.01)  # Minimum area to avoid division by zero
+def load_intelligence_frame(req: ReqIntelligenceData) -> gpd.GeoDataFrame:
+    """
+    The features of `fetch_intelligence_by_viewport` as a GeoDataFrame, built straight
+    from the columnar layer without going through GeoJSON dicts
+    """
+    layer_type, layer = _open_intelligence_layer(req)
+    rows = layer.query_bbox(req.min_lng, req.min_lat, req.max_lng, req.max_lat)
+    gdf = layer.to_geodataframe(rows)
+    if layer_type == "income" and len(rows):
+        gdf["density"] = income_density(layer, rows)
+    return gdf
 
 
 async def fetch_intelligence_by_viewport(req: ReqIntelligenceData) -> Dict:
     """
     Fetches population data from local GeoJSON files based on viewport and zoom level.
+    The layers are read from their columnar copy (see columnar_layers.py), converted from
+    the GeoJSON files on deploy and again when they change, and the viewport is looked up
+    in the spatial index of the open layer.
     """
     # TODO first check if the user has purchased intelligence
 
-    if req.population and not req.income:
-        file_path = f"Backend/population_json_files/v{req.zoom_level}/all_features.geojson"
-        intelligence_geojson_data = await use_json(file_path, "r")
-        layer_type = "population"
-        if not intelligence_geojson_data:
-            raise Exception(
-                f"could not find geojson data for zoom level {req.zoom_level}, in folder {file_path}"
-            )
-
-    # if income is also true load income
-    if req.income:
-        file_path = f"Backend/area_income_geojson/v{req.zoom_level}/all_features.geojson"
-        intelligence_geojson_data = await use_json(file_path, "r")
-        layer_type = "income"
-
-    if not intelligence_geojson_data:
-        raise Exception(
-            f"could not find geojson data for zoom level {req.zoom_level}, in folder {file_path}"
-        )
-
-    # Load only the required portion from the GeoJSON
-    filtered_features = []
-    
-    # Only collect density values for income normalization
-    density_values = [] if req.income else None
-
-    for feature in intelligence_geojson_data.get("features", []):
-        # For polygon features, do a basic bounds check (faster than full intersection)
-        geom_type = feature.get("geometry", {}).get("type")
-        coords = feature.get("geometry", {}).get("coordinates", [])
-
-        # Simple bounding box check (this is much faster than full geometric operations)
-        if geom_type == "Polygon":
-            # Extract the bounds of the polygon (min/max lng/lat)
-            flat_coords = [point for ring in coords for point in ring]
-            lngs = [p[0] for p in flat_coords]
-            lats = [p[1] for p in flat_coords]
-
-            # Check if polygon bbox overlaps viewport
-            poly_min_lng = min(lngs)
-            poly_max_lng = max(lngs)
-            poly_min_lat = min(lats)
-            poly_max_lat = max(lats)
-
-            # If polygon bounding box overlaps viewport, include it
-            if (
-                poly_min_lng <= req.max_lng
-                and poly_max_lng >= req.min_lng
-                and poly_min_lat <= req.max_lat
-                and poly_max_lat >= req.min_lat
-            ):
-
-                properties = feature.get("properties", {})
-
-                if layer_type == "population":
-                    # Density is already pre-calculated in the JSON files
-                    filtered_features.append(feature)
-                    
-                elif layer_type == "income":
-                    # For income, calculate and collect for normalization
-                    income = properties.get("income", 0)  # Update field name as needed
-                    area_km2 = calculate_polygon_area_km2(coords)  # Keep this function for income
-                    raw_density = income / area_km2 if area_km2 > 0 else 0
-                    density_values.append(raw_density)
-                    filtered_features.append((feature, raw_density))
-
-    # Only normalize for income
-    if req.income and density_values:
-        min_density = min(density_values)
-        max_density = max(density_values)
-        density_range = max_density - min_density if max_density > min_density else 1
-        
-        # Process income features with normalization
-        processed_features = []
-        for feature, raw_density in filtered_features:
-            normalized_density = ((raw_density - min_density) / density_range) * 100
-            feature["properties"]["density"] = round(normalized_density, 6)
-            processed_features.append(feature)
-        
-        filtered_features = processed_features
+    layer_type, filtered_features = await asyncio.to_thread(_viewport_features, req)
 
     # Extract properties from first feature if available
     properties = []
@@ -0,0 +1,178 @@
+import logging
+import math
+from dataclasses import dataclass
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+
+logger = logging.getLogger(__name__)
+
+# Census blocks and places of the benchmark scales
+CITY_SCALES = {
+    "small": {"n_blocks": 2_000, "n_places": 300, "extent_km": 15.0},
+    "medium": {"n_blocks": 20_000, "n_places": 2_000, "extent_km": 30.0},
+    "large": {"n_blocks": 100_000, "n_places": 10_000, "extent_km": 60.0},
+}
+
+KM_PER_DEGREE = 111.0
+
+
+@dataclass
+class SyntheticCity:
+    """
+    Offline stand-in for the data sources of a territory run, in the shapes they are
+    returned in: the city entry of `fetch_country_city_data`, the frames of
+    `get_population_and_income` and the places of `fetch_dataset`
+    """
+
+    country_name: str
+    city_name: str
+    bounding_box: list[list[float]]
+    population: gpd.GeoDataFrame
+    income: gpd.GeoDataFrame
+    places: dict
+
+    @property
+    def country_city_data(self) -> dict:
+        return {
+            self.country_name: [
+                {"name": self.city_name, "bounding_box": self.bounding_box}
+            ]
+        }
+
+
+def _hotspot_points(
+    rng: np.random.Generator,
+    n_points: int,
+    hotspots: np.ndarray,
+    spread: np.ndarray,
+    uniform_share: float,
+    bounds: tuple[float, float, float, float],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Points around the hotspots plus a uniform background, clipped to the bounds"""
+    min_lng, min_lat, max_lng, max_lat = bounds
+    n_uniform = int(n_points * uniform_share)
+    n_clustered = n_points - n_uniform
+    picked = rng.integers(0, len(hotspots), n_clustered)
+    lngs = np.concatenate(
+        [
+            rng.normal(hotspots[picked, 0], spread[picked]),
+            rng.uniform(min_lng, max_lng, n_uniform),
+        ]
+    )
+    lats = np.concatenate(
+        [
+            rng.normal(hotspots[picked, 1], spread[picked]),
+            rng.uniform(min_lat, max_lat, n_uniform),
+        ]
+    )
+    return np.clip(lngs, min_lng, max_lng), np.clip(lats, min_lat, max_lat)
+
+
+def generate_synthetic_city(
+    n_blocks: int = 2_000,
+    n_places: int = 300,
+    extent_km: float = 15.0,
+    seed: int = 0,
+    center: tuple[float, float] = (46.70, 24.70),
+    block_size_km: float = 0.05,
+    missing_income_share: float = 0.05,
+    country_name: str = "Saudi Arabia",
+    city_name: str = "Synthetic City",
+) -> SyntheticCity:
+    """
+    Deterministic synthetic city: census blocks concentrated around a few population
+    hotspots, income per block and places that mostly follow the population.
+
+    args:
+    ----
+    `n_blocks` is the number of census blocks (population polygons)
+    `n_places` is the number of places, some fall outside the bounding box like real data
+    `extent_km` is the side of the square bounding box around `center` (lng, lat)
+    `seed` makes the city reproducible, the same arguments give the same city
+    `block_size_km` is the side of a census block
+    `missing_income_share` of the blocks have a NaN income
+
+    return:
+    ------
+    the `SyntheticCity`
+    """
+    rng = np.random.default_rng(seed)
+    center_lng, center_lat = center
+    half_lat = extent_km / 2 / KM_PER_DEGREE
+    half_lng = half_lat / math.cos(math.radians(center_lat))
+    bounds = (
+        center_lng - half_lng,
+        center_lat - half_lat,
+        center_lng + half_lng,
+        center_lat + half_lat,
+    )
+    min_lng, min_lat, max_lng, max_lat = bounds
+
+    # One hotspot per ~1000 blocks, the first one is the city center
+    n_hotspots = max(1, n_blocks // 1_000)
+    hotspots = np.column_stack(
+        [
+            rng.uniform(min_lng + half_lng / 4, max_lng - half_lng / 4, n_hotspots),
+            rng.uniform(min_lat + half_lat / 4, max_lat - half_lat / 4, n_hotspots),
+        ]
+    )
+    hotspots[0] = center
+    spread = rng.uniform(0.05, 0.2, n_hotspots) * half_lat
+
+    block_size = block_size_km / KM_PER_DEGREE
+    block_lngs, block_lats = _hotspot_points(
+        rng, n_blocks, hotspots, spread, 0.3, bounds
+    )
+    blocks = shapely.box(
+        block_lngs, block_lats, block_lngs + block_size, block_lats + block_size
+    )
+    population = gpd.GeoDataFrame(
+        {"Population_Count": rng.integers(50, 5_000, n_blocks)}, geometry=blocks
+    )
+
+    # Richer near the center, log-normal spread
+    distance = np.hypot(block_lngs - center_lng, block_lats - center_lat) / half_lng
+    income = rng.lognormal(np.log(12_000), 0.4, n_blocks) * (1.5 - 0.5 * distance)
+    income[rng.random(n_blocks) < missing_income_share] = np.nan
+    income = gpd.GeoDataFrame({"income": income}, geometry=blocks)
+
+    # Places are shifted in their own generator so that the blocks do not depend on them
+    place_rng = np.random.default_rng([seed, 1])
+    place_lngs, place_lats = _hotspot_points(
+        place_rng,
+        n_places,
+        hotspots,
+        spread,
+        0.2,
+        (min_lng - half_lng / 10, min_lat - half_lat / 10, max_lng, max_lat),
+    )
+    places = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lng, lat]},
+                "properties": {"id": f"place-{k}"},
+            }
+            for k, (lng, lat) in enumerate(
+                zip(place_lngs.tolist(), place_lats.tolist())
+            )
+        ],
+    }
+
+    return SyntheticCity(
+        country_name=country_name,
+        city_name=city_name,
+        bounding_box=[
+            [min_lng, min_lat],
+            [max_lng, min_lat],
+            [max_lng, max_lat],
+            [min_lng, max_lat],
+        ],
+        population=population,
+        income=income,
+        places=places,
+    )
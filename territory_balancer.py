@@ -0,0 +1,518 @@
+import heapq
+import logging
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_adjacency(
+    cells: gpd.GeoDataFrame, contiguity: str = "queen"
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the rook/queen adjacency graph of a regular square or hexagonal grid.
+
+    args:
+    ----
+    `cells` are the grid cells (polygons of equal size) from `get_grids_of_data`
+    `contiguity` is "rook" (shared edge) or "queen" (shared edge or corner), hexagons
+    always have their six edge neighbours
+
+    return:
+    ------
+    The adjacency in CSR form as `(indptr, indices)`, the neighbours of cell `i` are
+    `indices[indptr[i]:indptr[i + 1]]`
+    """
+    if contiguity not in ("rook", "queen"):
+        raise ValueError(f"Unknown contiguity: {contiguity}")
+
+    geometries = cells.geometry.values
+    n_cells = len(geometries)
+    if n_cells == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    bounds = shapely.bounds(geometries)
+    if np.all(shapely.get_num_coordinates(geometries) == 7):
+        # Hexagonal cells share an edge with each of their six neighbours and never
+        # touch at a corner only, so rook and queen coincide. A small tolerance absorbs
+        # floating point slivers between cells
+        tolerance = 0.01 * np.median(bounds[:, 3] - bounds[:, 1])
+        tree = shapely.STRtree(geometries)
+        src, dst = tree.query(geometries, predicate="dwithin", distance=tolerance)
+    else:
+        # Neighbouring cells of a regular grid sit exactly one cell width apart (rook)
+        # or one diagonal apart (queen). Matching centroids by distance is robust to the
+        # floating point slivers between boxes that make touches() unreliable
+        cell_width = np.median(bounds[:, 2] - bounds[:, 0])
+        reach = cell_width * (1.0 if contiguity == "rook" else np.sqrt(2)) * 1.01
+
+        centroids = shapely.centroid(geometries)
+        tree = shapely.STRtree(centroids)
+        src, dst = tree.query(centroids, predicate="dwithin", distance=reach)
+    keep = src != dst
+    src, dst = src[keep], dst[keep]
+
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n_cells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_cells), out=indptr[1:])
+
+    return indptr, dst[order].astype(np.int64)
+
+
+def _planar_coordinates(cells: gpd.GeoDataFrame) -> np.ndarray:
+    """Centroids in an equirectangular km projection, good enough for city extents"""
+    centroids = shapely.centroid(cells.geometry.values)
+    lng, lat = shapely.get_x(centroids), shapely.get_y(centroids)
+    lat0 = np.radians(np.mean(lat)) if len(lat) else 0.0
+    return np.column_stack([lng * 111.32 * np.cos(lat0), lat * 110.57])
+
+
+def _check_cell_count(n_cells: int, num_sales_man: int):
+    """Every territory needs a cell of its own, raises ValueError otherwise"""
+    if n_cells < num_sales_man:
+        raise ValueError(
+            f"Cannot create {num_sales_man} territories from {n_cells} grid cells "
+            f"with market potential, lower the number of salesmen"
+        )
+
+
+def _select_seeds(
+    xy: np.ndarray, shares: np.ndarray, num_sales_man: int
+) -> np.ndarray:
+    """
+    Farthest-point seeding: start from the busiest cell and repeatedly add the cell that
+    is farthest from all chosen seeds, so territories start spread over the city.
+    Seeds are distinct cells, even where cells share their centroid.
+    """
+    _check_cell_count(len(xy), num_sales_man)
+    seeds = [int(np.argmax(shares))]
+    min_dist = np.hypot(*(xy - xy[seeds[0]]).T)
+    min_dist[seeds[0]] = -np.inf
+    for _ in range(1, num_sales_man):
+        candidate = int(np.argmax(min_dist))
+        seeds.append(candidate)
+        min_dist = np.minimum(min_dist, np.hypot(*(xy - xy[candidate]).T))
+        # Chosen cells are never picked again, even once every distance left is 0
+        min_dist[seeds] = -np.inf
+    return np.array(seeds, dtype=np.int64)
+
+
+def _grow_regions(
+    seeds: np.ndarray,
+    xy: np.ndarray,
+    shares: np.ndarray,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+) -> np.ndarray:
+    """
+    Capacitated region growing: the currently lightest region always claims its closest
+    unassigned neighbouring cell, so every region stays contiguous and loads stay even
+    """
+    n_cells = len(shares)
+    labels = np.full(n_cells, -1, dtype=np.int64)
+    loads = np.zeros(len(seeds))
+    frontiers = [[] for _ in seeds]
+
+    def push_neighbours(region: int, cell: int):
+        seed_xy = xy[seeds[region]]
+        for nbr in indices[indptr[cell] : indptr[cell + 1]]:
+            if labels[nbr] == -1:
+                dist = np.hypot(*(xy[nbr] - seed_xy))
+                heapq.heappush(frontiers[region], (dist, int(nbr)))
+
+    for region, seed in enumerate(seeds):
+        labels[seed] = region
+        loads[region] = shares[seed]
+    for region, seed in enumerate(seeds):
+        push_neighbours(region, seed)
+
+    active = [(loads[region], region) for region in range(len(seeds))]
+    heapq.heapify(active)
+    while active:
+        _, region = heapq.heappop(active)
+        frontier = frontiers[region]
+        while frontier and labels[frontier[0][1]] != -1:
+            heapq.heappop(frontier)
+        if not frontier:
+            # Region is enclosed by other regions, it cannot grow any further
+            continue
+        _, cell = heapq.heappop(frontier)
+        labels[cell] = region
+        loads[region] += shares[cell]
+        push_neighbours(region, cell)
+        heapq.heappush(active, (loads[region], region))
+
+    # Grid islands without a seed go to the region with the nearest seed
+    unassigned = np.flatnonzero(labels == -1)
+    if len(unassigned):
+        seed_dist = np.hypot(
+            xy[unassigned, None, 0] - xy[None, seeds, 0],
+            xy[unassigned, None, 1] - xy[None, seeds, 1],
+        )
+        labels[unassigned] = np.argmin(seed_dist, axis=1)
+        logger.info(
+            f"Assigned {len(unassigned)} disconnected cells to the nearest territory"
+        )
+
+    return labels
+
+
+def _stays_connected(
+    cell: int,
+    region: int,
+    labels: np.ndarray,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+) -> bool:
+    """
+    Checks that removing `cell` does not split `region`. That holds exactly when all
+    region neighbours of the cell still reach each other without passing through it
+    """
+    region_nbrs = {
+        int(nbr)
+        for nbr in indices[indptr[cell] : indptr[cell + 1]]
+        if labels[nbr] == region
+    }
+    if len(region_nbrs) <= 1:
+        return True
+
+    start = region_nbrs.pop()
+    seen = {cell, start}
+    stack = [start]
+    while stack and region_nbrs:
+        current = stack.pop()
+        for nbr in indices[indptr[current] : indptr[current + 1]]:
+            nbr = int(nbr)
+            if nbr not in seen and labels[nbr] == region:
+                seen.add(nbr)
+                region_nbrs.discard(nbr)
+                stack.append(nbr)
+    return not region_nbrs
+
+
+def _swap_boundary_cells(
+    labels: np.ndarray,
+    shares: np.ndarray,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+    num_regions: int,
+    deadline: float,
+    affected: Optional[np.ndarray] = None,
+) -> int:
+    """
+    Iterative boundary swaps: moves a boundary cell from a heavier region to a lighter
+    neighbouring region whenever that lowers the squared load imbalance and keeps the
+    donor region connected. Stops when a full pass makes no move or at the deadline.
+    With a boolean `affected` mask over the regions, only moves from or to an affected
+    region are made.
+    """
+    loads = np.bincount(labels, weights=shares, minlength=num_regions)
+    sizes = np.bincount(labels, minlength=num_regions)
+    moves = 0
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+
+        # Candidate moves along every region boundary, best gain first
+        src = np.repeat(np.arange(len(labels)), np.diff(indptr))
+        boundary = labels[src] != labels[indices]
+        cand_cells, cand_targets = src[boundary], labels[indices[boundary]]
+        gap = loads[labels[cand_cells]] - loads[cand_targets]
+        cand_shares = shares[cand_cells]
+        gain = cand_shares * (gap - cand_shares)
+        worthwhile = (cand_shares > 0) & (gain > 0)
+        if affected is not None:
+            worthwhile &= affected[labels[cand_cells]] | affected[cand_targets]
+        order = np.argsort(-gain[worthwhile], kind="stable")
+        cand_cells = cand_cells[worthwhile][order]
+        cand_targets = cand_targets[worthwhile][order]
+
+        for cell, target in zip(cand_cells, cand_targets):
+            if time.perf_counter() >= deadline:
+                break
+            source = labels[cell]
+            share = shares[cell]
+            # Loads change as moves are applied, re-check the gain on current loads
+            if source == target or sizes[source] <= 1:
+                continue
+            if not 0 < share < loads[source] - loads[target]:
+                continue
+            # An earlier move of this pass may have taken the cell's target neighbour
+            if not np.any(labels[indices[indptr[cell] : indptr[cell + 1]]] == target):
+                continue
+            if not _stays_connected(cell, source, labels, indptr, indices):
+                continue
+
+            labels[cell] = target
+            loads[source] -= share
+            loads[target] += share
+            sizes[source] -= 1
+            sizes[target] += 1
+            moves += 1
+            improved = True
+
+    return moves
+
+
+def assign_balanced_territories(
+    cells: gpd.GeoDataFrame,
+    shares: np.ndarray,
+    num_sales_man: int,
+    contiguity: str = "queen",
+    time_budget: float = 1.0,
+) -> np.ndarray:
+    """
+    Contiguity-aware balanced territory solver, alternative to the greedy engine.
+
+    args:
+    ----
+    `cells` are the grid cells with market potential (`masked_grided_data`)
+    `shares` is the indicator value (potential customers) of each grid cell
+    `num_sales_man` is the number of territories to create, at most the number of cells
+    `contiguity` is the adjacency rule of the grid graph, "rook" or "queen"
+    `time_budget` is the wall-clock budget in seconds for the boundary swap phase
+
+    return:
+    ------
+    an integer label array with the territory index of each grid cell. Every cell is
+    assigned and territories are contiguous on the grid graph wherever the grid allows
+    """
+    start = time.perf_counter()
+    shares = np.asarray(shares, dtype=float)
+    if len(shares) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    indptr, indices = build_adjacency(cells, contiguity)
+    xy = _planar_coordinates(cells)
+
+    seeds = _select_seeds(xy, shares, num_sales_man)
+    labels = _grow_regions(seeds, xy, shares, indptr, indices)
+    grown_loads = np.bincount(labels, weights=shares, minlength=len(seeds))
+
+    moves = _swap_boundary_cells(
+        labels, shares, indptr, indices, len(seeds), start + time_budget
+    )
+    loads = np.bincount(labels, weights=shares, minlength=len(seeds))
+
+    logger.info(
+        f"Balanced solver: {len(seeds)} territories over {len(shares)} cells, "
+        f"{moves} boundary swaps in {time.perf_counter() - start:.3f}s"
+    )
+    logger.info(
+        f"  Load coefficient of variation: {np.std(grown_loads) / np.mean(grown_loads):.3f} "
+        f"after growing, {np.std(loads) / np.mean(loads):.3f} after swaps"
+    )
+
+    return labels
+
+
+def match_previous_labels(
+    cells: gpd.GeoDataFrame,
+    previous_centroids: np.ndarray,
+    previous_labels: np.ndarray,
+) -> np.ndarray:
+    """
+    Carries the territory labels of a previous run over to the cells of the current grid.
+
+    args:
+    ----
+    `cells` are the current grid cells
+    `previous_centroids` are the (longitude, latitude) centroids of the previous cells
+    `previous_labels` are the territory labels of the previous cells
+
+    return:
+    ------
+    the previous label of each current cell, -1 for cells that were not in the previous
+    grid (no previous centroid within half a cell of its own)
+    """
+    labels = np.full(len(cells), -1, dtype=np.int64)
+    if len(cells) == 0 or len(previous_centroids) == 0:
+        return labels
+
+    geometries = cells.geometry.values
+    bounds = shapely.bounds(geometries)
+    tolerance = 0.5 * np.median(
+        np.minimum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])
+    )
+    tree = shapely.STRtree(shapely.points(previous_centroids))
+    current, previous = tree.query_nearest(
+        shapely.centroid(geometries), max_distance=tolerance, all_matches=False
+    )
+    labels[current] = np.asarray(previous_labels)[previous]
+    return labels
+
+
+def _subgraph(
+    indptr: np.ndarray, indices: np.ndarray, members: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Adjacency restricted to the sorted `members`, in their local numbering"""
+    local = np.full(len(indptr) - 1, -1, dtype=np.int64)
+    local[members] = np.arange(len(members))
+    src = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    keep = (local[src] >= 0) & (local[indices] >= 0)
+    sub_indptr = np.zeros(len(members) + 1, dtype=np.int64)
+    np.cumsum(
+        np.bincount(local[src[keep]], minlength=len(members)), out=sub_indptr[1:]
+    )
+    return sub_indptr, local[indices[keep]]
+
+
+def _fill_unassigned(
+    labels: np.ndarray, xy: np.ndarray, indptr: np.ndarray, indices: np.ndarray
+):
+    """
+    Assigns unlabelled cells to the territory that reaches them first over the grid graph,
+    cells out of reach go to the territory of the nearest labelled cell
+    """
+    queue = deque(np.flatnonzero(labels >= 0).tolist())
+    while queue:
+        cell = queue.popleft()
+        for nbr in indices[indptr[cell] : indptr[cell + 1]]:
+            if labels[nbr] == -1:
+                labels[nbr] = labels[cell]
+                queue.append(int(nbr))
+
+    unassigned = np.flatnonzero(labels == -1)
+    if len(unassigned):
+        labelled = np.flatnonzero(labels >= 0)
+        dist = np.hypot(
+            xy[unassigned, None, 0] - xy[None, labelled, 0],
+            xy[unassigned, None, 1] - xy[None, labelled, 1],
+        )
+        labels[unassigned] = labels[labelled[np.argmin(dist, axis=1)]]
+
+
+def _split_region(
+    labels: np.ndarray,
+    region: int,
+    new_region: int,
+    xy: np.ndarray,
+    shares: np.ndarray,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+):
+    """Splits a region in two balanced contiguous halves by growing from two far seeds"""
+    members = np.flatnonzero(labels == region)
+    sub_indptr, sub_indices = _subgraph(indptr, indices, members)
+    seeds = _select_seeds(xy[members], shares[members], 2)
+    halves = _grow_regions(seeds, xy[members], shares[members], sub_indptr, sub_indices)
+    labels[members[halves == 1]] = new_region
+
+
+def _dissolve_region(
+    labels: np.ndarray,
+    region: int,
+    xy: np.ndarray,
+    indptr: np.ndarray,
+    indices: np.ndarray,
+):
+    """Hands the cells of a region out to the neighbouring regions that reach them first"""
+    labels[labels == region] = -1
+    _fill_unassigned(labels, xy, indptr, indices)
+
+
+def repair_territories(
+    cells: gpd.GeoDataFrame,
+    shares: np.ndarray,
+    previous_labels: np.ndarray,
+    num_sales_man: int,
+    contiguity: str = "queen",
+    time_budget: float = 1.0,
+) -> np.ndarray:
+    """
+    Incremental alternative to `assign_balanced_territories`: repairs a previous assignment
+    after small changes of the grid or of the number of salesmen, keeping the territories
+    that are not affected as they were.
+
+    args:
+    ----
+    `cells` are the grid cells with market potential (`masked_grided_data`)
+    `shares` is the indicator value (potential customers) of each grid cell
+    `previous_labels` is the previous territory of each cell (`match_previous_labels`),
+    -1 for new cells
+    `num_sales_man` is the number of territories to create, at most the number of cells
+    `contiguity` is the adjacency rule of the grid graph, "rook" or "queen"
+    `time_budget` is the wall-clock budget in seconds for the boundary swap phase
+
+    return:
+    ------
+    an integer label array with the territory index of each grid cell. Territories that
+    survive keep their index
+    """
+    start = time.perf_counter()
+    shares = np.asarray(shares, dtype=float)
+    labels = np.array(previous_labels, dtype=np.int64)
+    if len(shares) == 0:
+        return np.zeros(0, dtype=np.int64)
+    _check_cell_count(len(shares), num_sales_man)
+    if not np.any(labels >= 0):
+        logger.info("No cell of the previous assignment remains, solving from scratch")
+        return assign_balanced_territories(
+            cells, shares, num_sales_man, contiguity, time_budget
+        )
+
+    indptr, indices = build_adjacency(cells, contiguity)
+    xy = _planar_coordinates(cells)
+
+    # New cells join the territory next to them
+    new_cells = labels == -1
+    _fill_unassigned(labels, xy, indptr, indices)
+
+    # Split the heaviest territories for added salesmen, dissolve the lightest ones into
+    # their neighbours for removed salesmen. Every other territory is left untouched
+    n_regions = max(int(labels.max()) + 1, num_sales_man)
+    affected = np.zeros(n_regions, dtype=bool)
+    affected[labels[new_cells]] = True
+    loads = np.bincount(labels, weights=shares, minlength=n_regions)
+    sizes = np.bincount(labels, minlength=n_regions)
+    splits = dissolved = 0
+    while np.count_nonzero(sizes) < num_sales_man:
+        region = int(np.argmax(np.where(sizes > 1, loads, -np.inf)))
+        new_region = int(np.flatnonzero(sizes == 0)[0])
+        _split_region(labels, region, new_region, xy, shares, indptr, indices)
+        affected[[region, new_region]] = True
+        loads = np.bincount(labels, weights=shares, minlength=n_regions)
+        sizes = np.bincount(labels, minlength=n_regions)
+        splits += 1
+    while np.count_nonzero(sizes) > num_sales_man:
+        region = int(np.argmin(np.where(sizes > 0, loads, np.inf)))
+        members = labels == region
+        _dissolve_region(labels, region, xy, indptr, indices)
+        affected[np.unique(labels[members])] = True
+        loads = np.bincount(labels, weights=shares, minlength=n_regions)
+        sizes = np.bincount(labels, minlength=n_regions)
+        dissolved += 1
+
+    # Surviving territories beyond the salesman count take the freed indices
+    freed = iter(np.flatnonzero(sizes[:num_sales_man] == 0))
+    for region in np.flatnonzero(sizes[num_sales_man:]) + num_sales_man:
+        target = next(freed)
+        labels[labels == region] = target
+        affected[target] = affected[region]
+
+    # Local rebalancing along the boundaries of the split, merged or grown territories
+    moves = _swap_boundary_cells(
+        labels,
+        shares,
+        indptr,
+        indices,
+        num_sales_man,
+        start + time_budget,
+        affected=affected[:num_sales_man],
+    )
+    changed = int(np.sum(labels != np.asarray(previous_labels)))
+
+    logger.info(
+        f"Territory repair: {int(new_cells.sum())} new cells, {splits} splits, {dissolved} dissolved, "
+        f"{moves} boundary swaps, {changed}/{len(labels)} cells changed territory "
+        f"in {time.perf_counter() - start:.3f}s"
+    )
+
+    return labels
@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import inspect
+import logging
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Iterator, Optional
+from unittest.mock import patch
+
+from fastapi import BackgroundTasks
+
+import sales_man_problem
+from all_types.request_dtypes import ReqClustersForSalesManData
+from backend_common.background import set_background_tasks
+from config_factory import CONF
+from intermediate_cache import IntermediateCache
+from synthetic_city import CITY_SCALES, SyntheticCity, generate_synthetic_city
+
+
+logger = logging.getLogger(__name__)
+
+# Benchmarked stages of the territory pipeline, in order. "grid" excludes the
+# accessibility and market stages that run inside it
+BENCHMARK_STAGES = (
+    "load",
+    "grid",
+    "accessibility",
+    "market",
+    "clustering",
+    "analytics",
+    "plots",
+)
+
+
+class StageProfiler:
+    """
+    Wall time and peak traced memory of named, possibly nested, stages. The time of a
+    stage excludes its nested stages, its peak memory includes them and is measured
+    above the memory in use when the stage started.
+    """
+
+    def __init__(self, track_memory: bool = True):
+        self.track_memory = track_memory
+        self.stages: dict[str, dict] = {}
+        # name, start, nested seconds, memory at start, peak
+        self._stack: list[list] = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.track_memory and self._stack:
+            # The parent's peak so far, before the peak is reset for this stage
+            self._stack[-1][4] = max(self._stack[-1][4], tracemalloc.get_traced_memory()[1])
+        if self.track_memory:
+            tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0] if self.track_memory else 0
+        frame = [name, time.perf_counter(), 0.0, current, current]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame[1]
+            self._stack.pop()
+            if self.track_memory:
+                frame[4] = max(frame[4], tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+            stats = self.stages.setdefault(
+                name, {"seconds": 0.0, "calls": 0, "peak_bytes": 0}
+            )
+            stats["seconds"] += elapsed - frame[2]
+            stats["calls"] += 1
+            stats["peak_bytes"] = max(stats["peak_bytes"], frame[4] - frame[3])
+            if self._stack:
+                parent = self._stack[-1]
+                parent[2] += elapsed
+                parent[4] = max(parent[4], frame[4])
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """`func`, sync or async, timed as the stage `name`"""
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                with self.stage(name):
+                    return await func(*args, **kwargs)
+
+            return timed_async
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+
+        return timed
+
+    def report(self) -> dict:
+        """Stats of each stage, in `BENCHMARK_STAGES` order, then any other stage"""
+        order = {name: i for i, name in enumerate(BENCHMARK_STAGES)}
+        return {
+            name: dict(self.stages[name])
+            for name in sorted(self.stages, key=lambda n: order.get(n, len(order)))
+        }
+
+
+@contextlib.contextmanager
+def offline_territory_pipeline(
+    city: SyntheticCity, work_dir: str, profiler: Optional[StageProfiler] = None
+) -> Iterator[None]:
+    """
+    Runs `get_clusters_for_sales_man` on a synthetic city without Postgres, Firestore or
+    basemap tiles: the data sources return the city, the territory cache starts empty
+    under `work_dir` and the plots are saved there. CPU-bound stages run inline so
+    that `profiler`, when given, times each stage of `BENCHMARK_STAGES`.
+    """
+
+    async def fake_country_city_data():
+        return city.country_city_data
+
+    async def fake_population_and_income(bounding_box, zoom_level):
+        return city.population.copy(), city.income.copy()
+
+    async def fake_fetch_dataset(req):
+        return {"full_load_geojson": city.places}
+
+    plot_results = functools.partial(
+        sales_man_problem.plot_results, static_dir=f"{work_dir}/plots"
+    )
+    patches = [
+        patch.object(CONF, "cpu_pool_workers", 0),
+        patch.object(CONF, "tile_cache_dir", f"{work_dir}/tiles"),
+        patch.object(
+            sales_man_problem,
+            "TERRITORY_CACHE",
+            IntermediateCache(f"{work_dir}/territory", 3600, 2**30, 2**30),
+        ),
+        patch.object(sales_man_problem, "fetch_country_city_data", fake_country_city_data),
+        patch.object(
+            sales_man_problem, "get_population_and_income", fake_population_and_income
+        ),
+        patch.object(sales_man_problem, "fetch_dataset", fake_fetch_dataset),
+        patch.object(sales_man_problem, "plot_results", plot_results),
+        patch.object(sales_man_problem.ctx, "add_basemap", lambda *args, **kwargs: None),
+    ]
+    if profiler is not None:
+        get_distance_backend = sales_man_problem.get_distance_backend
+
+        def profiled_distance_backend(name: str = "dense"):
+            backend = get_distance_backend(name)
+            backend.accessibility = profiler.wrap("accessibility", backend.accessibility)
+            return backend
+
+        patches += [
+            patch.object(
+                sales_man_problem,
+                name,
+                profiler.wrap(stage, getattr(sales_man_problem, name)),
+            )
+            for stage, name in (
+                ("load", "load_territory_sources"),
+                ("grid", "build_market_grid"),
+                ("market", "compute_market_potential"),
+                ("clustering", "cluster_market_grid"),
+                ("analytics", "build_territory_report"),
+                ("plots", "generate_all_plots"),
+            )
+        ]
+        patches.append(
+            patch.object(
+                sales_man_problem, "get_distance_backend", profiled_distance_backend
+            )
+        )
+
+    set_background_tasks(BackgroundTasks())
+    with contextlib.ExitStack() as stack:
+        for p in patches:
+            stack.enter_context(p)
+        yield
+
+
+def benchmark_request(city: SyntheticCity, **kwargs) -> ReqClustersForSalesManData:
+    """Territory request of the synthetic city, plots rendered inline so they are timed"""
+    fields = {
+        "user_id": "benchmark",
+        "city_name": city.city_name,
+        "country_name": city.country_name,
+        "boolean_query": "supermarket",
+        "num_sales_man": 10,
+        "plot_mode": "inline",
+        "plot_dpi": 50,
+    }
+    fields.update(kwargs)
+    return ReqClustersForSalesManData(**fields)
+
+
+def profile_territory_pipeline(
+    city: SyntheticCity,
+    req: ReqClustersForSalesManData,
+    track_memory: bool = True,
+) -> tuple[dict, dict]:
+    """
+    One offline run of `get_clusters_for_sales_man` on the synthetic city.
+
+    return:
+    ------
+    the response and the report of `StageProfiler` with the stages of `BENCHMARK_STAGES`
+    """
+    profiler = StageProfiler(track_memory=track_memory)
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            with offline_territory_pipeline(city, work_dir, profiler):
+                result = asyncio.run(sales_man_problem.get_clusters_for_sales_man(req))
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    return result, profiler.report()
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'stage':<14}{'seconds':>10}{'calls':>7}{'peak MB':>10}"]
+    for name, stats in report.items():
+        lines.append(
+            f"{name:<14}{stats['seconds']:>10.3f}{stats['calls']:>7}"
+            f"{stats['peak_bytes'] / 2**20:>10.1f}"
+        )
+    lines.append(f"{'total':<14}{sum(s['seconds'] for s in report.values()):>10.3f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Only when run as a script, the tests import this module
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(funcName)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    parser = argparse.ArgumentParser(
+        description="Time each stage of the territory pipeline on a synthetic city"
+    )
+    parser.add_argument("--scale", choices=list(CITY_SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--num-sales-man", type=int, default=10)
+    parser.add_argument("--distance-backend", choices=["dense", "chunked"], default="chunked")
+    parser.add_argument("--clustering-engine", choices=["greedy", "balanced"], default="greedy")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, it slows the run down")
+    args = parser.parse_args()
+
+    city = generate_synthetic_city(seed=args.seed, **CITY_SCALES[args.scale])
+    req = benchmark_request(
+        city,
+        num_sales_man=args.num_sales_man,
+        distance_backend=args.distance_backend,
+        clustering_engine=args.clustering_engine,
+    )
+    _, report = profile_territory_pipeline(city, req, track_memory=not args.no_memory)
+    print(format_report(report))
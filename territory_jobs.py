@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Optional
+
+import asyncpg
+import orjson
+from fastapi import HTTPException, status
+
+from all_types.request_dtypes import ReqClustersForSalesManData
+from backend_common.background import get_background_tasks
+from backend_common.database import Database
+from config_factory import CONF
+from sql_object import SqlObject
+from sales_man_problem import TERRITORY_STAGES, get_clusters_for_sales_man
+
+
+logger = logging.getLogger(__name__)
+
+# Jobs are kept in Postgres so that any worker can answer a poll. The worker running
+# a job holds its state here, job_id -> job state (see ResSalesmanJob), and writes
+# every change through to the table with an increasing version.
+_running_jobs: dict[str, dict] = {}
+# Pending stage writes, referenced until they finish
+_pending_writes: set[asyncio.Task] = set()
+
+
+def _job_view(job: dict) -> dict:
+    return {
+        key: value
+        for key, value in job.items()
+        if key not in ("user_id", "finished_at", "version")
+    }
+
+
+def _job_row(job: dict) -> tuple:
+    """Arguments of `SqlObject.save_sales_man_job` for the job's current state"""
+    job["version"] += 1
+    finished_at = (
+        datetime.fromtimestamp(job["finished_at"], timezone.utc)
+        if job["finished_at"] is not None
+        else None
+    )
+    payload = orjson.dumps(_job_view(job), option=orjson.OPT_SERIALIZE_NUMPY)
+    return (
+        job["job_id"],
+        job["version"],
+        payload.decode(),
+        finished_at,
+        job["user_id"],
+    )
+
+
+async def _write_job(row: tuple):
+    try:
+        await Database.execute(SqlObject.save_sales_man_job, *row)
+    except (
+        asyncpg.exceptions.UndefinedTableError,
+        asyncpg.exceptions.InvalidSchemaNameError,
+    ):
+        # If the table doesn't exist, create it and retry
+        await Database.execute(SqlObject.create_sales_man_jobs_table)
+        await Database.execute(SqlObject.save_sales_man_job, *row)
+
+
+async def _write_stage(row: tuple):
+    try:
+        await _write_job(row)
+    except Exception as e:
+        # Progress only, the final state is written by run_sales_man_job
+        logger.error(f"Could not record the stage of sales territory job {row[0]}: {e}")
+
+
+async def _evict_finished_jobs():
+    """Drops finished jobs older than `CONF.sales_man_job_ttl_seconds`"""
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        seconds=CONF.sales_man_job_ttl_seconds
+    )
+    try:
+        await Database.execute(SqlObject.delete_finished_sales_man_jobs, cutoff)
+    except (
+        asyncpg.exceptions.UndefinedTableError,
+        asyncpg.exceptions.InvalidSchemaNameError,
+    ):
+        pass
+
+
+def _set_stage(job_id: str, stage: str):
+    job = _running_jobs.get(job_id)
+    if job is None:
+        return
+    if job["stage"] is not None:
+        job["stages_completed"].append(job["stage"])
+    job["stage"] = stage
+    job["progress"] = round(
+        TERRITORY_STAGES.index(stage) / len(TERRITORY_STAGES), 2
+    )
+    logger.info(f"Sales territory job {job_id}: {stage}")
+    # Called synchronously by the pipeline, the state is captured now and written later
+    task = asyncio.get_running_loop().create_task(_write_stage(_job_row(job)))
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
+
+
+async def run_sales_man_job(job: dict, req: ReqClustersForSalesManData):
+    """Runs `get_clusters_for_sales_man` and records its stages and result on the job"""
+    job_id = job["job_id"]
+    _running_jobs[job_id] = job
+    job["status"] = "running"
+    try:
+        await _write_job(_job_row(job))
+        result = await get_clusters_for_sales_man(
+            req, progress=partial(_set_stage, job_id)
+        )
+        job["stages_completed"] = list(TERRITORY_STAGES)
+        job["stage"] = None
+        job["progress"] = 1.0
+        job["result"] = result
+        job["status"] = "completed"
+    except Exception as e:
+        logger.exception(f"Sales territory job {job_id} failed")
+        job["error"] = str(e)
+        job["status"] = "failed"
+    finally:
+        job["finished_at"] = time.time()
+        del _running_jobs[job_id]
+        await _write_job(_job_row(job))
+
+
+async def submit_sales_man_job(req: ReqClustersForSalesManData) -> dict:
+    """
+    Queues a sales territory optimization and returns immediately.
+
+    args:
+    ----
+    `req` is the same request as for `get_clusters_for_sales_man`
+
+    return:
+    ------
+    the queued job, poll it with `get_sales_man_job` using its `job_id`
+    """
+    await _evict_finished_jobs()
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "user_id": req.user_id,
+        "status": "queued",
+        "stage": None,
+        "stages_completed": [],
+        "progress": 0.0,
+        "error": None,
+        "result": None,
+        "finished_at": None,
+        "version": 0,
+    }
+    # Written before responding, so a poll on any worker finds the job
+    await _write_job(_job_row(job))
+    # Runs after the response is sent
+    get_background_tasks().add_task(run_sales_man_job, job, req)
+
+    return _job_view(job)
+
+
+async def get_sales_man_job(job_id: str, user_id: Optional[str] = None) -> dict:
+    """
+    Current state of a sales territory job, with the `ResSalesman` payload once completed.
+    When `user_id` is given, a job submitted by another user is not found.
+    """
+    try:
+        row = await Database.fetchrow(SqlObject.load_sales_man_job, job_id)
+    except (
+        asyncpg.exceptions.UndefinedTableError,
+        asyncpg.exceptions.InvalidSchemaNameError,
+    ):
+        row = None
+    if row is None or (user_id is not None and row["user_id"] != user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Sales territory job not found: {job_id}",
+        )
+    return orjson.loads(row["job"])
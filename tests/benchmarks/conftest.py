@@ -0,0 +1,16 @@
+from pathlib import Path
+
+import pytest
+
+
+BENCHMARKS_DIR = Path(__file__).parent
+
+
+def pytest_collection_modifyitems(config, items):
+    """The pipeline benchmarks take minutes, they only run with --benchmark-only"""
+    if config.getoption("benchmark_only", default=False):
+        return
+    skip = pytest.mark.skip(reason="territory benchmarks run with --benchmark-only")
+    for item in items:
+        if BENCHMARKS_DIR in Path(item.fspath).parents:
+            item.add_marker(skip)
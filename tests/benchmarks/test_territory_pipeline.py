@@ -0,0 +1,187 @@
+"""
+Offline benchmarks of the territory pipeline on synthetic cities, run with
+`pytest tests/benchmarks --benchmark-only`, a plain `pytest` run skips them. Compare runs with `--benchmark-autosave`
+and `--benchmark-compare`. Set TERRITORY_BENCHMARK_SCALES=small,medium,large to go
+beyond the small city.
+"""
+
+import asyncio
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+pytestmark = pytest.mark.slow
+
+import sales_man_problem
+from sales_man_problem import (
+    build_market_grid,
+    build_territory_report,
+    cluster_market_grid,
+    compute_market_potential,
+    filter_data_by_bounding_box,
+    generate_all_plots,
+    get_distance_backend,
+    get_grids_of_data,
+    load_territory_sources,
+)
+from synthetic_city import CITY_SCALES, generate_synthetic_city
+from territory_benchmark import (
+    benchmark_request,
+    offline_territory_pipeline,
+    profile_territory_pipeline,
+)
+
+
+SCALES = os.environ.get("TERRITORY_BENCHMARK_SCALES", "small").split(",")
+
+
+@pytest.fixture(scope="module", params=SCALES)
+def city(request):
+    return generate_synthetic_city(seed=0, **CITY_SCALES[request.param])
+
+
+@pytest.fixture(scope="module")
+def work_dir():
+    with tempfile.TemporaryDirectory() as directory:
+        yield directory
+
+
+@pytest.fixture(scope="module")
+def stage_inputs(city):
+    """The inputs of each stage, from one run of the stages before it"""
+    req = benchmark_request(city, distance_backend="chunked")
+    places = filter_data_by_bounding_box(city.places, city.bounding_box)
+    origins = city.population.geometry.centroid
+    masked, _ = build_market_grid(
+        city.population, places, city.income, req.distance_limit, "chunked"
+    )
+    return {
+        "req": req,
+        "places": places,
+        "origin_lats": origins.y.values,
+        "origin_lngs": origins.x.values,
+        "masked": masked,
+        "labels": cluster_market_grid(masked, req),
+    }
+
+
+def test_full_pipeline(benchmark, city):
+    req = benchmark_request(city, distance_backend="chunked")
+
+    # Timed without tracemalloc, it slows allocations down
+    result, _ = benchmark.pedantic(
+        profile_territory_pipeline,
+        args=(city, req),
+        kwargs={"track_memory": False},
+        rounds=3,
+        iterations=1,
+    )
+    assert result["success"] is True
+
+    # One more run for the time and peak memory of each stage
+    _, report = profile_territory_pipeline(city, req)
+    benchmark.extra_info["stages"] = report
+
+
+def test_load_stage(benchmark, city, stage_inputs):
+    req = stage_inputs["req"]
+
+    def load():
+        # A fresh territory cache every round, the population is not reused
+        with tempfile.TemporaryDirectory() as round_dir:
+            with offline_territory_pipeline(city, round_dir):
+                return asyncio.run(
+                    load_territory_sources(req, city.bounding_box, 14)
+                )
+
+    population, income, places = benchmark(load)
+    assert len(population) == len(city.population)
+
+
+def test_grid_stage(benchmark, city, stage_inputs):
+    grid = benchmark(
+        get_grids_of_data,
+        city.population,
+        stage_inputs["places"],
+        city.income,
+        stage_inputs["req"].distance_limit,
+        "chunked",
+    )
+    assert len(grid) > 0
+
+
+@pytest.mark.parametrize("distance_backend", ["dense", "chunked"])
+def test_accessibility_stage(benchmark, city, stage_inputs, distance_backend):
+    if distance_backend == "dense" and len(city.population) > 20_000:
+        pytest.skip("the dense matrix of this scale does not fit in memory")
+    places = stage_inputs["places"]
+
+    indptr, indices = benchmark(
+        get_distance_backend(distance_backend).accessibility,
+        stage_inputs["origin_lats"],
+        stage_inputs["origin_lngs"],
+        places.latitude.values,
+        places.longitude.values,
+        stage_inputs["req"].distance_limit,
+    )
+    assert len(indptr) == len(city.population) + 1
+
+
+def test_market_stage(benchmark, city, stage_inputs):
+    places = stage_inputs["places"]
+    indptr, indices = get_distance_backend("chunked").accessibility(
+        stage_inputs["origin_lats"],
+        stage_inputs["origin_lngs"],
+        places.latitude.values,
+        places.longitude.values,
+        stage_inputs["req"].distance_limit,
+    )
+    effective_population = np.random.default_rng(0).uniform(0, 5000, len(indptr) - 1)
+
+    market = benchmark(
+        compute_market_potential, indptr, indices, effective_population, len(places)
+    )
+    assert len(market) == len(places)
+
+
+@pytest.mark.parametrize("clustering_engine", ["greedy", "balanced"])
+def test_clustering_stage(benchmark, city, stage_inputs, clustering_engine):
+    req = stage_inputs["req"].model_copy(
+        update={"clustering_engine": clustering_engine}
+    )
+
+    labels = benchmark(cluster_market_grid, stage_inputs["masked"], req)
+    assert len(labels) == len(stage_inputs["masked"])
+
+
+def test_analytics_stage(benchmark, stage_inputs):
+    response, _, _ = benchmark(
+        build_territory_report,
+        stage_inputs["masked"],
+        stage_inputs["places"],
+        stage_inputs["labels"],
+        stage_inputs["req"],
+    )
+    assert len(response["territory_analytics"]) > 0
+
+
+def test_plots_stage(benchmark, city, work_dir, stage_inputs):
+    _, masked, places = build_territory_report(
+        stage_inputs["masked"],
+        stage_inputs["places"],
+        stage_inputs["labels"],
+        stage_inputs["req"],
+    )
+
+    def plot():
+        with offline_territory_pipeline(city, work_dir):
+            return asyncio.run(
+                generate_all_plots(masked, places, dpi=stage_inputs["req"].plot_dpi)
+            )
+
+    urls = benchmark.pedantic(plot, rounds=3, iterations=1)
+    assert set(urls) == {plot[0] for plot in sales_man_problem.TERRITORY_PLOTS}
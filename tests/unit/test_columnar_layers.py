@@ -0,0 +1,325 @@
+import asyncio
+import json
+import os
+import time
+from unittest.mock import patch
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+
+import columnar_layers
+from all_types.request_dtypes import ReqIntelligenceData
+from columnar_layers import calculate_polygon_area_km2, convert_layer, open_layer
+from config_factory import CONF
+from storage import fetch_intelligence_by_viewport, load_intelligence_frame
+
+
+def square(lng, lat, size):
+    return [
+        [
+            [lng, lat],
+            [lng + size, lat],
+            [lng + size, lat + size],
+            [lng, lat + size],
+            [lng, lat],
+        ]
+    ]
+
+
+def make_layer(n_features, seed, income=False):
+    rng = np.random.default_rng(seed)
+    features = []
+    for i in range(n_features):
+        lng, lat = rng.uniform(46.0, 47.5), rng.uniform(24.0, 25.5)
+        properties = {"id": f"cell-{i}"}
+        if income:
+            # Some features without income, one with a null income
+            if i % 9:
+                properties["income"] = int(rng.integers(1000, 30000))
+        else:
+            properties["Population_Count"] = int(rng.integers(0, 5000))
+            properties["density"] = float(rng.uniform(0, 100))
+            if i % 5 == 0:
+                properties["label"] = "dense"
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": square(lng, lat, rng.uniform(0.001, 0.01)),
+                },
+                "properties": properties,
+            }
+        )
+    # Non-polygon features are never returned
+    features.append(
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [46.7, 24.7]},
+            "properties": {"id": "point"},
+        }
+    )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def legacy_viewport_features(data, req, layer_type):
+    """Original per-feature loop of fetch_intelligence_by_viewport"""
+    filtered_features = []
+    density_values = [] if layer_type == "income" else None
+    for feature in data.get("features", []):
+        geom_type = feature.get("geometry", {}).get("type")
+        coords = feature.get("geometry", {}).get("coordinates", [])
+        if geom_type == "Polygon":
+            flat_coords = [point for ring in coords for point in ring]
+            lngs = [p[0] for p in flat_coords]
+            lats = [p[1] for p in flat_coords]
+            if (
+                min(lngs) <= req.max_lng
+                and max(lngs) >= req.min_lng
+                and min(lats) <= req.max_lat
+                and max(lats) >= req.min_lat
+            ):
+                if layer_type == "population":
+                    filtered_features.append(feature)
+                else:
+                    income = feature["properties"].get("income", 0)
+                    area_km2 = calculate_polygon_area_km2(coords)
+                    raw_density = income / area_km2 if area_km2 > 0 else 0
+                    density_values.append(raw_density)
+                    filtered_features.append((feature, raw_density))
+
+    if layer_type == "income" and density_values:
+        min_density = min(density_values)
+        max_density = max(density_values)
+        density_range = max_density - min_density if max_density > min_density else 1
+        processed_features = []
+        for feature, raw_density in filtered_features:
+            normalized_density = ((raw_density - min_density) / density_range) * 100
+            feature["properties"]["density"] = round(normalized_density, 6)
+            processed_features.append(feature)
+        filtered_features = processed_features
+    return filtered_features
+
+
+@pytest.fixture
+def layer_sources(monkeypatch, tmp_path):
+    """Population and income GeoJSON files at zoom 14, converted under tmp_path"""
+    monkeypatch.setattr(CONF, "columnar_layers_dir", str(tmp_path / "layers"))
+    monkeypatch.setattr(columnar_layers, "_open_layers", {})
+    sources = {}
+    for layer_type, data in (
+        ("population", make_layer(3000, 1)),
+        ("income", make_layer(3000, 2, income=True)),
+    ):
+        path = tmp_path / layer_type / "v{zoom_level}" / "all_features.geojson"
+        os.makedirs(str(path.parent).format(zoom_level=14))
+        with open(str(path).format(zoom_level=14), "w") as f:
+            json.dump(data, f)
+        sources[layer_type] = str(path)
+    monkeypatch.setattr(columnar_layers, "LAYER_SOURCES", sources)
+    for layer_type in sources:
+        assert convert_layer(layer_type, 14)
+    return {key: path.format(zoom_level=14) for key, path in sources.items()}
+
+
+def replace_source(path, n_features):
+    with open(path, "w") as f:
+        json.dump(make_layer(n_features, 3), f)
+    os.utime(path, (time.time() + 10, time.time() + 10))
+
+
+def viewport_request(income: bool) -> ReqIntelligenceData:
+    return ReqIntelligenceData(
+        min_lng=46.5,
+        min_lat=24.5,
+        max_lng=46.9,
+        max_lat=24.9,
+        zoom_level=14,
+        user_id="test_user",
+        population=True,
+        income=income,
+    )
+
+
+@pytest.mark.parametrize("layer_type", ["population", "income"])
+def test_viewport_features_match_legacy_loop(layer_sources, layer_type):
+    req = viewport_request(income=layer_type == "income")
+    with open(layer_sources[layer_type]) as f:
+        expected = legacy_viewport_features(json.load(f), req, layer_type)
+
+    result = asyncio.run(fetch_intelligence_by_viewport(req))
+
+    assert result["features"] == expected
+    assert result["records_count"] == len(expected) > 0
+    assert result["metadata"]["layer_type"] == layer_type
+    assert result["properties"] == list(expected[0]["properties"])
+
+
+@pytest.mark.parametrize("layer_type", ["population", "income"])
+def test_intelligence_frame_matches_from_features(layer_sources, layer_type):
+    req = viewport_request(income=layer_type == "income")
+    with open(layer_sources[layer_type]) as f:
+        expected = gpd.GeoDataFrame.from_features(
+            legacy_viewport_features(json.load(f), req, layer_type)
+        )
+
+    frame = load_intelligence_frame(req)
+
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(frame.drop(columns="geometry")),
+        pd.DataFrame(expected.drop(columns="geometry")),
+    )
+    assert frame.geometry.geom_equals_exact(expected.geometry, 0).all()
+
+
+def test_layer_is_converted_again_only_when_its_source_changes(layer_sources):
+    assert not convert_layer("population", 14)
+    first = open_layer("population", 14)
+    assert open_layer("population", 14) is first
+
+    replace_source(layer_sources["population"], 10)
+    assert convert_layer("population", 14)
+    assert len(open_layer("population", 14)) == 11
+    assert convert_layer("population", 14, force=True)
+
+    # The converted copy is enough once the GeoJSON source is gone
+    os.remove(layer_sources["population"])
+    assert len(open_layer("population", 14)) == 11
+    # Only the current and the previous generation are kept
+    directory = columnar_layers.layer_dir("population", 14)
+    assert len(os.listdir(directory)) == 3
+
+
+def test_unconverted_layer_is_converted_on_open(layer_sources, tmp_path):
+    path = str(tmp_path / "population" / "v15" / "all_features.geojson")
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        json.dump(make_layer(10, 3), f)
+    assert columnar_layers.source_zoom_levels("population") == [14, 15]
+
+    with patch(
+        "columnar_layers.convert_geojson_layer",
+        wraps=columnar_layers.convert_geojson_layer,
+    ) as conversion:
+        assert len(open_layer("population", 15)) == 11
+        assert len(open_layer("population", 15)) == 11
+        assert len(open_layer("population", 14)) == 3001
+    conversion.assert_called_once()
+
+    req = viewport_request(income=False)
+    req.zoom_level = 15
+    assert asyncio.run(fetch_intelligence_by_viewport(req))["records_count"] > 0
+
+
+def test_layer_reloads_when_its_source_changes(layer_sources):
+    first = open_layer("population", 14)
+    replace_source(layer_sources["population"], 10)
+
+    with patch(
+        "columnar_layers.convert_geojson_layer",
+        wraps=columnar_layers.convert_geojson_layer,
+    ) as conversion:
+        reloaded = open_layer("population", 14)
+        assert open_layer("population", 14) is reloaded
+    conversion.assert_called_once()
+    assert reloaded is not first
+    assert len(reloaded) == 11
+    # The viewport endpoint serves the new source too
+    result = asyncio.run(fetch_intelligence_by_viewport(viewport_request(income=False)))
+    assert result["records_count"] <= 10
+
+
+def test_open_layer_keeps_reading_its_own_generation(layer_sources):
+    layer = open_layer("population", 14)
+    rows = layer.query_bbox(45.0, 23.0, 48.0, 26.0)
+    expected = layer.column("Population_Count", rows)
+
+    replace_source(layer_sources["population"], 10)
+    assert convert_layer("population", 14)
+
+    # Column files of the new conversion are never mixed into the open layer
+    np.testing.assert_array_equal(layer.column("Population_Count", rows), expected)
+    assert len(layer.to_geodataframe(rows)) == len(rows)
+    assert open_layer("population", 14) is not layer
+
+
+def test_missing_layer_raises(layer_sources):
+    req = viewport_request(income=False)
+    req.zoom_level = 9
+    with pytest.raises(Exception, match="could not find geojson data for zoom level 9"):
+        asyncio.run(fetch_intelligence_by_viewport(req))
+
+
+def test_bbox_slice_is_faster_than_parsing_geojson(layer_sources):
+    req = viewport_request(income=False)
+    open_layer("population", 14)
+
+    start = time.perf_counter()
+    with open(layer_sources["population"]) as f:
+        legacy_viewport_features(json.load(f), req, "population")
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_intelligence_frame(req)
+    columnar_time = time.perf_counter() - start
+
+    assert columnar_time < legacy_time
+
+
+def linear_query_bbox(layer, min_lng, min_lat, max_lng, max_lat):
+    """The bbox column scan the spatial index replaced"""
+    minx, miny, maxx, maxy = (layer.bbox[:, i] for i in range(4))
+    return np.flatnonzero(
+        layer.is_polygon
+        & (minx <= max_lng)
+        & (maxx >= min_lng)
+        & (miny <= max_lat)
+        & (maxy >= min_lat)
+    )
+
+
+def test_spatial_index_matches_bbox_scan(layer_sources):
+    layer = open_layer("population", 14)
+    rng = np.random.default_rng(0)
+    viewports = [
+        # Whole layer, outside it, inverted and a viewport touching a feature's bounds
+        (45.0, 23.0, 48.0, 26.0),
+        (10.0, 10.0, 11.0, 11.0),
+        (46.9, 24.9, 46.5, 24.5),
+        tuple(layer.bbox[7][[2, 3]]) + (47.6, 25.6),
+    ]
+    for _ in range(200):
+        lng, lat = rng.uniform(45.9, 47.6), rng.uniform(23.9, 25.6)
+        width = rng.uniform(0, 0.5)
+        viewports.append((lng, lat, lng + width, lat + width))
+
+    for viewport in viewports:
+        np.testing.assert_array_equal(
+            layer.query_bbox(*viewport), linear_query_bbox(layer, *viewport)
+        )
+    assert 7 in layer.query_bbox(*viewports[3])
+
+
+def test_spatial_index_is_kept_until_the_layer_reloads(layer_sources):
+    index = open_layer("population", 14).spatial_index()
+    assert open_layer("population", 14).spatial_index() is index
+
+    replace_source(layer_sources["population"], 10)
+    assert convert_layer("population", 14)
+
+    tree, rows = open_layer("population", 14).spatial_index()
+    assert tree is not index[0]
+    assert len(rows) == 10
+
+
+def test_viewport_query_is_an_index_lookup(layer_sources):
+    layer = open_layer("population", 14)
+    layer.spatial_index()
+
+    start = time.perf_counter()
+    for _ in range(100):
+        rows = layer.query_bbox(46.5, 24.5, 46.6, 24.6)
+    assert (time.perf_counter() - start) / 100 < 1e-3
+    assert len(rows) > 0
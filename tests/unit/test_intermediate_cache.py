@@ -0,0 +1,69 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from intermediate_cache import IntermediateCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return IntermediateCache(
+        str(tmp_path), ttl_seconds=60, max_memory_bytes=2**20, max_disk_bytes=2**20
+    )
+
+
+def test_key_is_stable_and_content_addressed():
+    key = IntermediateCache.key("market_grid", "Riyadh", 14, "supermarket", 2.5)
+
+    assert key == IntermediateCache.key("market_grid", "Riyadh", 14, "supermarket", 2.5)
+    assert key != IntermediateCache.key("market_grid", "Riyadh", 14, "supermarket", 5.0)
+
+
+def test_hits_return_independent_copies(cache):
+    cache.put("k", {"values": [1, 2, 3]})
+
+    first = cache.get("k")
+    first["values"].append(4)
+
+    assert cache.get("k") == {"values": [1, 2, 3]}
+    assert cache.get("missing") is None
+
+
+def test_disk_tier_survives_a_new_instance(cache, tmp_path):
+    cache.put("k", np.arange(10))
+
+    other = IntermediateCache(
+        str(tmp_path), ttl_seconds=60, max_memory_bytes=2**20, max_disk_bytes=2**20
+    )
+
+    np.testing.assert_array_equal(other.get("k"), np.arange(10))
+
+
+def test_entries_expire(cache, monkeypatch):
+    cache.put("k", "value")
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+
+    assert cache.get("k") is None
+    assert not os.path.exists(cache._path("k"))
+
+
+def test_memory_and_disk_bounds_evict_least_recently_used(tmp_path):
+    block = np.zeros(100_000, dtype=np.uint8)  # ~100KB pickled
+    cache = IntermediateCache(
+        str(tmp_path), ttl_seconds=60, max_memory_bytes=250_000, max_disk_bytes=250_000
+    )
+
+    cache.put("a", block)
+    cache.put("b", block)
+    os.utime(cache._path("a"), (time.time() - 10, time.time()))
+    os.utime(cache._path("b"), (time.time() - 5, time.time()))
+    cache.get("a")  # most recently used
+    cache.put("c", block)
+
+    assert set(cache._memory) == {"a", "c"}
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        os.path.basename(cache._path(key)) for key in ("a", "c")
+    )
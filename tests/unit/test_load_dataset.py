@@ -0,0 +1,260 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import asyncpg
+import orjson
+import pytest
+
+from all_types.request_dtypes import ReqFetchDataset
+from config_factory import CONF
+from scripts.migrate_datasets_table import MIGRATIONS, migrate_datasets_table
+from sql_object import SqlObject
+from storage import (
+    load_dataset,
+    run_dataset_sweeper,
+    store_data_resp,
+    sweep_expired_datasets,
+)
+
+
+PLAN_NAME = "plan_cafe_Saudi Arabia_Jeddah"
+
+
+def plan_page_ids(n_pages: int) -> tuple[list[str], list[str]]:
+    """A search plan and the dataset ids of its pages, as load_dataset formats them"""
+    plan = [
+        f"39.{i}_21.5_30000.0_cafe_circle=1.{i}_circleNumber={i + 1}"
+        for i in range(n_pages)
+    ] + ["end of search plan"]
+    page_ids = ["39.0_21.5_30000.0_cafe_token="] + [
+        f"39.{i}_21.5_30000.0_cafe_token=page_token={PLAN_NAME}@#${i}"
+        for i in range(1, n_pages)
+    ]
+    return plan, page_ids
+
+
+def page_row(dataset_id: str, page: int, created_at: datetime) -> dict:
+    dataset = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [39.1, 21.5]},
+                "properties": {"id": f"{page}-{k}", "rating": page, "extra": "dropped"},
+            }
+            for k in range(3)
+        ],
+        "properties": ["id", "rating", f"page_{page}"],
+    }
+    return {
+        "filename": dataset_id,
+        "response_data": orjson.dumps(dataset).decode(),
+        "projected": False,
+        "created_at": created_at,
+    }
+
+
+def fake_fetch(rows: list[dict]):
+    """Database.fetch of load_fresh_datasets over `rows`, in no particular order"""
+
+    async def fetch(query, dataset_ids, expiry_cutoff):
+        return [
+            row
+            for row in rows[::-1]
+            if row["filename"] in dataset_ids and row["created_at"] >= expiry_cutoff
+        ]
+
+    return AsyncMock(side_effect=fetch)
+
+
+def test_plan_pages_load_in_one_query_and_merge_in_page_order():
+    plan, page_ids = plan_page_ids(12)
+    now = datetime.utcnow()
+    rows = {
+        dataset_id: page_row(dataset_id, page, now - timedelta(days=1))
+        for page, dataset_id in enumerate(page_ids)
+    }
+    # Page 4 is missing and page 7 expired
+    del rows[page_ids[4]]
+    rows[page_ids[7]]["created_at"] = now - timedelta(days=120)
+
+    with patch("storage.get_plan", new_callable=AsyncMock) as get_plan, patch(
+        "storage.Database"
+    ) as database:
+        get_plan.return_value = plan
+        database.fetch = fake_fetch(list(rows.values()))
+        database.execute = AsyncMock()
+
+        dataset = asyncio.run(
+            load_dataset(
+                f"39.0_21.5_30000.0_cafe_token=page_token={PLAN_NAME}@#$10",
+                fetch_full_plan_datasets=True,
+            )
+        )
+
+    query, dataset_ids, expiry_cutoff = database.fetch.await_args.args
+    assert database.fetch.await_count == 1
+    assert (query, dataset_ids) == (SqlObject.load_fresh_datasets, page_ids[:10])
+    assert expiry_cutoff == pytest.approx(
+        now - timedelta(days=90), abs=timedelta(seconds=5)
+    )
+    # Reads never delete, expired pages are left to the sweeper
+    database.execute.assert_not_awaited()
+    pages = [p for p in range(10) if p not in (4, 7)]
+    assert [f["properties"]["id"] for f in dataset["features"]] == [
+        f"{page}-{k}" for page in pages for k in range(3)
+    ]
+    assert dataset["features"][0]["properties"] == {"id": "0-0", "rating": 0}
+    assert set(dataset["properties"]) == {"id", "rating"} | {
+        f"page_{page}" for page in pages
+    }
+
+
+def test_full_plan_load_without_page_reads_every_page():
+    plan, page_ids = plan_page_ids(100)
+    with patch("storage.get_plan", new_callable=AsyncMock) as get_plan, patch(
+        "storage.Database"
+    ) as database:
+        get_plan.return_value = plan
+        database.fetch = fake_fetch([])
+
+        dataset = asyncio.run(load_dataset(PLAN_NAME, fetch_full_plan_datasets=True))
+
+    assert database.fetch.await_args.args[:2] == (
+        SqlObject.load_fresh_datasets,
+        page_ids,
+    )
+    assert dataset["features"] == []
+
+
+def test_single_dataset_read_filters_expired_rows():
+    with patch("storage.Database") as database:
+        database.fetchrow = AsyncMock(return_value=None)
+        database.execute = AsyncMock()
+
+        assert asyncio.run(load_dataset("some_dataset")) is None
+
+    query, dataset_id, expiry_cutoff = database.fetchrow.await_args.args
+    assert (query, dataset_id) == (SqlObject.load_fresh_dataset, "some_dataset")
+    assert expiry_cutoff < datetime.utcnow() - timedelta(days=89)
+    database.execute.assert_not_awaited()
+
+
+def test_sweep_deletes_expired_datasets_in_batches():
+    with patch("storage.Database") as database:
+        database.execute = AsyncMock(
+            side_effect=["DELETE 100", "DELETE 100", "DELETE 37"]
+        )
+
+        deleted = asyncio.run(sweep_expired_datasets(batch_size=100))
+
+    assert deleted == 237
+    assert database.execute.await_count == 3
+    for call in database.execute.await_args_list:
+        query, cutoff, batch_size = call.args
+        assert query == SqlObject.delete_expired_datasets
+        assert batch_size == 100
+    # Every batch uses the same cutoff
+    assert len({call.args[1] for call in database.execute.await_args_list}) == 1
+
+
+def test_dataset_sweeper_survives_failed_sweeps(monkeypatch):
+    monkeypatch.setattr(CONF, "dataset_sweep_interval_seconds", 0)
+    sweeps = []
+
+    async def sweep():
+        sweeps.append(len(sweeps))
+        if len(sweeps) == 1:
+            raise ConnectionError("database unavailable")
+        if len(sweeps) == 3:
+            raise asyncio.CancelledError()
+        return 0
+
+    with patch("storage.sweep_expired_datasets", sweep):
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(run_dataset_sweeper())
+
+    assert sweeps == [0, 1, 2]
+
+
+def test_store_data_resp_writes_full_and_projected_forms():
+    dataset = orjson.loads(page_row("page", 3, datetime.utcnow())["response_data"])
+    dataset["features"].append(
+        {"type": "Feature", "geometry": None, "properties": {"id": "n/a"}}
+    )
+    req = ReqFetchDataset(
+        city_name="Jeddah",
+        country_name="Saudi Arabia",
+        boolean_query="cafe",
+        action="sample",
+        user_id="test_user",
+    )
+
+    with patch("storage.Database") as database:
+        database.execute = AsyncMock()
+        assert asyncio.run(store_data_resp(req, dataset, "page")) == "page"
+
+    query, filename, _, full, _, projected = database.execute.await_args.args
+    assert (query, filename) == (SqlObject.store_dataset, "page")
+    full, projected = json.loads(full), json.loads(projected)
+    assert [f["properties"] for f in full["features"]] == [
+        {"id": f"3-{k}", "rating": 3, "extra": "dropped"} for k in range(3)
+    ]
+    assert [f["properties"] for f in projected["features"]] == [
+        {"id": f"3-{k}", "rating": 3} for k in range(3)
+    ]
+    assert projected["properties"] == full["properties"]
+    # The caller's dataset keeps its full features
+    assert dataset["features"][0]["properties"]["extra"] == "dropped"
+
+
+def test_projected_rows_are_served_as_stored():
+    plan, page_ids = plan_page_ids(3)
+    now = datetime.utcnow()
+    rows = [page_row(dataset_id, page, now) for page, dataset_id in enumerate(page_ids)]
+    # Rows written with their projection are not projected again
+    rows[1]["projected"] = True
+
+    with patch("storage.get_plan", new_callable=AsyncMock) as get_plan, patch(
+        "storage.Database"
+    ) as database:
+        get_plan.return_value = plan
+        database.fetch = fake_fetch(rows)
+        dataset = asyncio.run(load_dataset(PLAN_NAME, fetch_full_plan_datasets=True))
+
+        database.fetchrow = AsyncMock(return_value=rows[1])
+        single = asyncio.run(load_dataset(page_ids[1]))
+
+    assert [
+        "extra" in f["properties"] for f in dataset["features"][::3]
+    ] == [False, True, False]
+    assert all("extra" in f["properties"] for f in single["features"])
+
+
+def test_migrate_datasets_table_runs_each_statement_alone():
+    with patch("scripts.migrate_datasets_table.Database") as database:
+        database.execute = AsyncMock()
+        asyncio.run(migrate_datasets_table())
+
+    # One query per statement, CREATE INDEX CONCURRENTLY cannot share a transaction
+    assert [call.args for call in database.execute.await_args_list] == [
+        (statement,) for statement in MIGRATIONS
+    ]
+    assert SqlObject.create_datasets_created_at_index in MIGRATIONS
+
+
+@pytest.mark.parametrize(
+    "missing",
+    [
+        asyncpg.exceptions.InvalidSchemaNameError("no schema"),
+        asyncpg.exceptions.UndefinedTableError("no table"),
+    ],
+)
+def test_migrate_datasets_table_on_fresh_database(missing):
+    with patch("scripts.migrate_datasets_table.Database") as database:
+        database.execute = AsyncMock(side_effect=missing)
+        asyncio.run(migrate_datasets_table())
+
+    database.execute.assert_awaited_once_with(MIGRATIONS[0])
@@ -0,0 +1,88 @@
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from storage import point_features
+
+
+def iterrows_features(records: list, drop_na: bool = False, dtype=None) -> list[dict]:
+    """The row at a time builder the storage readers used before `point_features`"""
+    city_df = pd.DataFrame([dict(record) for record in records], dtype=dtype)
+    features = []
+    for _, row in city_df.iterrows():
+        coordinates = [float(row["longitude"]), float(row["latitude"])]
+        columns_to_drop = ["latitude", "longitude", "city"]
+        if "country" in row:
+            columns_to_drop.append("country")
+        if drop_na:
+            row = row.dropna()
+        properties = row.drop(columns_to_drop).to_dict()
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": coordinates},
+                "properties": properties,
+            }
+        )
+    return features
+
+
+def make_records(n_rows: int, seed: int = 0) -> list[dict]:
+    """Rows like the real estate and commercial queries, with missing values"""
+    rng = np.random.default_rng(seed)
+    created_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "url": f"https://example.com/{i}" if i % 7 else None,
+            "price": float(rng.uniform(1e4, 1e6)) if i % 5 else None,
+            "rooms": int(rng.integers(1, 6)) if i % 11 else None,
+            "area": int(rng.integers(50, 500)),
+            "city": "Riyadh",
+            "country": "Saudi Arabia",
+            "latitude": Decimal(f"{24 + rng.uniform(0, 1):.6f}"),
+            "longitude": float(46 + rng.uniform(0, 1)),
+            "furnished": bool(i % 2),
+            "created_at": created_at,
+        }
+        for i in range(n_rows)
+    ]
+
+
+@pytest.mark.parametrize(
+    "drop_na,infer_dtypes", [(False, True), (True, False), (False, False)]
+)
+def test_point_features_match_iterrows(drop_na, infer_dtypes):
+    records = make_records(200)
+
+    features, columns = point_features(records, drop_na, infer_dtypes)
+
+    expected = iterrows_features(records, drop_na, None if infer_dtypes else object)
+    # repr tells NaN, int and float values and timestamps apart
+    assert repr(features) == repr(expected)
+    assert columns == list(records[0])
+
+
+def test_point_features_without_rows_or_properties():
+    assert point_features([]) == ([], [])
+
+    records = [{"latitude": 24.0, "longitude": 46.0, "city": "Riyadh"}] * 2
+    features, _ = point_features(records)
+    assert [f["properties"] for f in features] == [{}, {}]
+    assert features[0]["properties"] is not features[1]["properties"]
+
+
+def test_point_features_faster_than_iterrows():
+    records = make_records(20_000)
+
+    started = time.perf_counter()
+    iterrows_features(records)
+    iterrows_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    point_features(records)
+    columnar_seconds = time.perf_counter() - started
+
+    assert columnar_seconds * 3 < iterrows_seconds
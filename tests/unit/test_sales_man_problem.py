@@ -0,0 +1,1337 @@
+import asyncio
+import json
+import logging
+import pickle
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Point, box
+
+from all_types.request_dtypes import (
+    ReqClustersForSalesManData,
+    ReqClustersForSalesManScenarios,
+)
+from backend_common.background import set_background_tasks
+from config_factory import CONF
+from intermediate_cache import IntermediateCache
+from fastapi import BackgroundTasks, HTTPException
+from process_pool import run_cpu_bound, shutdown_process_pool
+import sales_man_problem
+from sql_object import SqlObject
+from territory_jobs import get_sales_man_job, submit_sales_man_job
+
+from sales_man_problem import (
+    TERRITORY_PLOTS,
+    TERRITORY_STAGES,
+    ChunkedDistanceBackend,
+    DenseDistanceBackend,
+    assign_greedy_territories,
+    build_market_grid,
+    assign_places_to_territories,
+    build_territory_report,
+    compute_accessibility,
+    compute_market_potential,
+    get_clusters_for_sales_man,
+    get_clusters_for_sales_man_scenarios,
+    generate_all_plots,
+    get_distance_backend,
+    get_travel_cost_provider,
+    get_grids_of_data,
+    haversine_km,
+    hexagon_grid_cells,
+    plot_file_name,
+    save_travel_cost_matrix,
+    square_grid_cells,
+    territory_plot_urls,
+    territory_raw_data_urls,
+    territory_raw_layer_lines,
+)
+
+
+logger = logging.getLogger(__name__)
+
+PLANS_DIR = "Backend/layer_category_country_city_matching/full_data_plans"
+GOOGLE_MAPS_SEED = "tests/integration/db_seed_data/google_maps_raw.json"
+
+
+def load_plan_centers(plan_file: str) -> tuple[np.ndarray, np.ndarray]:
+    """Recorded search-plan circle centers as (lat, lng) arrays"""
+    with open(f"{PLANS_DIR}/{plan_file}", "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    lngs, lats = [], []
+    for item in plan:
+        if item == "end of search plan":
+            continue
+        lng, lat = item.split("_")[:2]
+        lngs.append(float(lng))
+        lats.append(float(lat))
+    return np.array(lats), np.array(lngs)
+
+
+def load_seed_places(key: str) -> tuple[np.ndarray, np.ndarray]:
+    """Recorded Google Places locations as (lat, lng) arrays"""
+    with open(GOOGLE_MAPS_SEED, "r", encoding="utf-8") as f:
+        places = json.load(f)[key]["response_data"]["places"]
+    lats = np.array([p["location"]["latitude"] for p in places])
+    lngs = np.array([p["location"]["longitude"] for p in places])
+    return lats, lngs
+
+
+def legacy_accessibility(matrix: np.ndarray, distance_limit: float):
+    """Original per-origin argmin loop from get_grids_of_data"""
+    od_cost_matrix = {k: [] for k in range(matrix.shape[0])}
+    accessibility_counts = []
+    for i in range(matrix.shape[0]):
+        od = matrix[i].tolist()
+        while len(od_cost_matrix[i]) < matrix.shape[1]:
+            if np.min(od) < distance_limit:
+                amn = np.argmin(od)
+                if np.isfinite(amn):
+                    od_cost_matrix[i].append(amn)
+                od[amn] = np.inf
+            else:
+                if len(od_cost_matrix[i]) == 0:
+                    amn = np.argmin(od)
+                    if np.isfinite(amn):
+                        od_cost_matrix[i].append(amn)
+                break
+        accessibility_counts.append(len(od_cost_matrix[i]))
+    return od_cost_matrix, accessibility_counts
+
+
+@pytest.fixture(scope="module")
+def riyadh_matrix():
+    origin_lats, origin_lngs = load_plan_centers(
+        "plan_parking_Saudi Arabia_Riyadh.json"
+    )
+    dest_lats, dest_lngs = load_seed_places("supermarket_cat_response")
+    # Keep the legacy reference loop affordable
+    return haversine_km(origin_lats[::5], origin_lngs[::5], dest_lats, dest_lngs)
+
+
+@pytest.fixture(scope="module")
+def jeddah_matrix():
+    origin_lats, origin_lngs = load_plan_centers(
+        "plan_cafe_Saudi Arabia_Jeddah.json"
+    )
+    dest_lats, dest_lngs = load_plan_centers(
+        "plan_supermarket_Saudi Arabia_Jeddah.json"
+    )
+    return haversine_km(
+        origin_lats[::25], origin_lngs[::25], dest_lats[::25], dest_lngs[::25]
+    )
+
+
+@pytest.mark.parametrize("city_matrix", ["riyadh_matrix", "jeddah_matrix"])
+@pytest.mark.parametrize("distance_limit", [0.5, 2.5, 5.0, 50.0])
+def test_compute_accessibility_matches_legacy_loop(
+    city_matrix, distance_limit, request
+):
+    matrix = request.getfixturevalue(city_matrix)
+
+    expected_od, expected_counts = legacy_accessibility(matrix, distance_limit)
+    indptr, indices = compute_accessibility(matrix, distance_limit)
+
+    assert np.diff(indptr).tolist() == expected_counts
+    for k, expected in expected_od.items():
+        assert indices[indptr[k] : indptr[k + 1]].tolist() == [
+            int(v) for v in expected
+        ]
+
+
+def test_compute_accessibility_falls_back_to_closest_destination():
+    matrix = np.array([[9.0, 7.0, 8.0], [1.0, 0.5, 1.0]])
+
+    indptr, indices = compute_accessibility(matrix, 2.0)
+
+    assert indptr.tolist() == [0, 1, 4]
+    assert indices.tolist() == [1, 1, 0, 2]
+
+
+def legacy_market_potential(od_cost_matrix, effective_population, n_destinations):
+    """Original destination x origin membership loop from get_grids_of_data"""
+    market = {k: [] for k in range(n_destinations)}
+    for i in range(n_destinations):
+        for k, v in od_cost_matrix.items():
+            if i in v:
+                market[i].append(effective_population[k])
+    return [sum(v) for v in market.values()]
+
+
+@pytest.mark.parametrize("distance_limit", [0.5, 2.5, 5.0])
+def test_compute_market_potential_matches_legacy_loop(
+    riyadh_matrix, distance_limit
+):
+    rng = np.random.default_rng(7)
+    effective_population = rng.uniform(0, 5000, riyadh_matrix.shape[0])
+
+    expected_od, _ = legacy_accessibility(riyadh_matrix, distance_limit)
+    indptr, indices = compute_accessibility(riyadh_matrix, distance_limit)
+
+    market = compute_market_potential(
+        indptr, indices, effective_population, riyadh_matrix.shape[1]
+    )
+
+    np.testing.assert_allclose(
+        market,
+        legacy_market_potential(
+            expected_od, effective_population, riyadh_matrix.shape[1]
+        ),
+    )
+
+
+@pytest.fixture(scope="module")
+def jeddah_points():
+    origin_lats, origin_lngs = load_plan_centers(
+        "plan_cafe_Saudi Arabia_Jeddah.json"
+    )
+    dest_lats, dest_lngs = load_plan_centers(
+        "plan_supermarket_Saudi Arabia_Jeddah.json"
+    )
+    return origin_lats, origin_lngs, dest_lats, dest_lngs
+
+
+@pytest.mark.parametrize("distance_limit", [0.5, 2.5, 10.0])
+def test_chunked_backend_matches_dense_backend(jeddah_points, distance_limit):
+    # A tiny block budget forces many blocks, including a ragged last one
+    chunked = ChunkedDistanceBackend(max_block_bytes=6 * 8 * 5203 * 97)
+
+    dense_result = DenseDistanceBackend().accessibility(
+        *jeddah_points, distance_limit
+    )
+    chunked_result = chunked.accessibility(*jeddah_points, distance_limit)
+
+    np.testing.assert_array_equal(chunked_result[0], dense_result[0])
+    np.testing.assert_array_equal(chunked_result[1], dense_result[1])
+
+
+def test_chunked_distance_rows_match_dense_rows(jeddah_points):
+    lats, lngs = jeddah_points[0][::10], jeddah_points[1][::10]
+
+    dense_rows = get_distance_backend("dense").distance_rows(lats, lngs)
+    lazy_rows = get_distance_backend("chunked").distance_rows(lats, lngs)
+
+    assert lazy_rows.shape == dense_rows.shape
+    for i in (0, 17, len(lats) - 1):
+        np.testing.assert_allclose(lazy_rows[i], dense_rows[i])
+
+
+def test_get_distance_backend_rejects_unknown_name():
+    with pytest.raises(ValueError):
+        get_distance_backend("ball_tree")
+
+
+@pytest.mark.slow
+def test_benchmark_chunked_backend_against_dense(jeddah_points):
+    results = {}
+    for name in ("dense", "chunked"):
+        backend = get_distance_backend(name)
+        tracemalloc.start()
+        start = time.perf_counter()
+        backend.accessibility(*jeddah_points, 2.5)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = (elapsed, peak)
+
+    logger.info(
+        "dense: {:.2f}s {:.0f}MB, chunked: {:.2f}s {:.0f}MB".format(
+            results["dense"][0],
+            results["dense"][1] / 1024**2,
+            results["chunked"][0],
+            results["chunked"][1] / 1024**2,
+        )
+    )
+    assert results["chunked"][1] < results["dense"][1] / 2
+
+
+def legacy_greedy_groups(matrix, shares, num_sales_man):
+    """Original list-based greedy clustering from get_clusters_for_sales_man"""
+    equitable_share = shares.sum() / num_sales_man
+    used = []
+    groups = {i: [] for i in range(num_sales_man)}
+    j = 0
+    for i in range(len(shares)):
+        if i in used:
+            continue
+        x = np.argsort(matrix[i])
+        value = 0
+        nbrs = []
+        for cell_idx in x:
+            if cell_idx in used:
+                continue
+            value += shares[cell_idx]
+            nbrs.append(cell_idx)
+            if value >= equitable_share:
+                break
+        groups[j].extend(nbrs)
+        used.extend(nbrs)
+        j += 1
+        if j >= num_sales_man:
+            break
+    return groups
+
+
+@pytest.mark.parametrize("num_sales_man", [1, 3, 8, 25])
+def test_assign_greedy_territories_matches_legacy_groups(num_sales_man):
+    lats, lngs = load_plan_centers("plan_cafe_Saudi Arabia_Jeddah.json")
+    lats, lngs = lats[::20], lngs[::20]
+    matrix = haversine_km(lats, lngs, lats, lngs)
+    shares = np.random.default_rng(3).uniform(0, 1000, len(lats))
+
+    labels = assign_greedy_territories(matrix, shares, num_sales_man)
+
+    groups = legacy_greedy_groups(matrix, shares, num_sales_man)
+    expected = np.full(len(lats), -1)
+    for group_id, cells in groups.items():
+        expected[cells] = group_id
+    np.testing.assert_array_equal(labels, expected)
+
+
+RIYADH_BBOX = [[46.60, 24.60], [46.80, 24.60], [46.80, 24.80], [46.60, 24.80]]
+
+
+@pytest.fixture
+def stubbed_riyadh_sources(monkeypatch, tmp_path):
+    """
+    Population/income squares and places inside RIYADH_BBOX, with plot rendering stubbed.
+    Yields the background tasks, `.rendered` records (column, crs, dpi) of each plot and
+    `.fetches` the data sources loaded
+    """
+    # Patches do not reach spawned workers, run the CPU stages inline
+    monkeypatch.setattr(CONF, "cpu_pool_workers", 0)
+    monkeypatch.setattr(
+        "sales_man_problem.TERRITORY_CACHE",
+        IntermediateCache(str(tmp_path / "territory"), 3600, 2**30, 2**30),
+    )
+    rng = np.random.default_rng(11)
+    # Small census blocks scattered over the city so they fall within grid cells
+    block_lngs = rng.uniform(46.60, 46.80, 600)
+    block_lats = rng.uniform(24.60, 24.80, 600)
+    cells = [
+        box(x, y, x + 0.0005, y + 0.0005)
+        for x, y in zip(block_lngs, block_lats)
+    ]
+    population = gpd.GeoDataFrame(
+        {"Population_Count": rng.integers(100, 5000, len(cells))},
+        geometry=cells,
+    )
+    income = gpd.GeoDataFrame(
+        {"income": rng.uniform(2000, 20000, len(cells))}, geometry=cells
+    )
+    place_lngs = rng.uniform(46.61, 46.79, 300)
+    place_lats = rng.uniform(24.61, 24.79, 300)
+    places = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": Point(lng, lat).__geo_interface__,
+                "properties": {"id": str(k)},
+            }
+            for k, (lng, lat) in enumerate(zip(place_lngs, place_lats))
+        ],
+    }
+
+    async def fake_country_city_data():
+        return {"Saudi Arabia": [{"name": "Riyadh", "bounding_box": RIYADH_BBOX}]}
+
+    async def fake_population_and_income(bounding_box, zoom_level):
+        fetches.append("population_income")
+        return population.copy(), income.copy()
+
+    async def fake_fetch_dataset(req):
+        fetches.append(req.boolean_query)
+        return {"full_load_geojson": places}
+
+    def fake_plot_results(gdf, columns, *args, filename=None, timestamp=None, **kwargs):
+        rendered.append((columns[0], gdf.crs.to_epsg(), kwargs["dpi"]))
+        return f"/static/plots/{plot_file_name(filename, timestamp)}"
+
+    # Background plot tasks are collected here instead of running after a response
+    tasks = BackgroundTasks()
+    set_background_tasks(tasks)
+    tasks.rendered = rendered = []
+    tasks.fetches = fetches = []
+
+    with patch(
+        "sales_man_problem.fetch_country_city_data", fake_country_city_data
+    ), patch(
+        "sales_man_problem.get_population_and_income",
+        fake_population_and_income,
+    ), patch(
+        "sales_man_problem.fetch_dataset", fake_fetch_dataset
+    ), patch(
+        "sales_man_problem.plot_results", fake_plot_results
+    ):
+        yield tasks
+
+
+@pytest.mark.parametrize("distance_backend", ["dense", "chunked"])
+def test_get_clusters_for_sales_man_end_to_end(
+    stubbed_riyadh_sources, distance_backend
+):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=20,
+        distance_backend=distance_backend,
+    )
+
+    result = asyncio.run(get_clusters_for_sales_man(req))
+
+    assert result["success"] is True
+    assert len(result["territory_analytics"]) == 20
+    assert 0 < result["metadata"]["clusters_created"] <= 20
+
+
+def test_get_clusters_for_sales_man_balanced_engine(stubbed_riyadh_sources):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=20,
+        clustering_engine="balanced",
+        contiguity="rook",
+    )
+
+    result = asyncio.run(get_clusters_for_sales_man(req))
+
+    assert result["success"] is True
+    assert len(result["territory_analytics"]) == 20
+    assert result["metadata"]["clusters_created"] == 20
+
+
+def test_run_cpu_bound_in_process_pool(riyadh_matrix, monkeypatch):
+    monkeypatch.setattr(CONF, "cpu_pool_workers", 1)
+
+    async def run_in_pool():
+        # The event loop keeps ticking while the worker computes
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        ticker_task = asyncio.create_task(ticker())
+        result = await run_cpu_bound(compute_accessibility, riyadh_matrix, 2.5)
+        ticker_task.cancel()
+        return result, ticks
+
+    try:
+        (indptr, indices), ticks = asyncio.run(run_in_pool())
+    finally:
+        shutdown_process_pool()
+
+    expected = compute_accessibility(riyadh_matrix, 2.5)
+    np.testing.assert_array_equal(indptr, expected[0])
+    np.testing.assert_array_equal(indices, expected[1])
+    assert ticks > 0
+
+
+def test_get_clusters_for_sales_man_reports_stages(stubbed_riyadh_sources):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+    )
+    stages = []
+
+    asyncio.run(get_clusters_for_sales_man(req, progress=stages.append))
+
+    assert tuple(stages) == TERRITORY_STAGES
+
+
+class FakeJobTable:
+    """The sales_man_jobs table, with the versioned upsert of SqlObject.save_sales_man_job"""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def execute(self, query, *args):
+        if query == SqlObject.save_sales_man_job:
+            job_id, version, job, finished_at, user_id = args
+            if job_id not in self.rows or self.rows[job_id][0] < version:
+                self.rows[job_id] = (version, job, finished_at, user_id)
+        elif query == SqlObject.delete_finished_sales_man_jobs:
+            self.rows = {
+                job_id: row
+                for job_id, row in self.rows.items()
+                if row[2] is None or row[2] >= args[0]
+            }
+
+    async def fetchrow(self, query, job_id):
+        row = self.rows.get(job_id)
+        return None if row is None else {"job": row[1], "user_id": row[3]}
+
+
+@pytest.fixture
+def job_table():
+    table = FakeJobTable()
+    with patch("territory_jobs.Database", table):
+        yield table
+
+
+async def submit_and_run(req):
+    """Submits a job and runs its background task the way the response would"""
+    tasks = BackgroundTasks()
+    set_background_tasks(tasks)
+    job = await submit_sales_man_job(req)
+    queued = await get_sales_man_job(job["job_id"])
+    await tasks()
+    return queued, await get_sales_man_job(job["job_id"])
+
+
+def test_sales_man_job_completes_with_result(stubbed_riyadh_sources, job_table):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+    )
+
+    queued, finished = asyncio.run(submit_and_run(req))
+
+    assert queued["status"] == "queued"
+    assert queued["result"] is None
+    assert finished["status"] == "completed"
+    assert finished["progress"] == 1.0
+    assert finished["stages_completed"] == list(TERRITORY_STAGES)
+    assert finished["result"]["success"] is True
+    assert len(finished["result"]["territory_analytics"]) == 5
+
+
+def test_sales_man_job_records_failure(stubbed_riyadh_sources, job_table):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Atlantis",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+    )
+
+    _, finished = asyncio.run(submit_and_run(req))
+
+    assert finished["status"] == "failed"
+    assert finished["stage"] == "data_load"
+    assert "Atlantis" in finished["error"]
+
+
+def test_get_sales_man_job_unknown_id(job_table):
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_sales_man_job("missing"))
+    assert exc_info.value.status_code == 404
+
+
+def test_sales_man_job_is_only_polled_by_its_user(job_table):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+    )
+
+    async def submit_and_poll():
+        set_background_tasks(BackgroundTasks())
+        job = await submit_sales_man_job(req)
+        own = await get_sales_man_job(job["job_id"], "test_user")
+        with pytest.raises(HTTPException) as exc_info:
+            await get_sales_man_job(job["job_id"], "other_user")
+        return own, exc_info.value
+
+    own, error = asyncio.run(submit_and_poll())
+
+    assert own["status"] == "queued"
+    assert "user_id" not in own
+    assert error.status_code == 404
+
+
+def test_job_status_endpoint_checks_the_token_without_a_body(job_table):
+    from fastapi.testclient import TestClient
+
+    from fastapi_app import app
+
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+    )
+    set_background_tasks(BackgroundTasks())
+    job = asyncio.run(submit_sales_man_job(req))
+    client = TestClient(app)
+    url = CONF.sales_man_job_status.format(job_id=job["job_id"])
+    headers = {"Authorization": "Bearer token"}
+
+    with patch("backend_common.auth.CONF.test_mode", False):
+        with patch(
+            "backend_common.auth.my_verify_id_token", return_value={"uid": "test_user"}
+        ):
+            own = client.get(url, headers=headers)
+        with patch(
+            "backend_common.auth.my_verify_id_token", return_value={"uid": "other_user"}
+        ):
+            foreign = client.get(url, headers=headers)
+
+    assert own.status_code == 200
+    assert own.json()["data"]["job_id"] == job["job_id"]
+    assert foreign.status_code == 404
+
+
+def test_sales_man_job_is_polled_from_the_table(stubbed_riyadh_sources, job_table):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+    )
+
+    _, finished = asyncio.run(submit_and_run(req))
+
+    # Any worker answers from the row, stage writes landing late never overwrite it
+    (version, job, finished_at, user_id), = job_table.rows.values()
+    assert version == len(TERRITORY_STAGES) + 3
+    assert json.loads(job) == finished
+    assert finished_at is not None
+    assert user_id == "test_user"
+
+    async def submit_another():
+        set_background_tasks(BackgroundTasks())
+        await submit_sales_man_job(req)
+
+    # Finished jobs are evicted once expired
+    with patch.object(CONF, "sales_man_job_ttl_seconds", -60):
+        asyncio.run(submit_another())
+    assert len(job_table.rows) == 1
+    assert finished["job_id"] not in job_table.rows
+
+
+@pytest.mark.parametrize("plot_mode", ["background", "inline", "skip"])
+def test_get_clusters_for_sales_man_plot_modes(stubbed_riyadh_sources, plot_mode):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+        plot_mode=plot_mode,
+        plot_dpi=72,
+    )
+    rendered = stubbed_riyadh_sources.rendered
+
+    result = asyncio.run(get_clusters_for_sales_man(req))
+
+    if plot_mode == "skip":
+        assert result["plots"] == {}
+        assert rendered == [] and stubbed_riyadh_sources.tasks == []
+        return
+
+    assert set(result["plots"]) == {plot[0] for plot in TERRITORY_PLOTS}
+    if plot_mode == "background":
+        # The response does not wait for rendering
+        assert rendered == []
+        asyncio.run(stubbed_riyadh_sources())
+    assert len(rendered) == len(TERRITORY_PLOTS)
+    assert {(crs, dpi) for _, crs, dpi in rendered} == {(3857, 72)}
+    # Background URLs are announced under the same names the renderer saves to
+    timestamp = result["plots"]["cluster_markets"].split("/")[-1][:15]
+    assert result["plots"] == territory_plot_urls(result["request_id"], timestamp)
+
+
+def read_raw_layer(request_id, layer, precision=6, user_id="test_user"):
+    async def read():
+        lines = await territory_raw_layer_lines(user_id, request_id, layer, precision)
+        return b"".join(lines)
+
+    return [json.loads(line) for line in asyncio.run(read()).splitlines()]
+
+
+def test_raw_data_is_referenced_and_streamed_as_ndjson(stubbed_riyadh_sources):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+        include_raw_data=True,
+    )
+
+    result = asyncio.run(get_clusters_for_sales_man(req))
+
+    # The response only references the layers
+    request_id = result["request_id"]
+    assert len(request_id) == 32
+    assert result["raw_cluster_data"] == territory_raw_data_urls("test_user", request_id)
+    assert len(json.dumps(result, default=str)) < 30_000
+
+    frames = sales_man_problem.TERRITORY_CACHE.get(
+        sales_man_problem.TERRITORY_CACHE.key("territory_raw", "test_user", request_id)
+    )
+    for layer in ("grid", "places"):
+        features = read_raw_layer(request_id, layer)
+        expected = json.loads(frames[layer].to_json())["features"]
+        assert len(features) == len(expected) > 0
+        for feature, original in zip(features, expected):
+            assert feature["id"] == original["id"]
+            assert feature["properties"] == original["properties"]
+            assert feature["geometry"]["type"] == original["geometry"]["type"]
+            np.testing.assert_allclose(
+                shapely.get_coordinates(shapely.geometry.shape(feature["geometry"])),
+                shapely.get_coordinates(shapely.geometry.shape(original["geometry"])),
+                atol=5e-7,
+            )
+
+    # Lower precision makes the layer smaller
+    fine = read_raw_layer(request_id, "grid")
+    coarse = read_raw_layer(request_id, "grid", precision=3)
+    assert len(json.dumps(coarse)) < len(json.dumps(fine))
+    assert coarse[0]["geometry"]["coordinates"][0][0] == [
+        round(v, 3) for v in fine[0]["geometry"]["coordinates"][0][0]
+    ]
+
+    # Another user does not get the layers of this run
+    with pytest.raises(HTTPException) as exc_info:
+        read_raw_layer(request_id, "grid", user_id="other_user")
+    assert exc_info.value.status_code == 404
+
+
+def test_raw_layer_endpoint_streams_ndjson(stubbed_riyadh_sources):
+    from fastapi.testclient import TestClient
+
+    from fastapi_app import app
+
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=5,
+        include_raw_data=True,
+    )
+    result = asyncio.run(get_clusters_for_sales_man(req))
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer token"}
+
+    # Only the token is checked, a GET has no body to match the user against
+    with patch("backend_common.auth.CONF.test_mode", False), patch(
+        "backend_common.auth.my_verify_id_token", return_value={"uid": "test_user"}
+    ):
+        response = client.get(
+            result["raw_cluster_data"]["places"],
+            params={"precision": 4},
+            headers=headers,
+        )
+        missing = client.get(
+            CONF.sales_man_raw_data.format(
+                user_id="test_user", request_id="missing", layer="grid"
+            ),
+            headers=headers,
+        )
+        foreign = client.get(
+            CONF.sales_man_raw_data.format(
+                user_id="other_user", request_id=result["request_id"], layer="grid"
+            ),
+            headers=headers,
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    features = [json.loads(line) for line in response.text.splitlines()]
+    assert len(features) == 300
+    assert {f["properties"]["group"] for f in features} <= set(range(5)) | {-1}
+    assert missing.status_code == 404
+    assert foreign.status_code == 403
+
+
+def test_raw_layer_of_unknown_run_or_layer_is_not_found(stubbed_riyadh_sources):
+    for request_id, layer in (("missing", "grid"), ("missing", "population")):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(territory_raw_layer_lines("test_user", request_id, layer))
+        assert exc_info.value.status_code == 404
+
+
+def test_generate_all_plots_saves_images_at_requested_dpi(tmp_path, monkeypatch):
+    monkeypatch.setattr(CONF, "cpu_pool_workers", 0)
+    monkeypatch.chdir(tmp_path)
+    grid = gpd.GeoDataFrame(
+        {
+            "number_of_persons": [1, 2, 3, 4],
+            "effective_population": [1.0, 2.0, 3.0, 4.0],
+            "number_of_supermarkets": [0, 1, 0, 1],
+            "number_of_potential_customers": [4, 3, 2, 1],
+            "group": [0, 0, 1, 1],
+        },
+        geometry=[box(46.6 + i * 0.01, 24.6, 46.61 + i * 0.01, 24.61) for i in range(4)],
+    )
+    places = gpd.GeoDataFrame(
+        {"group": [0, 1]}, geometry=[Point(46.605, 24.605), Point(46.635, 24.605)]
+    )
+
+    sizes = {}
+    with patch("sales_man_problem.ctx.add_basemap"):
+        for dpi in (50, 100):
+            urls = asyncio.run(
+                generate_all_plots(grid, places, f"dpi{dpi}", "20260101_000000", dpi)
+            )
+            assert urls == territory_plot_urls(f"dpi{dpi}", "20260101_000000")
+            paths = [tmp_path / url.lstrip("/") for url in urls.values()]
+            assert all(path.exists() for path in paths)
+            sizes[dpi] = paths[0].stat().st_size
+
+    # Inputs keep their geographic coordinates
+    assert grid.crs is None
+    assert sizes[100] > sizes[50]
+
+
+def test_rerun_with_other_salesman_count_reuses_cached_grid(stubbed_riyadh_sources):
+    def request(num_sales_man, boolean_query="supermarket", user_id="test_user"):
+        return ReqClustersForSalesManData(
+            user_id=user_id,
+            city_name="Riyadh",
+            country_name="Saudi Arabia",
+            boolean_query=boolean_query,
+            num_sales_man=num_sales_man,
+            plot_mode="skip",
+        )
+
+    with patch(
+        "sales_man_problem.build_market_grid", wraps=build_market_grid
+    ) as grid_stage:
+        first = asyncio.run(get_clusters_for_sales_man(request(5)))
+        second = asyncio.run(get_clusters_for_sales_man(request(8)))
+        assert grid_stage.call_count == 1
+        assert stubbed_riyadh_sources.fetches == ["population_income", "supermarket"]
+
+        # Another query of the same city only reuses the population data
+        asyncio.run(get_clusters_for_sales_man(request(5, "pharmacy")))
+        assert grid_stage.call_count == 2
+        assert stubbed_riyadh_sources.fetches == [
+            "population_income",
+            "supermarket",
+            "pharmacy",
+        ]
+
+        # Another user goes through fetch_dataset, and its purchase check, again
+        asyncio.run(get_clusters_for_sales_man(request(5, user_id="other_user")))
+        assert grid_stage.call_count == 3
+        assert stubbed_riyadh_sources.fetches[-1] == "supermarket"
+
+    assert len(first["territory_analytics"]) == 5
+    assert len(second["territory_analytics"]) == 8
+    assert (
+        first["metadata"]["total_customers"] == second["metadata"]["total_customers"]
+    )
+
+
+RIYADH_BOUNDS = (46.6012, 24.6021, 46.8397, 24.8463)
+
+
+def test_square_grid_cells_match_legacy_fishnet():
+    minx, miny, maxx, maxy = RIYADH_BOUNDS
+    grid_size = 0.0137
+    legacy = [
+        box(x, y, x + grid_size, y + grid_size)
+        for x in np.arange(minx, maxx, grid_size)
+        for y in np.arange(miny, maxy, grid_size)
+    ]
+
+    cells = square_grid_cells(minx, miny, maxx, maxy, grid_size)
+
+    assert len(cells) == len(legacy)
+    assert shapely.equals_exact(cells, np.array(legacy), tolerance=0).all()
+
+
+def test_hexagon_grid_cells_tile_bounds_with_uniform_neighbours():
+    minx, miny, maxx, maxy = RIYADH_BOUNDS
+    grid_size = 0.0137
+    lng_scale = 1 / np.cos(np.radians((miny + maxy) / 2))
+
+    cells = hexagon_grid_cells(minx, miny, maxx, maxy, grid_size)
+
+    # Covers the bounds without overlaps
+    union = shapely.union_all(cells)
+    assert union.contains(box(minx, miny, maxx, maxy))
+    np.testing.assert_allclose(shapely.area(cells).sum(), union.area, rtol=1e-9)
+    # Each hexagon has the ground area of a grid_size square
+    np.testing.assert_allclose(shapely.area(cells) / lng_scale, grid_size**2)
+
+    # All six neighbours sit at the same ground distance
+    centroids = shapely.centroid(cells)
+    xy = np.column_stack(
+        [shapely.get_x(centroids) / lng_scale, shapely.get_y(centroids)]
+    )
+    tree = shapely.STRtree(cells)
+    src, dst = tree.query(cells, predicate="dwithin", distance=1e-9)
+    keep = src != dst
+    distances = np.hypot(*(xy[src[keep]] - xy[dst[keep]]).T)
+    np.testing.assert_allclose(distances, distances[0], rtol=1e-9)
+    assert np.bincount(src[keep]).max() == 6
+
+
+def test_get_clusters_for_sales_man_hex_grid(stubbed_riyadh_sources):
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=10,
+        grid_shape="hex",
+        clustering_engine="balanced",
+        plot_mode="skip",
+    )
+
+    result = asyncio.run(get_clusters_for_sales_man(req))
+
+    assert result["success"] is True
+    assert result["metadata"]["clusters_created"] == 10
+
+
+def legacy_territory_analytics(masked_grided_data, places, num_sales_man):
+    """Original per-territory filter/union_all analytics of get_clusters_for_sales_man"""
+    total_customers = masked_grided_data["number_of_potential_customers"].sum()
+    analytics, boundaries = [], []
+    for group_id in range(num_sales_man):
+        data = masked_grided_data[masked_grided_data["group"] == group_id]
+        cells = len(data)
+        analytics.append(
+            {
+                "territory_id": group_id,
+                "grid_cells": cells,
+                "total_population": int(data["number_of_persons"].sum()),
+                "effective_population": round(data["effective_population"].sum(), 2),
+                "facility_count": int(data["number_of_supermarkets"].sum()),
+                "potential_customers": int(
+                    data["number_of_potential_customers"].sum()
+                ),
+                "market_share_percentage": round(
+                    data["number_of_potential_customers"].sum() / total_customers * 100,
+                    1,
+                ),
+                "avg_accessibility": round(data["effective_population"].mean(), 2),
+                "population_density": round(
+                    data["number_of_persons"].sum() / cells if cells else np.nan, 0
+                ),
+                "facility_density": round(
+                    data["number_of_supermarkets"].sum() / cells if cells else np.nan,
+                    2,
+                ),
+            }
+        )
+        boundaries.append(
+            {
+                "territory_id": group_id,
+                "boundary_geometry": data.union_all().convex_hull.__geo_interface__,
+                "centroid": data.geometry.centroid.union_all().__geo_interface__,
+                "area_km2": round(data.union_all().area * 111.32**2, 2),
+            }
+        )
+    return analytics, boundaries
+
+
+def test_build_territory_report_matches_legacy_loop():
+    rng = np.random.default_rng(4)
+    xs, ys = np.meshgrid(np.arange(20) * 0.01 + 46.6, np.arange(15) * 0.01 + 24.6)
+    grid = gpd.GeoDataFrame(
+        {
+            "number_of_persons": rng.integers(0, 5000, xs.size),
+            "effective_population": rng.uniform(0, 300, xs.size),
+            "number_of_supermarkets": rng.integers(0, 4, xs.size),
+            "number_of_potential_customers": rng.uniform(1, 900, xs.size),
+        },
+        geometry=[box(x, y, x + 0.01, y + 0.01) for x, y in zip(xs.ravel(), ys.ravel())],
+        crs=4326,
+    )
+    # Territory 6 stays empty and the last cells remain unassigned
+    labels = (np.arange(xs.size) * 6) // xs.size
+    labels[-7:] = -1
+    place_points = [
+        Point(x, y)
+        for x, y in zip(rng.uniform(46.6, 46.8, 200), rng.uniform(24.6, 24.75, 200))
+    ]
+    places = gpd.GeoDataFrame(geometry=place_points, crs=4326)
+    req = ReqClustersForSalesManData(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        num_sales_man=7,
+    )
+
+    report, labelled_grid, labelled_places = build_territory_report(
+        grid.copy(), places.copy(), labels, req
+    )
+
+    analytics, boundaries = legacy_territory_analytics(labelled_grid, places, 7)
+    for new, old in zip(report["territory_analytics"], analytics):
+        assert new.keys() == old.keys()
+        for key in old:
+            np.testing.assert_allclose(new[key], old[key], atol=0.011)
+    for new, old in zip(report["territory_boundaries"], boundaries):
+        assert new["area_km2"] == pytest.approx(old["area_km2"])
+        assert shapely.geometry.shape(new["boundary_geometry"]).equals(
+            shapely.geometry.shape(old["boundary_geometry"])
+        )
+        assert new["centroid"] == old["centroid"]
+
+
+def test_assign_places_to_territories_uses_containing_cell():
+    cells = gpd.GeoDataFrame(
+        {"group": [0.0, 0.0, 1.0, np.nan]},
+        geometry=[
+            box(0, 0, 1, 1),
+            box(1, 0, 2, 1),
+            box(2, 0, 3, 1),
+            box(3, 0, 4, 1),
+        ],
+    )
+    places = gpd.GeoDataFrame(
+        geometry=[
+            Point(0.5, 0.5),  # territory 0
+            Point(2.5, 0.5),  # territory 1
+            Point(3.5, 0.5),  # unassigned cell
+            Point(9.0, 9.0),  # outside the grid
+            Point(2.0, 0.5),  # border of territories 0 and 1, counted once
+            Point(1.5, 0.5),  # territory 0
+        ],
+        index=[10, 11, 12, 13, 14, 15],
+    )
+
+    groups = assign_places_to_territories(places, cells)
+
+    assert groups.tolist() == [0, 1, -1, -1, 0, 0]
+
+
+def test_assign_places_to_territories_without_places_or_territories():
+    cells = gpd.GeoDataFrame({"group": [np.nan]}, geometry=[box(0, 0, 1, 1)])
+    places = gpd.GeoDataFrame(geometry=[Point(0.5, 0.5)])
+
+    assert assign_places_to_territories(places, cells).tolist() == [-1]
+    assert assign_places_to_territories(places.iloc[:0], cells).tolist() == []
+
+
+def riyadh_grid_inputs(n_blocks=400, n_places=150, seed=5):
+    rng = np.random.default_rng(seed)
+    lngs = rng.uniform(46.60, 46.80, n_blocks)
+    lats = rng.uniform(24.60, 24.80, n_blocks)
+    cells = [box(x, y, x + 0.0005, y + 0.0005) for x, y in zip(lngs, lats)]
+    population = gpd.GeoDataFrame(
+        {"Population_Count": rng.integers(100, 5000, n_blocks)}, geometry=cells
+    )
+    income = rng.uniform(2000, 20000, n_blocks)
+    income[::7] = np.nan
+    weights = gpd.GeoDataFrame({"income": income}, geometry=cells)
+    place_lngs = rng.uniform(46.61, 46.79, n_places)
+    place_lats = rng.uniform(24.61, 24.79, n_places)
+    places = gpd.GeoDataFrame(
+        {"longitude": place_lngs, "latitude": place_lats},
+        geometry=gpd.points_from_xy(place_lngs, place_lats),
+    )
+    return population, places, weights
+
+
+def test_get_grids_of_data_diagnostics_do_not_change_the_grid():
+    population, places, weights = riyadh_grid_inputs()
+    diagnostics = {}
+
+    plain = get_grids_of_data(population, places, weights, 2.5)
+    checked = get_grids_of_data(
+        population, places, weights, 2.5, diagnostics=diagnostics
+    )
+
+    assert plain.equals(checked)
+    assert set(diagnostics) == {
+        "accessibility",
+        "income",
+        "market",
+        "spatial_join",
+        "aggregation",
+    }
+    assert diagnostics["income"]["nan_count"] == 58
+    assert diagnostics["income"]["filled_with"] == "median"
+    assert diagnostics["market"]["od_pairs"] == diagnostics["accessibility"]["sum"]
+    assert diagnostics["aggregation"]["cells_with_data"] == len(plain)
+    # Census blocks straddling a cell edge are not within any cell
+    aggregation = diagnostics["aggregation"]
+    assert 0 < aggregation["population_joined"] < aggregation["population_total"]
+    assert len(aggregation["failed_population_sample"]) == 5
+    spatial_join = diagnostics["spatial_join"]
+    assert spatial_join["sample_joined_intersects"] == 5
+    assert spatial_join["sample_joined_within"] <= 5
+    # The payload goes into the json response as is
+    json.dumps(diagnostics)
+
+
+def test_get_grids_of_data_skips_diagnostics_by_default():
+    population, places, weights = riyadh_grid_inputs()
+
+    with patch("sales_man_problem.grid_diagnostics") as checks:
+        get_grids_of_data(population, places, weights, 2.5)
+
+    assert checks.mock_calls == []
+
+
+def test_get_clusters_for_sales_man_diagnostics_payload(stubbed_riyadh_sources):
+    def request(diagnostics):
+        return ReqClustersForSalesManData(
+            user_id="test_user",
+            city_name="Riyadh",
+            country_name="Saudi Arabia",
+            boolean_query="supermarket",
+            num_sales_man=5,
+            plot_mode="skip",
+            diagnostics=diagnostics,
+        )
+
+    with patch(
+        "sales_man_problem.build_market_grid", wraps=build_market_grid
+    ) as grid_stage:
+        plain = asyncio.run(get_clusters_for_sales_man(request(False)))
+        # The cached grid has no diagnostics, it is rebuilt once to collect them
+        checked = asyncio.run(get_clusters_for_sales_man(request(True)))
+        cached = asyncio.run(get_clusters_for_sales_man(request(True)))
+        assert grid_stage.call_count == 2
+
+    assert "diagnostics" not in plain
+    assert checked["diagnostics"] == cached["diagnostics"]
+    assert checked["diagnostics"]["grid"]["aggregation"]["population_total"] == 600
+    assert checked["territory_analytics"] == plain["territory_analytics"]
+
+
+def test_scenarios_share_data_load_and_grids(stubbed_riyadh_sources):
+    scenarios = [
+        {"num_sales_man": 3},
+        {"num_sales_man": 8},
+        {"num_sales_man": 5, "distance_limit": 4.0},
+        {"num_sales_man": 5, "clustering_engine": "balanced"},
+    ]
+    req = ReqClustersForSalesManScenarios(
+        user_id="test_user",
+        city_name="Riyadh",
+        country_name="Saudi Arabia",
+        boolean_query="supermarket",
+        scenarios=scenarios,
+    )
+
+    with patch(
+        "sales_man_problem.build_market_grid", wraps=build_market_grid
+    ) as grid_stage:
+        batch = asyncio.run(get_clusters_for_sales_man_scenarios(req))
+        # One grid per distance limit, the city data is loaded once
+        assert grid_stage.call_count == 2
+    assert stubbed_riyadh_sources.fetches == ["population_income", "supermarket"]
+
+    # Each scenario matches its single request, which reuses the cached grids
+    for scenario, result in zip(scenarios, batch["scenarios"]):
+        single = asyncio.run(
+            get_clusters_for_sales_man(
+                ReqClustersForSalesManData(
+                    user_id="test_user",
+                    city_name="Riyadh",
+                    country_name="Saudi Arabia",
+                    boolean_query="supermarket",
+                    plot_mode="skip",
+                    **scenario,
+                )
+            )
+        )
+        assert result["territory_analytics"] == single["territory_analytics"]
+        assert len(result["plots"]) == len(TERRITORY_PLOTS)
+    assert stubbed_riyadh_sources.fetches == ["population_income", "supermarket"]
+
+    assert [row["num_sales_man"] for row in batch["comparison"]] == [3, 8, 5, 5]
+    assert [row["distance_limit"] for row in batch["comparison"]] == [
+        2.5,
+        2.5,
+        4.0,
+        2.5,
+    ]
+    assert batch["comparison"][0]["clusters_created"] == 3
+    # Every scenario schedules its own plots
+    assert len(stubbed_riyadh_sources.tasks) == len(scenarios)
+
+
+def test_rerun_repairs_previous_territories(stubbed_riyadh_sources):
+    def request(num_sales_man, user_id="test_user", **kwargs):
+        return ReqClustersForSalesManData(
+            user_id=user_id,
+            city_name="Riyadh",
+            country_name="Saudi Arabia",
+            boolean_query="supermarket",
+            num_sales_man=num_sales_man,
+            clustering_engine="balanced",
+            plot_mode="skip",
+            **kwargs,
+        )
+
+    first = asyncio.run(get_clusters_for_sales_man(request(6)))
+    repaired = asyncio.run(
+        get_clusters_for_sales_man(
+            request(7, previous_request_id=first["request_id"])
+        )
+    )
+
+    metadata = repaired["metadata"]
+    assert metadata["clusters_created"] == 7
+    assert metadata["previous_request_id"] == first["request_id"]
+    assert 0 < metadata["cells_reassigned"] < 0.5 * sum(
+        t["grid_cells"] for t in first["territory_analytics"]
+    )
+
+    # The repaired run can be repaired in turn
+    again = asyncio.run(
+        get_clusters_for_sales_man(
+            request(7, previous_request_id=repaired["request_id"])
+        )
+    )
+    assert again["territory_analytics"] == repaired["territory_analytics"]
+
+    with pytest.raises(ValueError, match="not found"):
+        asyncio.run(
+            get_clusters_for_sales_man(request(7, previous_request_id="missing"))
+        )
+    # Only the user of a run can repair it
+    with pytest.raises(ValueError, match="not found"):
+        asyncio.run(
+            get_clusters_for_sales_man(
+                request(
+                    7, user_id="other_user", previous_request_id=first["request_id"]
+                )
+            )
+        )
+
+
+def test_road_speed_provider_matches_scaled_haversine(jeddah_points):
+    origin_lat, origin_lng, dest_lat, dest_lng = jeddah_points
+    road = get_travel_cost_provider("road_speed")
+    minutes_per_km = road.circuity * 60.0 / road.speed_kmh
+
+    expected = get_distance_backend("dense").accessibility(
+        origin_lat, origin_lng, dest_lat, dest_lng, 10.0 / minutes_per_km
+    )
+    for backend in ("dense", "chunked"):
+        indptr, indices = get_distance_backend(backend).accessibility(
+            origin_lat, origin_lng, dest_lat, dest_lng, 10.0, road.cost_block
+        )
+        assert np.array_equal(indptr, expected[0])
+        assert np.array_equal(indices, expected[1])
+
+
+@pytest.fixture
+def riyadh_cost_matrix(monkeypatch, tmp_path):
+    """Zone matrix of Riyadh whose drive times are twice the road speed approximation"""
+    monkeypatch.setattr(CONF, "travel_cost_matrix_dir", str(tmp_path / "matrices"))
+    zone_lng, zone_lat = np.meshgrid(
+        np.linspace(46.60, 46.80, 15), np.linspace(24.60, 24.80, 15)
+    )
+    zone_lng, zone_lat = zone_lng.ravel(), zone_lat.ravel()
+    road = get_travel_cost_provider("road_speed")
+    minutes = 2 * road.cost_block(zone_lat, zone_lng, zone_lat, zone_lng)
+    save_travel_cost_matrix("Saudi Arabia", "Riyadh", zone_lng, zone_lat, minutes)
+    return zone_lng, zone_lat, minutes
+
+
+def test_matrix_provider_adds_access_legs_to_zone_times(riyadh_cost_matrix):
+    zone_lng, zone_lat, minutes = riyadh_cost_matrix
+    provider = get_travel_cost_provider("matrix", "Saudi Arabia", "Riyadh")
+    # Points next to zones 3, 17 and 200
+    lat = zone_lat[[3, 17, 200]] + 0.001
+    lng = zone_lng[[3, 17, 200]] - 0.001
+
+    block = provider.cost_block(lat, lng, lat[::-1], lng[::-1])
+
+    access = haversine_km(lat, lng, zone_lat[[3, 17, 200]], zone_lng[[3, 17, 200]])
+    access = np.diagonal(access) * provider.access.circuity * 60.0 / provider.access.speed_kmh
+    expected = (
+        minutes[np.ix_([3, 17, 200], [200, 17, 3])]
+        + access[:, None]
+        + access[::-1][None, :]
+    )
+    np.testing.assert_allclose(block, expected, rtol=1e-6)
+
+    # Pool workers receive the provider pickled and reopen the memory map
+    restored = pickle.loads(pickle.dumps(provider))
+    np.testing.assert_allclose(
+        restored.cost_block(lat, lng, lat[::-1], lng[::-1]), block
+    )
+
+
+def test_matrix_provider_snaps_destinations_once(riyadh_cost_matrix):
+    provider = get_travel_cost_provider("matrix", "Saudi Arabia", "Riyadh")
+    rng = np.random.default_rng(5)
+    origin_lat, origin_lng = rng.uniform(24.6, 24.8, 300), rng.uniform(46.6, 46.8, 300)
+    dest_lat, dest_lng = rng.uniform(24.6, 24.8, 40), rng.uniform(46.6, 46.8, 40)
+    backend = ChunkedDistanceBackend(max_block_bytes=6 * 8 * 40 * 50)
+
+    expected = DenseDistanceBackend().accessibility(
+        origin_lat, origin_lng, dest_lat, dest_lng, 10.0, provider.cost_block
+    )
+    with patch.object(provider, "snap", wraps=provider.snap) as snap:
+        result = backend.accessibility(
+            origin_lat,
+            origin_lng,
+            dest_lat,
+            dest_lng,
+            10.0,
+            provider.bind_destinations(dest_lat, dest_lng),
+        )
+
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
+    # Once for the destinations, then once per block of 50 origins
+    assert snap.call_count == 1 + 6
+
+
+def test_travel_cost_provider_errors(tmp_path, monkeypatch):
+    monkeypatch.setattr(CONF, "travel_cost_matrix_dir", str(tmp_path))
+    with pytest.raises(ValueError, match="Unknown travel cost provider"):
+        get_travel_cost_provider("isochrones")
+    with pytest.raises(ValueError, match="No travel cost matrix"):
+        get_travel_cost_provider("matrix", "Saudi Arabia", "Riyadh")
+
+
+def test_get_clusters_for_sales_man_drive_time_accessibility(
+    stubbed_riyadh_sources, riyadh_cost_matrix
+):
+    def request(travel_cost, distance_limit):
+        return ReqClustersForSalesManData(
+            user_id="test_user",
+            city_name="Riyadh",
+            country_name="Saudi Arabia",
+            boolean_query="supermarket",
+            num_sales_man=5,
+            plot_mode="skip",
+            travel_cost=travel_cost,
+            distance_limit=distance_limit,
+        )
+
+    road = get_travel_cost_provider("road_speed")
+    km = asyncio.run(get_clusters_for_sales_man(request("haversine", 2.0)))
+    minutes = asyncio.run(
+        get_clusters_for_sales_man(
+            request("road_speed", 2.0 * road.circuity * 60.0 / road.speed_kmh)
+        )
+    )
+    matrix = asyncio.run(get_clusters_for_sales_man(request("matrix", 10.0)))
+
+    # A drive time limit equivalent to the km limit gives the same territories
+    assert minutes["territory_analytics"] == km["territory_analytics"]
+    assert minutes["metadata"]["travel_cost"] == "road_speed"
+    assert minutes["metadata"]["distance_limit_unit"] == "minutes"
+    assert km["metadata"]["distance_limit_unit"] == "km"
+    assert matrix["metadata"]["clusters_created"] == 5
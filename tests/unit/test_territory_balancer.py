@@ -0,0 +1,218 @@
+import time
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from sales_man_problem import (
+    assign_greedy_territories,
+    haversine_km,
+    hexagon_grid_cells,
+)
+from territory_balancer import (
+    assign_balanced_territories,
+    build_adjacency,
+    match_previous_labels,
+    repair_territories,
+)
+
+
+def make_grid(n_cols: int, n_rows: int, size: float = 0.01) -> gpd.GeoDataFrame:
+    """Fishnet built the same way as create_grid, including its float slivers"""
+    cells = [
+        box(x, y, x + size, y + size)
+        for x in np.arange(46.6, 46.6 + n_cols * size, size)[:n_cols]
+        for y in np.arange(24.6, 24.6 + n_rows * size, size)[:n_rows]
+    ]
+    return gpd.GeoDataFrame(geometry=cells, crs="EPSG:4326")
+
+
+def is_contiguous(labels, region, indptr, indices) -> bool:
+    members = set(np.flatnonzero(labels == region).tolist())
+    start = members.pop()
+    stack, seen = [start], {start}
+    while stack:
+        cell = stack.pop()
+        for nbr in indices[indptr[cell] : indptr[cell + 1]]:
+            nbr = int(nbr)
+            if nbr in members and nbr not in seen:
+                seen.add(nbr)
+                stack.append(nbr)
+    return seen >= members
+
+
+@pytest.mark.parametrize(
+    "contiguity, expected_degrees", [("rook", {2, 3, 4}), ("queen", {3, 5, 8})]
+)
+def test_build_adjacency_on_regular_grid(contiguity, expected_degrees):
+    indptr, indices = build_adjacency(make_grid(5, 4), contiguity)
+
+    assert set(np.diff(indptr).tolist()) == expected_degrees
+    # Symmetric graph
+    pairs = set(
+        zip(np.repeat(np.arange(20), np.diff(indptr)).tolist(), indices.tolist())
+    )
+    assert all((b, a) in pairs for a, b in pairs)
+
+
+@pytest.mark.parametrize("contiguity", ["rook", "queen"])
+def test_build_adjacency_on_hexagonal_grid(contiguity):
+    cells = gpd.GeoDataFrame(
+        geometry=hexagon_grid_cells(46.6, 24.6, 46.7, 24.7, 0.01), crs="EPSG:4326"
+    )
+
+    indptr, indices = build_adjacency(cells, contiguity)
+
+    degrees = np.diff(indptr)
+    assert degrees.max() == 6
+    assert set(degrees.tolist()) <= {2, 3, 4, 5, 6}
+
+
+def test_balanced_territories_on_hexagonal_grid():
+    cells = gpd.GeoDataFrame(
+        geometry=hexagon_grid_cells(46.6, 24.6, 46.9, 24.9, 0.01), crs="EPSG:4326"
+    )
+    shares = np.random.default_rng(2).gamma(2.0, 500.0, len(cells))
+
+    labels = assign_balanced_territories(cells, shares, 10)
+
+    indptr, indices = build_adjacency(cells)
+    assert (labels >= 0).all()
+    assert all(is_contiguous(labels, r, indptr, indices) for r in range(10))
+
+
+def test_build_adjacency_rejects_unknown_contiguity():
+    with pytest.raises(ValueError):
+        build_adjacency(make_grid(2, 2), "bishop")
+
+
+@pytest.mark.parametrize("contiguity", ["rook", "queen"])
+def test_balanced_territories_are_complete_contiguous_and_balanced(contiguity):
+    grid = make_grid(45, 45)
+    rng = np.random.default_rng(5)
+    shares = rng.gamma(2.0, 500.0, len(grid))
+
+    start = time.perf_counter()
+    labels = assign_balanced_territories(
+        grid, shares, 12, contiguity=contiguity, time_budget=1.0
+    )
+    elapsed = time.perf_counter() - start
+
+    indptr, indices = build_adjacency(grid, contiguity)
+    assert (labels >= 0).all()
+    assert set(labels.tolist()) == set(range(12))
+    assert all(is_contiguous(labels, r, indptr, indices) for r in range(12))
+
+    loads = np.bincount(labels, weights=shares, minlength=12)
+    assert np.std(loads) / np.mean(loads) < 0.1
+    # ~2k cells should stay interactive
+    assert elapsed < 3.0
+
+
+def test_balanced_engine_balances_better_than_greedy():
+    grid = make_grid(30, 30)
+    rng = np.random.default_rng(9)
+    shares = rng.gamma(2.0, 500.0, len(grid))
+    centroids = grid.geometry.centroid
+    matrix = haversine_km(
+        centroids.y.values, centroids.x.values, centroids.y.values, centroids.x.values
+    )
+
+    greedy = assign_greedy_territories(matrix, shares, 8)
+    balanced = assign_balanced_territories(grid, shares, 8)
+
+    greedy_loads = np.bincount(greedy[greedy >= 0], weights=shares[greedy >= 0])
+    balanced_loads = np.bincount(balanced, weights=shares)
+    assert np.std(balanced_loads) < np.std(greedy_loads)
+
+
+def test_balanced_territories_never_share_a_seed():
+    # Stacked duplicates of a row of cells, fewer distinct centroids than salesmen
+    row = make_grid(3, 1)
+    cells = gpd.GeoDataFrame(geometry=list(row.geometry) * 2, crs="EPSG:4326")
+    shares = np.ones(len(cells))
+
+    labels = assign_balanced_territories(cells, shares, 5)
+
+    assert set(labels.tolist()) == set(range(5))
+
+
+def test_more_salesmen_than_cells_is_rejected():
+    cells = make_grid(2, 2)
+    shares = np.ones(len(cells))
+
+    with pytest.raises(ValueError, match="Cannot create 5 territories from 4 grid cells"):
+        assign_balanced_territories(cells, shares, 5)
+    with pytest.raises(ValueError, match="Cannot create 5 territories"):
+        repair_territories(cells, shares, np.zeros(4, dtype=np.int64), 5)
+
+
+@pytest.fixture(scope="module")
+def solved_grid():
+    cells = make_grid(30, 30)
+    shares = np.random.default_rng(4).gamma(2.0, 500.0, len(cells))
+    labels = assign_balanced_territories(cells, shares, 8, time_budget=5.0)
+    return cells, shares, labels
+
+
+def test_repair_adding_a_salesman_splits_one_territory(solved_grid):
+    cells, shares, previous = solved_grid
+
+    start = time.perf_counter()
+    labels = repair_territories(cells, shares, previous, 9, time_budget=5.0)
+    repair_time = time.perf_counter() - start
+
+    indptr, indices = build_adjacency(cells)
+    assert set(labels.tolist()) == set(range(9))
+    assert all(is_contiguous(labels, r, indptr, indices) for r in range(9))
+    # Most cells keep their territory, unlike a full recompute
+    kept = np.mean(labels == previous)
+    recomputed = assign_balanced_territories(cells, shares, 9, time_budget=5.0)
+    assert kept > 0.75
+    assert kept > np.mean(recomputed == previous)
+    loads = np.bincount(labels, weights=shares)
+    assert np.std(loads) / np.mean(loads) < 0.25
+    assert repair_time < 5.0
+
+
+def test_repair_removing_a_salesman_merges_one_territory(solved_grid):
+    cells, shares, previous = solved_grid
+
+    labels = repair_territories(cells, shares, previous, 7, time_budget=5.0)
+
+    indptr, indices = build_adjacency(cells)
+    assert set(labels.tolist()) == set(range(7))
+    assert all(is_contiguous(labels, r, indptr, indices) for r in range(7))
+    assert np.mean(labels == previous) > 0.6
+
+
+def test_repair_assigns_new_cells_to_adjacent_territories(solved_grid):
+    cells, shares, previous = solved_grid
+    # A new column of cells east of the previous grid
+    grown = make_grid(31, 30)
+    grown_shares = np.concatenate([shares, np.full(30, 100.0)])
+    previous_labels = match_previous_labels(
+        grown,
+        np.column_stack(
+            [cells.geometry.centroid.x, cells.geometry.centroid.y]
+        ),
+        previous,
+    )
+    assert np.array_equal(previous_labels[:900], previous)
+    assert (previous_labels[900:] == -1).all()
+
+    labels = repair_territories(grown, grown_shares, previous_labels, 8)
+
+    indptr, indices = build_adjacency(grown)
+    assert (labels >= 0).all()
+    assert all(is_contiguous(labels, r, indptr, indices) for r in range(8))
+    assert np.mean(labels[:900] == previous) > 0.9
+
+
+def test_repair_without_previous_cells_solves_from_scratch(solved_grid):
+    cells, shares, _ = solved_grid
+
+    labels = repair_territories(cells, shares, np.full(len(cells), -1), 5)
+
+    assert set(labels.tolist()) == set(range(5))
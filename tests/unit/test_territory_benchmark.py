@@ -0,0 +1,100 @@
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+import shapely
+
+from synthetic_city import generate_synthetic_city
+from territory_benchmark import (
+    BENCHMARK_STAGES,
+    StageProfiler,
+    benchmark_request,
+    profile_territory_pipeline,
+)
+
+
+def test_synthetic_city_is_deterministic():
+    city = generate_synthetic_city(n_blocks=500, n_places=80, seed=3)
+    same = generate_synthetic_city(n_blocks=500, n_places=80, seed=3)
+    other = generate_synthetic_city(n_blocks=500, n_places=80, seed=4)
+
+    assert city.bounding_box == same.bounding_box
+    assert city.population.equals(same.population)
+    assert city.income.equals(same.income)
+    assert city.places == same.places
+    assert not city.population.equals(other.population)
+
+
+def test_synthetic_city_shapes():
+    city = generate_synthetic_city(
+        n_blocks=2_000, n_places=300, extent_km=10, missing_income_share=0.1
+    )
+
+    assert len(city.population) == len(city.income) == 2_000
+    assert len(city.places["features"]) == 300
+    assert city.population["Population_Count"].min() > 0
+    assert 0.05 < city.income["income"].isna().mean() < 0.15
+
+    boundary = shapely.Polygon(city.bounding_box)
+    assert boundary.buffer(0.001).contains(city.population.geometry).all()
+    # Like real place data, a few places fall outside the city and are filtered out
+    places = shapely.points(
+        [f["geometry"]["coordinates"] for f in city.places["features"]]
+    )
+    inside = shapely.contains(boundary, places)
+    assert 0.5 < inside.mean() < 1.0
+    # The bounding box is about extent_km wide
+    (min_lng, min_lat), _, (max_lng, max_lat), _ = city.bounding_box
+    assert (max_lat - min_lat) * 111 == pytest.approx(10)
+    assert city.country_city_data[city.country_name][0]["name"] == city.city_name
+
+
+def test_stage_profiler_nested_stages():
+    profiler = StageProfiler()
+    tracemalloc.start()
+    try:
+        with profiler.stage("grid"):
+            np.ones(2**20)
+            with profiler.stage("accessibility"):
+                time.sleep(0.05)
+                big = np.ones(2**22)
+                del big
+            time.sleep(0.02)
+        with profiler.stage("grid"):
+            pass
+    finally:
+        tracemalloc.stop()
+
+    report = profiler.report()
+    assert list(report) == ["grid", "accessibility"]
+    assert report["grid"]["calls"] == 2
+    # Nested time is only counted once, in the nested stage
+    assert report["accessibility"]["seconds"] >= 0.05
+    assert 0.02 <= report["grid"]["seconds"] < report["accessibility"]["seconds"]
+    # The nested peak counts towards the enclosing stage
+    assert report["accessibility"]["peak_bytes"] >= 8 * 2**22
+    assert report["grid"]["peak_bytes"] >= report["accessibility"]["peak_bytes"]
+
+
+def served_plots() -> set[str]:
+    return set(os.listdir("static/plots")) if os.path.isdir("static/plots") else set()
+
+
+def test_profile_territory_pipeline_offline():
+    city = generate_synthetic_city(n_blocks=600, n_places=120, extent_km=8, seed=1)
+    req = benchmark_request(city, num_sales_man=5, plot_dpi=20)
+    static_plots = served_plots()
+
+    result, report = profile_territory_pipeline(city, req)
+
+    assert result["success"] is True
+    assert len(result["territory_analytics"]) == 5
+    assert tuple(report) == BENCHMARK_STAGES
+    for stats in report.values():
+        assert stats["calls"] == 1
+        assert stats["seconds"] > 0
+        assert stats["peak_bytes"] >= 0
+    # Plots go to a temporary directory, not the served static files
+    assert served_plots() == static_plots
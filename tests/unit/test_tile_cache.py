@@ -0,0 +1,120 @@
+import os
+from unittest.mock import patch
+
+import contextily as ctx
+import geopandas as gpd
+import numpy as np
+import pytest
+from contextily import tile as ctx_tile
+from shapely.geometry import box
+
+from config_factory import CONF
+from sales_man_problem import plot_results
+from tile_cache import (
+    auto_zoom,
+    city_bounds,
+    configure_tile_cache,
+    enforce_tile_cache_limit,
+    warm_city_tiles,
+)
+
+
+@pytest.fixture
+def tile_server(tmp_path, monkeypatch):
+    """Isolated cache directory and a fake tile download that counts requests"""
+    monkeypatch.setattr(CONF, "tile_cache_dir", str(tmp_path / "tiles"))
+    monkeypatch.setattr(
+        ctx_tile.memory.store_backend, "location", ctx_tile.memory.store_backend.location
+    )
+    requests = []
+
+    def fake_retryer(tile_url, wait, max_retries, headers, timeout=None):
+        requests.append(tile_url)
+        return np.full((256, 256, 4), 200, dtype=np.uint8)
+
+    monkeypatch.setattr(ctx_tile, "_retryer", fake_retryer)
+    return requests
+
+
+def cache_size(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(directory)
+        for name in files
+    )
+
+
+def test_warmed_city_plots_without_network(tile_server, tmp_path, monkeypatch):
+    n_tiles = warm_city_tiles("Saudi Arabia", "Riyadh")
+    assert n_tiles == len(tile_server) > 0
+
+    def offline(*args, **kwargs):
+        raise AssertionError("tile requested from the network")
+
+    monkeypatch.setattr(ctx_tile, "_retryer", offline)
+    west, south, east, north = city_bounds("Saudi Arabia", "Riyadh")
+    xs, ys = np.linspace(west, east, 5), np.linspace(south, north, 5)
+    grid = gpd.GeoDataFrame(
+        {"value": np.arange(16)},
+        geometry=[box(x0, y0, x1, y1) for x0, x1 in zip(xs, xs[1:]) for y0, y1 in zip(ys, ys[1:])],
+        crs=4326,
+    )
+
+    url = plot_results(
+        grid,
+        ["value"],
+        1,
+        1,
+        ["Greens"],
+        save_to_file=True,
+        filename="offline",
+        static_dir=str(tmp_path / "plots"),
+        dpi=50,
+    )
+
+    assert os.path.exists(tmp_path / "plots" / url.split("/")[-1])
+
+
+def test_rewarming_uses_the_cache(tile_server):
+    warm_city_tiles("Saudi Arabia", "Riyadh", zoom_levels=[10])
+    downloaded = len(tile_server)
+
+    warm_city_tiles("Saudi Arabia", "Riyadh", zoom_levels=[10])
+
+    assert len(tile_server) == downloaded
+
+
+def test_tile_cache_size_is_bounded(tile_server, monkeypatch):
+    warm_city_tiles("Saudi Arabia", "Riyadh", zoom_levels=[11])
+    full_size = cache_size(CONF.tile_cache_dir)
+
+    monkeypatch.setattr(CONF, "tile_cache_max_bytes", full_size // 2)
+    enforce_tile_cache_limit()
+
+    assert 0 < cache_size(CONF.tile_cache_dir) <= full_size // 2
+
+
+def test_city_bounds_unknown_city():
+    with pytest.raises(ValueError):
+        city_bounds("Saudi Arabia", "Atlantis")
+
+
+def test_tile_cache_is_configured_once(tile_server, monkeypatch):
+    monkeypatch.setattr(ctx_tile, "memory", ctx_tile.memory)
+    with patch("tile_cache.ctx.set_cache_dir", wraps=ctx.set_cache_dir) as set_cache_dir:
+        for _ in range(3):
+            configure_tile_cache()
+            enforce_tile_cache_limit()
+
+    set_cache_dir.assert_called_once_with(CONF.tile_cache_dir)
+
+
+def test_auto_zoom_matches_contextily():
+    if not hasattr(ctx_tile, "_calculate_zoom"):
+        pytest.skip("contextily no longer has the private helper to compare with")
+    for bounds in [
+        city_bounds("Saudi Arabia", "Riyadh"),
+        (46.6, 24.6, 46.7, 24.7),
+        (-180.0, -85.0, 180.0, 85.0),
+    ]:
+        assert auto_zoom(*bounds) == ctx_tile._calculate_zoom(*bounds)
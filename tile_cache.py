@@ -0,0 +1,120 @@
+import argparse
+import logging
+import math
+import os
+from typing import Optional
+
+import contextily as ctx
+import mercantile
+from contextily import tile as ctx_tile
+
+from config_factory import CONF
+from constants import load_country_city
+
+
+logger = logging.getLogger(__name__)
+
+# Basemap of the territory plots
+BASEMAP_SOURCE = ctx.providers.CartoDB.Positron
+
+
+def configure_tile_cache():
+    """
+    Points contextily's tile cache at `CONF.tile_cache_dir` instead of a per-session temp
+    directory. Idempotent, every process that plots (including pool workers) calls it
+    """
+    # joblib keeps its files in a "joblib" directory under the cache directory
+    location = os.path.join(CONF.tile_cache_dir, "joblib")
+    if ctx_tile.memory.store_backend.location != location:
+        os.makedirs(CONF.tile_cache_dir, exist_ok=True)
+        ctx.set_cache_dir(CONF.tile_cache_dir)
+
+
+def enforce_tile_cache_limit():
+    """Evicts the least recently used tiles until the cache fits `CONF.tile_cache_max_bytes`"""
+    configure_tile_cache()
+    ctx_tile.memory.reduce_size(bytes_limit=CONF.tile_cache_max_bytes)
+
+
+def auto_zoom(west: float, south: float, east: float, north: float) -> int:
+    """Zoom level contextily picks for `zoom="auto"` on these lon/lat bounds"""
+    zoom_lng = math.ceil(math.log2(360 * 2.0 / (east - west)))
+    zoom_lat = math.ceil(math.log2(360 * 2.0 / (north - south)))
+    return min(zoom_lng, zoom_lat)
+
+
+def city_bounds(country_name: str, city_name: str) -> tuple[float, float, float, float]:
+    """West, south, east, north of a city bounding box in `load_country_city()`"""
+    for city in load_country_city().get(country_name, []):
+        if city["name"] == city_name:
+            lngs = [lng for lng, _ in city["bounding_box"]]
+            lats = [lat for _, lat in city["bounding_box"]]
+            return min(lngs), min(lats), max(lngs), max(lats)
+    raise ValueError(f"City not found: {city_name}")
+
+
+def warm_city_tiles(
+    country_name: str,
+    city_name: str,
+    zoom_levels: Optional[list[int]] = None,
+) -> int:
+    """
+    Downloads the basemap tiles of a city into the cache so its plots render offline.
+
+    args:
+    ----
+    `country_name`, `city_name` select the bounding box from `load_country_city()`
+    `zoom_levels` default to the zoom contextily picks for the whole city, up to two levels
+    deeper for plots of a part of the city
+
+    return:
+    ------
+    the number of tiles covering the city at the warmed zoom levels
+    """
+    configure_tile_cache()
+    west, south, east, north = city_bounds(country_name, city_name)
+    if zoom_levels is None:
+        city_zoom = auto_zoom(west, south, east, north)
+        zoom_levels = list(range(city_zoom - 1, city_zoom + 3))
+
+    n_tiles = 0
+    for zoom in zoom_levels:
+        # Same call add_basemap makes, so the cached entries match its requests
+        ctx.bounds2img(
+            west, south, east, north, zoom=zoom, source=BASEMAP_SOURCE, ll=True
+        )
+        n_tiles += len(list(mercantile.tiles(west, south, east, north, [zoom])))
+
+    logger.info(
+        f"Warmed {n_tiles} tiles for {city_name}, {country_name} at zoom {zoom_levels}"
+    )
+    enforce_tile_cache_limit()
+    return n_tiles
+
+
+def warm_all_cities(zoom_levels: Optional[list[int]] = None) -> int:
+    """Warms the tile cache for every city in `load_country_city()`"""
+    n_tiles = 0
+    for country_name, cities in load_country_city().items():
+        for city in cities:
+            try:
+                n_tiles += warm_city_tiles(country_name, city["name"], zoom_levels)
+            except Exception as e:
+                logger.error(f"Could not warm tiles for {city['name']}: {str(e)}")
+    return n_tiles
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-warm the basemap tile cache")
+    parser.add_argument("--country", help="country name, all cities if omitted")
+    parser.add_argument("--city", help="city name, all cities of the country if omitted")
+    parser.add_argument("--zoom", type=int, nargs="*", help="zoom levels to warm")
+    args = parser.parse_args()
+
+    if args.country and args.city:
+        warm_city_tiles(args.country, args.city, args.zoom)
+    elif args.country:
+        for city in load_country_city().get(args.country, []):
+            warm_city_tiles(args.country, city["name"], args.zoom)
+    else:
+        warm_all_cities(args.zoom)
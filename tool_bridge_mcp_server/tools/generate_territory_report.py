@@ -41,6 +41,14 @@ def safe_get(data: Dict, key: str, default: Any = None) -> Any:
     """Safely extract value from dictionary with default."""
     return data.get(key, default) if data else default
 
+def format_distance_limit(metadata: Dict) -> str:
+    """Distance limit with its unit, km or drive minutes depending on the travel cost."""
+    if safe_get(metadata, 'distance_limit') is None:
+        # Analyses stored before the limit carried its unit
+        return f"{safe_get(metadata, 'distance_limit_km', 3.0)}km"
+    unit = safe_get(metadata, 'distance_limit_unit', 'km')
+    return f"{metadata['distance_limit']}km" if unit == 'km' else f"{metadata['distance_limit']} {unit}"
+
 def safe_divide(numerator: float, denominator: float, default: float = 0.0) -> float:
     """Safely divide two numbers, returning default if denominator is zero."""
     return numerator / denominator if denominator != 0 else default
@@ -240,7 +248,7 @@ def generate_equity_analysis(performance_metrics: Dict) -> str:
     return content
 
 def generate_common_sections(metadata: Dict, business_insights: Dict, performance_metrics: Dict, 
-                           territory_metrics: Dict, clusters_created: int, distance_limit: float) -> Dict[str, str]:
+                           territory_metrics: Dict, clusters_created: int, distance_limit: str) -> Dict[str, str]:
     """Generate common sections used across multiple report types."""
     sections = {}
     
@@ -268,7 +276,7 @@ def generate_common_sections(metadata: Dict, business_insights: Dict, performanc
     
     # Accessibility analysis
     sections["accessibility_analysis"] = generate_accessibility_analysis(business_insights, clusters_created)
-    sections["accessibility_analysis"] += f"\n- **Service Efficiency**: {distance_limit}km maximum service radius achieved\n"
+    sections["accessibility_analysis"] += f"\n- **Service Efficiency**: {distance_limit} maximum service radius achieved\n"
     
     # Equity analysis
     sections["equity_analysis"] = generate_equity_analysis(performance_metrics)
@@ -277,7 +285,7 @@ def generate_common_sections(metadata: Dict, business_insights: Dict, performanc
 
 def generate_methodology_section(metadata: Dict) -> str:
     """Generate comprehensive methodology section."""
-    distance_limit = safe_get(metadata, 'distance_limit_km', 3.0)
+    distance_limit = format_distance_limit(metadata)
     clusters_created = safe_get(metadata, 'clusters_created', 0)
     business_type = safe_get(metadata, 'business_type', 'supermarket')
     
@@ -300,7 +308,7 @@ We define accessibility through a binary distance matrix **A** where:
 
 ```
 A[i,j] = {{
-    1, if distance(pop_center_i, business_j) ≤ {distance_limit}km
+    1, if distance(pop_center_i, business_j) ≤ {distance_limit}
     0, otherwise
 }}
 ```
@@ -455,7 +463,7 @@ def generate_academic_comprehensive_report(metadata, territory_analytics, busine
                                          include_methodology=True, include_technical_analysis=True):
     """Generate comprehensive academic report."""
     clusters_created = safe_get(metadata, 'clusters_created', 0)
-    distance_limit = safe_get(metadata, 'distance_limit_km', 3.0)
+    distance_limit = format_distance_limit(metadata)
     
     # Extract territory metrics
     territory_metrics = extract_territory_metrics(territory_analytics)
@@ -494,7 +502,7 @@ This comprehensive analysis successfully demonstrates the application of advance
 **Key Achievements**:
 - Successfully optimized {city_name} into {clusters_created} balanced territories
 - Achieved equitable distribution of {format_number(total_customers)} potential customers
-- Maintained {distance_limit}km service constraints while optimizing market balance
+- Maintained {distance_limit} service constraints while optimizing market balance
 - Developed replicable methodology applicable to diverse urban markets
 
 This research establishes geospatial clustering as a mature and practical approach to sales territory optimization, contributing both academic knowledge and immediate business value.
@@ -505,7 +513,7 @@ This research establishes geospatial clustering as a mature and practical approa
 def generate_academic_summary_report(metadata, territory_analytics, business_insights, plots, request_id):
     """Generate condensed academic summary report."""
     clusters_created = safe_get(metadata, 'clusters_created', 0)
-    distance_limit = safe_get(metadata, 'distance_limit_km', 3.0)
+    distance_limit = format_distance_limit(metadata)
     territory_metrics = extract_territory_metrics(territory_analytics)
     
     report = generate_report_header(metadata, "academic_summary")
@@ -521,7 +529,7 @@ ef_i = (Pi × Wi) / Si
 ```
 
 **Multi-Stage Process**:
-1. Accessibility matrix computation for {distance_limit}km service radius
+1. Accessibility matrix computation for {distance_limit} service radius
 2. Effective population calculation weighted by {business_type} accessibility  
 3. Spatial clustering with equity constraints
 """
@@ -545,7 +553,7 @@ The geospatial clustering methodology successfully achieved equitable sales terr
 
 **Success Metrics**:
 - ✅ Market equity achieved across all {clusters_created} territories
-- ✅ Service accessibility optimized within {distance_limit}km constraints  
+- ✅ Service accessibility optimized within {distance_limit} constraints  
 - ✅ Computational efficiency suitable for operational deployment
 - ✅ Spatial quality maintaining geographic coherence
 """
@@ -555,7 +563,7 @@ The geospatial clustering methodology successfully achieved equitable sales terr
 def generate_executive_brief_report(metadata, territory_analytics, business_insights, plots, request_id):
     """Generate executive-focused brief report."""
     clusters_created = safe_get(metadata, 'clusters_created', 0)
-    distance_limit = safe_get(metadata, 'distance_limit_km', 3.0)
+    distance_limit = format_distance_limit(metadata)
     territory_metrics = extract_territory_metrics(territory_analytics)
     
     report = generate_report_header(metadata, "executive_brief")
@@ -564,13 +572,13 @@ def generate_executive_brief_report(metadata, territory_analytics, business_insi
     avg_customers = safe_divide(total_customers, clusters_created)
     
     report += f"""
-**Service Standard**: {distance_limit}km maximum customer travel distance
+**Service Standard**: {distance_limit} maximum customer travel distance
 
 ## Business Impact Summary
 
 ### Immediate Value Creation
 - **Market Equity**: Each territory receives ~{format_number(avg_customers)} potential customers
-- **Service Efficiency**: {distance_limit}km maximum radius optimizes customer accessibility and sales travel
+- **Service Efficiency**: {distance_limit} maximum radius optimizes customer accessibility and sales travel
 - **Resource Optimization**: Balanced workload distribution across {clusters_created} sales teams
 - **Operational Readiness**: Territories ready for immediate deployment
 
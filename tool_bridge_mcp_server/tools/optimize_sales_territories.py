@@ -1,5 +1,6 @@
 # --- START OF FILE optimize_sales_territories.py ---
 
+import asyncio
 import logging
 import os
 import sys
@@ -30,6 +31,9 @@ logger = logging.getLogger(__name__)
 
 # --- Configuration is now a simple module-level constant ---
 FASTAPI_BASE_URL = "http://localhost:8000"
+JOB_POLL_INTERVAL_SECONDS = 2
+# A job still queued or running after this is given up on
+JOB_TIMEOUT_SECONDS = 15 * 60
 
 
 def register_territory_optimization_tools(mcp: FastMCP):
@@ -136,18 +140,18 @@ def register_territory_optimization_tools(mcp: FastMCP):
                 "request_body": req_body.model_dump(),
             }
 
-            # Call the correct territory optimization endpoint
-            endpoint_url = f"{FASTAPI_BASE_URL}{CONF.temp_sales_man_problem}"  # Fixed to use the actual endpoint
+            # Submit the territory optimization as a job, then poll it until it finishes
+            submit_url = f"{FASTAPI_BASE_URL}{CONF.sales_man_jobs}"
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {id_token}" # Use the real user's token
             }
 
-            logger.info(f"Calling territory optimization for user {user_id}: {endpoint_url}")
+            logger.info(f"Submitting territory optimization for user {user_id}: {submit_url}")
 
             async with aiohttp.ClientSession() as session_http:
                 async with session_http.post(
-                    endpoint_url,
+                    submit_url,
                     json=request_payload,
                     headers=headers,
                 ) as response:
@@ -155,8 +159,29 @@ def register_territory_optimization_tools(mcp: FastMCP):
                         error_text = await response.text()
                         logger.error(f"Territory optimization error: {response.status} - {error_text}")
                         return f"❌ Error optimizing territories: {response.status} - {error_text}"
-                    
-                    response_data = await response.json()
+
+                    job = (await response.json())["data"]
+
+                status_url = f"{FASTAPI_BASE_URL}{CONF.sales_man_job_status.format(job_id=job['job_id'])}"
+                deadline = asyncio.get_running_loop().time() + JOB_TIMEOUT_SECONDS
+                while job["status"] in ("queued", "running"):
+                    if asyncio.get_running_loop().time() > deadline:
+                        logger.error(f"Territory job {job['job_id']} timed out in {job['status']}")
+                        return f"❌ Territory optimization timed out after {JOB_TIMEOUT_SECONDS // 60} minutes (job {job['job_id']}, last stage: {job['stage']})"
+                    await asyncio.sleep(JOB_POLL_INTERVAL_SECONDS)
+                    async with session_http.get(status_url, headers=headers) as response:
+                        if response.status != 200:
+                            error_text = await response.text()
+                            logger.error(f"Territory job status error: {response.status} - {error_text}")
+                            return f"❌ Error optimizing territories: {response.status} - {error_text}"
+
+                        job = (await response.json())["data"]
+                    logger.info(f"Territory job {job['job_id']}: {job['status']} ({job['stage']}, {job['progress']:.0%})")
+
+            if job["status"] == "failed":
+                return f"❌ Territory optimization failed: {job['error']}"
+
+            response_data = {"data": job["result"]}
 
             # Extract analysis results
             territory_data = response_data.get("data", {})